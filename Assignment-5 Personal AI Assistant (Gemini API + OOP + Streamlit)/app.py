@@ -3,13 +3,21 @@ JARVIS Personal AI Assistant - Streamlit UI
 Main interface for the JARVIS assistant
 """
 
+import base64
+import time
+import uuid
+from functools import lru_cache
+
 import streamlit as st
+from config.settings import settings
 from jarvis.assistant import JarvisAssistant
+from jarvis.pool import get_shared_engine, get_shared_memory
 from jarvis.prompt_controller import AssistantRole
 from jarvis.speech_to_text import SpeechToText
 from jarvis.text_to_speech import TextToSpeech
 from jarvis.errors import JarvisError
 from jarvis.logger import get_logger
+from jarvis.metrics import get_metrics
 
 logger = get_logger("app")
 
@@ -53,10 +61,32 @@ st.markdown("""
     </style>
 """, unsafe_allow_html=True)
 
-# Initialize session state (only once per session)
+@st.cache_resource(show_spinner=False)
+def get_speech_to_text() -> SpeechToText:
+    """One speech recognizer per process, shared by all sessions"""
+    return SpeechToText(language="en-US")
+
+
+@st.cache_resource(show_spinner=False)
+def get_text_to_speech() -> TextToSpeech:
+    """One TTS backend per process, shared by all sessions"""
+    return TextToSpeech(language="en")
+
+
+# Session id lives in the URL (?session=...) so a page reload keeps the same conversation.
+if "session_id" not in st.session_state:
+    st.session_state.session_id = st.query_params.get("session") or uuid.uuid4().hex
+    st.query_params["session"] = st.session_state.session_id
+
+# Initialize session state (only once per session). The Gemini client is shared
+# process-wide (jarvis.pool); memory, role and chat state stay per session.
 if "jarvis" not in st.session_state:
     try:
-        st.session_state.jarvis = JarvisAssistant()
+        st.session_state.jarvis = JarvisAssistant(
+            session_id=st.session_state.session_id,
+            engine=get_shared_engine(),
+            memory=get_shared_memory(st.session_state.session_id),
+        )
         st.session_state.init_success = True
     except Exception as e:
         st.session_state.jarvis = None
@@ -73,10 +103,10 @@ if "pending_user_input_source" not in st.session_state:
     st.session_state.pending_user_input_source = None
 
 if "stt" not in st.session_state:
-    st.session_state.stt = SpeechToText(language="en-US")
+    st.session_state.stt = get_speech_to_text()
 
 if "tts" not in st.session_state:
-    st.session_state.tts = TextToSpeech(language="en")
+    st.session_state.tts = get_text_to_speech()
 
 if "mic_widget_version" not in st.session_state:
     # We bump this after each successful "Transcribe & Send" to force the mic widget to remount.
@@ -101,6 +131,18 @@ if "last_tts_for_index" not in st.session_state:
 if "last_tts_error" not in st.session_state:
     st.session_state.last_tts_error = None
 
+if "history_visible" not in st.session_state:
+    # How many of the newest messages the Chat History shows ("Load older" adds a page)
+    st.session_state.history_visible = settings.HISTORY_PAGE_SIZE
+
+
+@lru_cache(maxsize=4096)
+def _message_html(role: str, content: str) -> str:
+    """Chat bubble HTML for one message (cached, so reruns don't rebuild unchanged messages)"""
+    if role == "user":
+        return f"<div class='user-message'><b>👤 You:</b> {content}</div>"
+    return f"<div class='assistant-message'><b>🧠 JARVIS:</b> {content}</div>"
+
 
 def _shorten_for_speech(text: str, max_words: int) -> str:
     words = (text or "").strip().split()
@@ -108,6 +150,42 @@ def _shorten_for_speech(text: str, max_words: int) -> str:
         return " ".join(words)
     return " ".join(words[:max_words]).rstrip() + "…"
 
+
+# Plays spoken-reply chunks one after another. Each chunk arrives in its own invisible
+# component as soon as it is synthesized; the queue lives on the page so they play in order.
+_AUDIO_QUEUE_JS = """
+<script>
+const page = window.parent;
+const queue = page.jarvisAudioQueue = page.jarvisAudioQueue || {items: [], current: null};
+if (%(first)s) {
+  queue.items = [];
+  if (queue.current) { queue.current.pause(); queue.current = null; }
+}
+queue.items.push("data:%(mime)s;base64,%(data)s");
+function playNext() {
+  const src = queue.items.shift();
+  queue.current = src ? new page.Audio(src) : null;
+  if (queue.current) {
+    queue.current.onended = playNext;
+    queue.current.play().catch(playNext);
+  }
+}
+if (!queue.current) playNext();
+</script>
+"""
+
+
+def _audio_queue(mime_type: str):
+    """on_chunk callback for TextToSpeech.synthesize(): starts playing the first chunk at once, queues the rest"""
+    first = [True]
+
+    def play(chunk: bytes) -> None:
+        data = base64.b64encode(chunk).decode("ascii")
+        st.iframe(_AUDIO_QUEUE_JS % {"first": "true" if first[0] else "false", "mime": mime_type, "data": data})
+        first[0] = False
+
+    return play
+
 # Check if initialization failed
 if not st.session_state.init_success:
     st.error("❌ Failed to initialize JARVIS")
@@ -152,23 +230,50 @@ with st.sidebar:
     
     # Memory Management
     st.subheader("💾 Memory Management")
-    memory_summary = st.session_state.jarvis.get_memory_summary()
+    memory_stats = st.session_state.jarvis.get_memory_stats()
+    messages_by_role = memory_stats["messages_by_role"]
     
     col1, col2 = st.columns(2)
     with col1:
-        st.metric("Total Messages", memory_summary["total_messages"])
+        st.metric("Total Messages", memory_stats["total_messages"])
     with col2:
-        st.metric("User Messages", memory_summary["user_messages"])
+        st.metric("User Messages", messages_by_role.get("user", 0))
     
-    st.metric("Assistant Messages", memory_summary["assistant_messages"])
+    col3, col4 = st.columns(2)
+    with col3:
+        st.metric("Assistant Messages", messages_by_role.get("assistant", 0))
+    with col4:
+        st.metric("Est. Tokens", f"{memory_stats['estimated_tokens']:,}")
     
     if st.button("🗑️ Clear Memory", key="clear_memory"):
         result = st.session_state.jarvis.clear_memory()
+        st.session_state.history_visible = settings.HISTORY_PAGE_SIZE
         st.success(result)
         st.rerun()
     
     st.divider()
     
+    # Search past messages (full-text index, so it stays fast on long histories)
+    st.subheader("🔎 Search History")
+    search_query = st.text_input("Search past messages", key="history_search", placeholder="e.g. python list sort")
+    search_role = st.selectbox(
+        "From",
+        options=[None, "user", "assistant"],
+        format_func=lambda r: {None: "Anyone", "user": "You", "assistant": "JARVIS"}[r],
+        key="history_search_role",
+    )
+    if search_query.strip():
+        results = st.session_state.jarvis.search_history(search_query, role=search_role, limit=settings.SEARCH_RESULTS)
+        if results:
+            st.caption(f"{len(results)} best match{'es' if len(results) != 1 else ''}")
+            for result in results:
+                speaker = "👤 You" if result["role"] == "user" else "🧠 JARVIS"
+                st.markdown(f"**{speaker}:** {result['snippet']}")
+        else:
+            st.caption("No messages match all of those words.")
+    
+    st.divider()
+    
     # Export Conversation
     st.subheader("📥 Export Conversation")
     export_format = st.radio("Export as:", ["JSON", "TXT"], key="export_format")
@@ -219,7 +324,13 @@ with st.sidebar:
         with col_a:
             if st.button("📝 Transcribe & Send", key="transcribe_and_send"):
                 with st.spinner("Transcribing..."):
-                    text, err = st.session_state.stt.transcribe_file_bytes(st.session_state.mic_audio_bytes, suffix=".wav")
+                    # Partial transcripts show up here while the offline backend works through the audio
+                    partial_placeholder = st.empty()
+                    text, err = st.session_state.stt.transcribe_file_bytes(
+                        st.session_state.mic_audio_bytes,
+                        suffix=".wav",
+                        on_partial=lambda partial: partial_placeholder.caption(f"🎙️ {partial}"),
+                    )
                     if err:
                         st.error(err)
                     else:
@@ -233,6 +344,21 @@ with st.sidebar:
                 st.session_state.mic_audio_bytes = None
                 st.rerun()
     
+    st.divider()
+
+    # Latency per stage of a turn (recent turns in this process)
+    st.subheader("📊 Performance")
+    metrics_rows = get_metrics().summary()
+    if metrics_rows:
+        table = ["| Stage | n | p50 ms | p95 ms |", "|---|---:|---:|---:|"]
+        table += [f"| {row['stage']} | {row['count']} | {row['p50_ms']:,.1f} | {row['p95_ms']:,.1f} |" for row in metrics_rows]
+        st.markdown("\n".join(table))
+        gemini_row = next((row for row in metrics_rows if row["stage"] == "gemini"), None)
+        if gemini_row:
+            st.caption(f"Gemini tokens (est.): {gemini_row['prompt_tokens']:,} in / {gemini_row['response_tokens']:,} out")
+    else:
+        st.caption("No turns timed yet.")
+    
     st.subheader("ℹ️ About")
     st.info(
         "JARVIS is your personal AI assistant powered by Google Gemini. "
@@ -253,28 +379,50 @@ if pending_input:
         # Display user message immediately
         st.markdown(f"<div class='user-message'><b>👤 You:</b> {pending_input}</div>", unsafe_allow_html=True)
         
-        # Normal mode - wait for full response
-        with st.spinner("JARVIS is thinking..."):
-            if pending_source == "voice":
-                response = st.session_state.jarvis.respond(
-                    pending_input,
-                    prompt_hint="Reply as a short, clear summary in 2–3 sentences (max ~60 words). No long lists.",
-                    store_user_input=pending_input,
-                )
-            else:
-                response = st.session_state.jarvis.respond(pending_input)
-            st.markdown(f"<div class='assistant-message'><b>🧠 JARVIS:</b> {response}</div>", unsafe_allow_html=True)
-            # Clear any previous persistent error after a successful response
-            st.session_state.last_app_error_message = None
-            st.session_state.last_app_error_details = None
-
-            if st.session_state.get("speak_reply", True):
-                short_text = _shorten_for_speech(response, st.session_state.get("max_spoken_words", 45))
-                mp3_bytes, err = st.session_state.tts.synthesize_mp3(short_text)
-                # Persist across st.rerun() so the audio player is visible in Chat History.
-                st.session_state.last_tts_mp3 = mp3_bytes
-                st.session_state.last_tts_error = err
-                st.session_state.last_tts_for_index = len(st.session_state.jarvis.get_conversation_history()) - 1
+        # Stream the reply: render chunks as they arrive (redraws are throttled, since each
+        # one resends the whole text). If this run is interrupted by a rerun, closing the
+        # stream saves the partial reply, marked as truncated.
+        reply_placeholder = st.empty()
+        reply_placeholder.markdown("<div class='assistant-message'><b>🧠 JARVIS:</b> <i>thinking…</i></div>", unsafe_allow_html=True)
+        if pending_source == "voice":
+            stream = st.session_state.jarvis.respond_stream(
+                pending_input,
+                prompt_hint="Reply as a short, clear summary in 2–3 sentences (max ~60 words). No long lists.",
+                store_user_input=pending_input,
+            )
+        else:
+            stream = st.session_state.jarvis.respond_stream(pending_input)
+
+        parts = []
+        last_render = 0.0
+        try:
+            for chunk in stream:
+                parts.append(chunk)
+                now = time.monotonic()
+                if now - last_render >= settings.STREAM_RENDER_INTERVAL:
+                    reply_placeholder.markdown(f"<div class='assistant-message'><b>🧠 JARVIS:</b> {''.join(parts)}▌</div>", unsafe_allow_html=True)
+                    last_render = now
+        finally:
+            stream.close()
+        response = "".join(parts)
+        reply_placeholder.markdown(f"<div class='assistant-message'><b>🧠 JARVIS:</b> {response}</div>", unsafe_allow_html=True)
+        # Clear any previous persistent error after a successful response
+        st.session_state.last_app_error_message = None
+        st.session_state.last_app_error_details = None
+
+        if st.session_state.get("speak_reply", True):
+            short_text = _shorten_for_speech(response, st.session_state.get("max_spoken_words", 45))
+            # Playback starts with the first sentence while the rest is still being synthesized;
+            # the joined audio is kept for the replay player below.
+            audio_bytes, err = st.session_state.tts.synthesize(
+                short_text,
+                on_chunk=_audio_queue(st.session_state.tts.mime_type),
+            )
+            # Persist across st.rerun() so the audio player is visible in Chat History.
+            st.session_state.last_tts_mp3 = audio_bytes
+            st.session_state.last_tts_error = err
+            # Absolute position of the reply in the conversation (see Chat History below)
+            st.session_state.last_tts_for_index = st.session_state.jarvis.get_memory_stats()["total_messages"] - 1
     
     except JarvisError as e:
         # Show clear, user-facing error (quota exceeded, etc.)
@@ -301,20 +449,26 @@ st.divider()
 # Display chat history below
 st.subheader("💬 Chat History")
 
-# Display chat history
-conversation_history = st.session_state.jarvis.get_conversation_history()
+# Display chat history: only the newest `history_visible` messages are fetched and
+# rendered, so a rerun costs the same however long the conversation gets.
+total_messages = st.session_state.jarvis.get_memory_stats()["total_messages"]
+conversation_history = st.session_state.jarvis.get_conversation_history(st.session_state.history_visible)
+first_index = total_messages - len(conversation_history)
+
+if first_index > 0:
+    if st.button(f"⬆️ Load older messages ({first_index} more)", key="load_older_messages"):
+        st.session_state.history_visible += settings.HISTORY_PAGE_SIZE
+        st.rerun()
 
 if conversation_history:
-    for idx, msg in enumerate(conversation_history):
-        if msg["role"] == "user":
-            st.markdown(f"<div class='user-message'><b>👤 You:</b> {msg['content']}</div>", unsafe_allow_html=True)
-        else:
-            st.markdown(f"<div class='assistant-message'><b>🧠 JARVIS:</b> {msg['content']}</div>", unsafe_allow_html=True)
+    for idx, msg in enumerate(conversation_history, start=first_index):
+        st.markdown(_message_html(msg["role"], msg["content"]), unsafe_allow_html=True)
+        if msg["role"] != "user":
             if (
                 st.session_state.get("last_tts_for_index") == idx
                 and st.session_state.get("last_tts_mp3") is not None
             ):
-                st.audio(st.session_state.last_tts_mp3, format="audio/mp3")
+                st.audio(st.session_state.last_tts_mp3, format=st.session_state.tts.mime_type)
             elif st.session_state.get("last_tts_for_index") == idx and st.session_state.get("last_tts_error"):
                 st.caption(f"TTS: {st.session_state.last_tts_error}")
 else:
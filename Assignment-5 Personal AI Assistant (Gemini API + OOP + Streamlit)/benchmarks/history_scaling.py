@@ -0,0 +1,314 @@
+"""
+History-scaling benchmark for the jarvis package
+
+Measures the hot paths at several conversation sizes (10 ... 100k messages),
+fully offline: the assistant talks to a GeminiEngine backed by the
+deterministic FakeGenerativeModel (configurable latency and reply length),
+and every memory backend works in a temporary folder.
+
+Benchmarks (per backend and history size):
+- memory_load       Memory() over the prefilled history
+- memory_add        Memory.add()
+- get_history       Memory.get_history(20) (recent page) and the full history
+- build_prompt      Memory.get_context() + PromptController.build_prompt()
+- retrieve          Memory.retrieve() (relevant earlier turns for the prompt)
+- respond           JarvisAssistant.respond() (one whole turn)
+- respond_stream    JarvisAssistant.respond_stream() (+ time to first chunk)
+- export_json/txt   JarvisAssistant.export_conversation() of the whole history
+                    (checked to contain every message)
+
+Usage (from the project folder):
+    python benchmarks/history_scaling.py
+    python benchmarks/history_scaling.py --sizes 10,1000,100000 --backends journal,sqlite --json results.json
+    python benchmarks/history_scaling.py --json new.json --compare results.json --max-regression 0.25
+
+Exit code: 0 = OK, 1 = regression against --compare
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable, Dict, List
+
+PROJECT_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PROJECT_DIR))
+
+# Keep the run quiet and independent of .env (must be set before config is imported)
+os.environ.setdefault("GEMINI_API_KEY", "benchmark")
+os.environ.setdefault("JARVIS_SUMMARIZER", "off")
+os.environ.setdefault("JARVIS_SEMANTIC_CACHE", "0")
+os.environ.setdefault("JARVIS_RESPONSE_CACHE", "off")
+os.environ.setdefault("JARVIS_LOG_LEVEL", "WARNING")
+
+from config.settings import settings  # noqa: E402
+from jarvis.assistant import JarvisAssistant  # noqa: E402
+from jarvis.fake_model import FakeGenerativeModel  # noqa: E402
+from jarvis.gemini_engine import GeminiEngine  # noqa: E402
+from jarvis.memory import Memory  # noqa: E402
+from jarvis.prompt_controller import PromptController  # noqa: E402
+from jarvis.rate_limiter import CircuitBreaker, RateLimiter, RetryPolicy  # noqa: E402
+from jarvis.storage import JournalStorage, JsonFileStorage, MappedStorage, MemoryStorage, SQLiteStorage  # noqa: E402
+
+DEFAULT_SIZES = (10, 100, 1_000, 10_000, 100_000)
+DEFAULT_BACKENDS = ("journal",)
+BACKENDS = ("journal", "json", "sqlite", "mmap")
+
+
+def make_messages(count: int, chars: int = 120) -> List[Dict]:
+    """Deterministic alternating user/assistant messages of about `chars` characters"""
+    filler = "lorem ipsum dolor sit amet consectetur adipiscing elit "
+    body = (filler * (chars // len(filler) + 1))[:chars]
+    return [
+        {"role": "user" if i % 2 == 0 else "assistant", "content": f"#{i} {body}"}
+        for i in range(count)
+    ]
+
+
+def make_storage(backend: str, folder: Path) -> MemoryStorage:
+    if backend == "journal":
+        return JournalStorage(folder / "memory.json")
+    if backend == "json":
+        return JsonFileStorage(folder / "memory.json")
+    if backend == "sqlite":
+        return SQLiteStorage(folder / "memory.db", session_id="bench")
+    if backend == "mmap":
+        return MappedStorage(folder / "memory.log", warm_search=settings.RETRIEVAL)
+    raise ValueError(f"Unknown backend: {backend}")
+
+
+def prefill(backend: str, folder: Path, messages: List[Dict]) -> None:
+    """Write a history of `messages` in the backend's on-disk format (in one go where possible)"""
+    if not messages:
+        return
+    if backend in ("journal", "json"):
+        # The journal's snapshot has the same format as the JSON file backend
+        JsonFileStorage(folder / "memory.json").append(messages[-1], messages)
+        return
+    if backend == "mmap":
+        storage = MappedStorage(folder / "memory.log")
+        storage.log.extend((m["role"], m["content"]) for m in messages)
+        storage.close()
+        return
+    storage = make_storage(backend, folder)
+    for message in messages:
+        storage.append(message, [])
+    storage.close()
+
+
+def make_engine(latency: float, reply_chars: int, chunk_size: int) -> GeminiEngine:
+    """GeminiEngine over the fake model, without client-side pacing or retries"""
+    reply_text = ("This is a deterministic benchmark reply. " * (reply_chars // 41 + 1))[:reply_chars]
+    model = FakeGenerativeModel(reply=lambda prompt: reply_text, latency=latency, chunk_size=chunk_size)
+    return GeminiEngine(model=model, limiter=RateLimiter(0, 0), retry=RetryPolicy(1), breaker=CircuitBreaker(1_000_000))
+
+
+def exported_messages(text: str, fmt: str) -> int:
+    """Number of messages in an export_conversation() result"""
+    if fmt == "json":
+        return len(json.loads(text)["conversations"])
+    return sum(1 for line in text.splitlines() if line in ("You:", "JARVIS:"))
+
+
+def timed(fn: Callable[[], object], repeat: int) -> List[float]:
+    """Call fn `repeat` times; seconds per call"""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def summarize(name: str, backend: str, size: int, samples: List[float], **extra) -> dict:
+    ordered = sorted(samples)
+    total = sum(samples)
+    return {
+        "bench": name,
+        "backend": backend,
+        "size": size,
+        "ops": len(samples),
+        "total_s": round(total, 6),
+        "ops_per_s": round(len(samples) / total, 1) if total else None,
+        "mean_ms": round(total / len(samples) * 1000, 4),
+        "p50_ms": round(statistics.median(ordered) * 1000, 4),
+        "p95_ms": round(ordered[max(0, -(-len(ordered) * 95 // 100) - 1)] * 1000, 4),
+        **extra,
+    }
+
+
+def run_size(backend: str, size: int, args, messages: List[Dict]) -> List[dict]:
+    """All benchmarks for one backend at one history size"""
+    results = []
+    with tempfile.TemporaryDirectory(prefix="jarvis-bench-") as tmp:
+        folder = Path(tmp)
+        prefill(backend, folder, messages[:size])
+
+        memory_box = {}
+
+        def load():
+            if "memory" in memory_box:
+                memory_box["memory"].close()
+            memory_box["memory"] = Memory(storage=make_storage(backend, folder))
+
+        results.append(summarize("memory_load", backend, size, timed(load, args.load_repeat)))
+        memory = memory_box["memory"]
+        memory.wait_until_indexed()  # background search indexing would skew the timings below
+
+        counter = iter(range(10**9))
+        results.append(summarize(
+            "memory_add", backend, size,
+            timed(lambda: memory.add("user", f"benchmark message {next(counter)}"), args.repeat),
+        ))
+        results.append(summarize("get_history_recent", backend, size, timed(lambda: memory.get_history(20), args.repeat)))
+        results.append(summarize("get_history_full", backend, size, timed(lambda: memory.get_history(max(1, memory.count())), args.heavy_repeat)))
+
+        controller = PromptController()
+
+        def build():
+            summary, history = memory.get_context()
+            return controller.build_prompt("How do I benchmark a Python function?", history, summary=summary)
+
+        prompt = build()
+        results.append(summarize("build_prompt", backend, size, timed(build, args.repeat), prompt_chars=len(prompt)))
+        results.append(summarize(
+            "retrieve", backend, size,
+            timed(lambda: memory.retrieve("How do I benchmark a Python function?", exclude_recent=settings.RETRIEVAL_RECENT_MESSAGES), args.repeat),
+        ))
+
+        engine = make_engine(args.latency, args.reply_chars, args.chunk_size)
+        assistant = JarvisAssistant(engine=engine, memory=memory)
+        results.append(summarize(
+            "respond", backend, size,
+            timed(lambda: assistant.respond(f"question {next(counter)}"), args.turns),
+        ))
+
+        first_chunk = []
+
+        def stream():
+            start = time.perf_counter()
+            for i, _ in enumerate(assistant.respond_stream(f"question {next(counter)}")):
+                if i == 0:
+                    first_chunk.append(time.perf_counter() - start)
+
+        samples = timed(stream, args.turns)
+        results.append(summarize(
+            "respond_stream", backend, size, samples,
+            ttft_p50_ms=round(statistics.median(first_chunk) * 1000, 4),
+        ))
+
+        total = memory.count()
+        for fmt in ("json", "txt"):
+            exported = []
+            samples = timed(lambda: exported.append(assistant.export_conversation(fmt)), args.heavy_repeat)
+            count = exported_messages(exported[-1], fmt)
+            if count != total:
+                raise RuntimeError(f"export_{fmt} [{backend}, {size:,} msgs]: exported {count} of {total} messages")
+            results.append(summarize(f"export_{fmt}", backend, size, samples, messages=count, export_chars=len(exported[-1])))
+
+        memory.close()
+    return results
+
+
+def git_revision() -> str | None:
+    try:
+        result = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=PROJECT_DIR, capture_output=True, text=True, check=True)
+        return result.stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results: List[dict], baseline_path: Path, max_regression: float) -> List[str]:
+    """Benchmarks whose p50 got slower than the baseline by more than `max_regression` (fraction)"""
+    baseline = json.loads(baseline_path.read_text(encoding="utf-8"))
+    before = {(r["bench"], r["backend"], r["size"]): r for r in baseline["results"]}
+    regressions = []
+    for result in results:
+        old = before.get((result["bench"], result["backend"], result["size"]))
+        if not old or not old["p50_ms"]:
+            continue
+        change = result["p50_ms"] / old["p50_ms"] - 1
+        result["p50_change"] = round(change, 3)
+        if change > max_regression:
+            regressions.append(
+                f"{result['bench']} [{result['backend']}, {result['size']:,} msgs]: "
+                f"p50 {old['p50_ms']:.3f} -> {result['p50_ms']:.3f} ms (+{change:.0%})"
+            )
+    return regressions
+
+
+def _int_list(text: str) -> List[int]:
+    return [int(part.replace("_", "")) for part in text.split(",") if part.strip()]
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark jarvis hot paths at growing history sizes (offline).")
+    parser.add_argument("--sizes", type=_int_list, default=list(DEFAULT_SIZES), help="History sizes, comma-separated (default: 10,100,1000,10000,100000)")
+    parser.add_argument("--backends", default=",".join(DEFAULT_BACKENDS), help=f"Memory backends from {', '.join(BACKENDS)} (default: journal)")
+    parser.add_argument("--repeat", type=int, default=50, help="Calls per cheap benchmark (default: 50)")
+    parser.add_argument("--heavy-repeat", type=int, default=5, help="Calls per full-history benchmark (default: 5)")
+    parser.add_argument("--load-repeat", type=int, default=3, help="Memory loads per size (default: 3)")
+    parser.add_argument("--turns", type=int, default=20, help="Assistant turns per respond benchmark (default: 20)")
+    parser.add_argument("--latency", type=float, default=0.0, help="Fake Gemini latency per call in seconds (default: 0)")
+    parser.add_argument("--reply-chars", type=int, default=400, help="Fake reply length (default: 400)")
+    parser.add_argument("--chunk-size", type=int, default=16, help="Fake stream chunk size in characters (default: 16)")
+    parser.add_argument("--json", dest="json_path", help="Write the results to this JSON file")
+    parser.add_argument("--compare", help="Baseline JSON from an earlier run; fail on p50 regressions")
+    parser.add_argument("--max-regression", type=float, default=0.25, help="Allowed p50 slowdown vs --compare (default: 0.25 = 25%%)")
+    args = parser.parse_args(argv)
+
+    backends = [name.strip() for name in args.backends.split(",") if name.strip()]
+    for name in backends:
+        if name not in BACKENDS:
+            parser.error(f"unknown backend: {name}")
+
+    messages = make_messages(max(args.sizes))
+    results = []
+    for backend in backends:
+        for size in args.sizes:
+            start = time.perf_counter()
+            size_results = run_size(backend, size, args, messages)
+            results.extend(size_results)
+            print(f"\n{backend} @ {size:,} messages ({time.perf_counter() - start:.1f}s)")
+            for r in size_results:
+                extra = f"  ttft p50 {r['ttft_p50_ms']:.3f} ms" if "ttft_p50_ms" in r else ""
+                if "messages" in r:
+                    extra = f"  {r['messages']:,} msgs exported"
+                print(f"  {r['bench']:<20} p50 {r['p50_ms']:>10.3f} ms  p95 {r['p95_ms']:>10.3f} ms  {r['ops_per_s'] or 0:>12,.1f} ops/s{extra}")
+
+    regressions = compare(results, Path(args.compare), args.max_regression) if args.compare else []
+
+    report = {
+        "meta": {
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "git_revision": git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "model": settings.MODEL_NAME,
+            "args": {key: value for key, value in vars(args).items() if key not in ("json_path", "compare")},
+        },
+        "results": results,
+        "regressions": regressions,
+    }
+    if args.json_path:
+        Path(args.json_path).write_text(json.dumps(report, indent=2), encoding="utf-8")
+        print(f"\nResults written to {args.json_path}")
+
+    if args.compare:
+        for line in regressions:
+            print(f"FAIL: {line}")
+        if not regressions:
+            print(f"OK (no p50 regression above {args.max_regression:.0%})")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
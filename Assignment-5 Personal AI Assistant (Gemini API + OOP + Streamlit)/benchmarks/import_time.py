@@ -0,0 +1,114 @@
+"""
+Import-time benchmark for the jarvis package
+
+Imports the modules app.py needs at startup in a fresh interpreter (several
+times, keeping the median) and fails if:
+- the median import time is above the threshold, or
+- a heavy dependency that should load lazily got imported
+
+Usage (from the project folder):
+    python benchmarks/import_time.py
+    python benchmarks/import_time.py --runs 10 --max-ms 300 --json results.json
+
+Exit code: 0 = OK, 1 = regression
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+PROJECT_DIR = Path(__file__).resolve().parent.parent
+
+# What app.py imports from the project at startup (streamlit itself is not counted)
+STARTUP_MODULES = (
+    "config.settings",
+    "jarvis.assistant",
+    "jarvis.pool",
+    "jarvis.prompt_controller",
+    "jarvis.speech_to_text",
+    "jarvis.text_to_speech",
+    "jarvis.errors",
+    "jarvis.logger",
+)
+
+# Must not be imported until they are really used
+LAZY_MODULES = (
+    "google.generativeai",
+    "speech_recognition",
+    "vosk",
+    "gtts",
+    "pyttsx3",
+    "numpy",
+)
+
+DEFAULT_MAX_MS = 250.0
+
+_PROBE = """
+import json, sys, time
+start = time.perf_counter()
+for name in {modules!r}:
+    __import__(name)
+elapsed_ms = (time.perf_counter() - start) * 1000
+print(json.dumps({{"ms": elapsed_ms, "loaded": [m for m in {lazy!r} if m in sys.modules]}}))
+"""
+
+
+def measure_once() -> dict:
+    """Import the startup modules in a new interpreter and report time + eagerly loaded heavy modules"""
+    env = dict(os.environ)
+    # The key is only checked when a real Gemini client is created, but keep the probe independent of .env
+    env.setdefault("GEMINI_API_KEY", "benchmark")
+    code = _PROBE.format(modules=STARTUP_MODULES, lazy=LAZY_MODULES)
+    result = subprocess.run(
+        [sys.executable, "-c", code],
+        cwd=PROJECT_DIR,
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Measure jarvis startup import time.")
+    parser.add_argument("--runs", type=int, default=5, help="Fresh-interpreter runs (default: 5)")
+    parser.add_argument("--max-ms", type=float, default=DEFAULT_MAX_MS, help=f"Fail above this median (default: {DEFAULT_MAX_MS:g})")
+    parser.add_argument("--json", dest="json_path", help="Also write the results to this JSON file")
+    args = parser.parse_args(argv)
+
+    samples = [measure_once() for _ in range(args.runs)]
+    times = [sample["ms"] for sample in samples]
+    eager = sorted({name for sample in samples for name in sample["loaded"]})
+    median = statistics.median(times)
+
+    report = {
+        "runs": args.runs,
+        "median_ms": round(median, 1),
+        "min_ms": round(min(times), 1),
+        "max_ms": round(max(times), 1),
+        "threshold_ms": args.max_ms,
+        "eager_heavy_modules": eager,
+        "ok": median <= args.max_ms and not eager,
+    }
+    if args.json_path:
+        Path(args.json_path).write_text(json.dumps(report, indent=2), encoding="utf-8")
+
+    print(f"Startup imports: median {report['median_ms']} ms (min {report['min_ms']}, max {report['max_ms']}) over {args.runs} runs")
+    if median > args.max_ms:
+        print(f"FAIL: median is above the {args.max_ms:g} ms threshold")
+    if eager:
+        print(f"FAIL: imported at startup but should be lazy: {', '.join(eager)}")
+    if report["ok"]:
+        print("OK")
+    return 0 if report["ok"] else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
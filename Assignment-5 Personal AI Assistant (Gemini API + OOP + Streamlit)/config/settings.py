@@ -28,11 +28,150 @@ class Settings:
         self.TEMPERATURE = 0.7
         self.MAX_TOKENS = 1000
         
+        # Async requests: concurrency limit and per-call timeout (seconds)
+        self.MAX_CONCURRENT_REQUESTS = 8
+        self.REQUEST_TIMEOUT = 60
+        
+        # Streaming: how often a partial reply is checkpointed to memory, and how
+        # often the UI redraws it (seconds)
+        self.STREAM_CHECKPOINT_SECONDS = 2.0
+        self.STREAM_RENDER_INTERVAL = 0.05
+        
+        # Client-side quota handling (shared by every engine in the process)
+        self.RATE_LIMIT_RPM = int(os.getenv("JARVIS_RATE_LIMIT_RPM", "15"))
+        self.RATE_LIMIT_TPM = int(os.getenv("JARVIS_RATE_LIMIT_TPM", "250000"))
+        self.RETRY_MAX_ATTEMPTS = 4
+        self.RETRY_BASE_DELAY = 1.0
+        self.RETRY_MAX_DELAY = 30.0
+        self.CIRCUIT_BREAKER_THRESHOLD = 3
+        self.CIRCUIT_BREAKER_COOLDOWN = 60.0
+        
+        # Response cache for exactly repeated prompts: "off" (default), "memory" or "disk"
+        self.RESPONSE_CACHE = os.getenv("JARVIS_RESPONSE_CACHE", "off")
+        self.RESPONSE_CACHE_FILE = Path(__file__).parent.parent / "data" / "response_cache.db"
+        self.RESPONSE_CACHE_TTL = 3600
+        self.RESPONSE_CACHE_MAX_ENTRIES = 256
+        self.RESPONSE_CACHE_MAX_DISK_BYTES = 50_000_000
+        
+        # Semantic cache: reuse answers to near-duplicate questions (off by default;
+        # it ignores conversation context, so follow-ups like "why?" can match too)
+        self.SEMANTIC_CACHE = os.getenv("JARVIS_SEMANTIC_CACHE", "0") == "1"
+        self.SEMANTIC_CACHE_THRESHOLD = 0.88
+        self.SEMANTIC_CACHE_TTL = 86400
+        
+        # Speech-to-text backend: "google" (Google Web Speech, needs internet) or
+        # "vosk" (offline; needs `pip install vosk` and a model unpacked at VOSK_MODEL_PATH)
+        self.STT_BACKEND = os.getenv("JARVIS_STT_BACKEND", "google")
+        self.VOSK_MODEL_PATH = Path(os.getenv("JARVIS_VOSK_MODEL", str(Path(__file__).parent.parent / "models" / "vosk")))
+        self.STT_CHUNK_SECONDS = 0.5
+        
+        # Audio preprocessing before speech-to-text: resample to 16 kHz mono, trim silence and
+        # split at pauses longer than VAD_SPLIT_SILENCE_SECONDS (energy-based voice detection).
+        # ffmpeg (if installed) adds MP3/M4A/OGG/WebM support.
+        self.AUDIO_PREPROCESS = os.getenv("JARVIS_AUDIO_PREPROCESS", "1") == "1"
+        self.VAD_FRAME_MS = 30
+        self.VAD_THRESHOLD_DB = 12.0
+        self.VAD_PAD_MS = 200
+        self.VAD_SPLIT_SILENCE_SECONDS = 1.0
+        self.FFMPEG_BINARY = os.getenv("JARVIS_FFMPEG", "ffmpeg")
+        
+        # Text-to-speech backend: "gtts" (Google, needs internet) or "pyttsx3" (offline
+        # system voices; `pip install pyttsx3`). Replies are split into sentence chunks of
+        # up to TTS_CHUNK_CHARS, synthesized in parallel and cached (capped by total bytes).
+        self.TTS_BACKEND = os.getenv("JARVIS_TTS_BACKEND", "gtts")
+        self.TTS_CHUNK_CHARS = 200
+        self.TTS_MAX_WORKERS = 4
+        self.TTS_CACHE_MAX_BYTES = 20_000_000
+        
+        # Logging: level, "text" or "json" (JSON lines with a request id) for logs/jarvis.log,
+        # async mode (a background thread writes the logs, off the request path) and the
+        # fraction of requests whose DEBUG records are kept
+        self.LOG_LEVEL = os.getenv("JARVIS_LOG_LEVEL", "INFO")
+        self.LOG_FORMAT = os.getenv("JARVIS_LOG_FORMAT", "text")
+        self.LOG_ASYNC = os.getenv("JARVIS_LOG_ASYNC", "0") == "1"
+        self.LOG_DEBUG_SAMPLE_RATE = float(os.getenv("JARVIS_LOG_DEBUG_SAMPLE_RATE", "1.0"))
+        
+        # Per-turn latency/size metrics (jarvis.metrics). Always kept in memory for the sidebar
+        # p50/p95 panel; METRICS_EXPORT adds sinks: "prometheus" (text file for a scraper),
+        # "jsonl" (one line per turn) or both, comma-separated
+        self.METRICS = os.getenv("JARVIS_METRICS", "1") == "1"
+        self.METRICS_EXPORT = os.getenv("JARVIS_METRICS_EXPORT", "")
+        self.METRICS_WINDOW = 1000
+        self.METRICS_PROMETHEUS_FILE = Path(__file__).parent.parent / "logs" / "metrics.prom"
+        self.METRICS_PROMETHEUS_INTERVAL = 10.0
+        self.METRICS_JSONL_FILE = Path(__file__).parent.parent / "logs" / "metrics.jsonl"
+        
         # Memory configuration
         self.MEMORY_FILE = Path(__file__).parent.parent / "data" / "memory.json"
         self.MAX_MEMORY_ENTRIES = 20
         
-        # Validate that API key is set
+        # Chat history display: newest messages shown per page ("Load older" adds a page)
+        self.HISTORY_PAGE_SIZE = 20
+        
+        # History search: results shown in the sidebar
+        self.SEARCH_RESULTS = 10
+        
+        # Retrieval: each prompt gets a short recent window plus the earlier turns that
+        # best match the new input (BM25 over the search index), instead of only the last N
+        self.RETRIEVAL = os.getenv("JARVIS_RETRIEVAL", "1") == "1"
+        self.RETRIEVAL_RECENT_MESSAGES = 8
+        self.RETRIEVAL_TOP_K = 3
+        
+        # Context caching: the system prompt + summary + older history are stored once as a
+        # Gemini cached content and reused by later turns (only new text is uploaded).
+        # Off by default: cache storage is billed per hour, and Gemini only caches prefixes
+        # of roughly 1024+ tokens. The history window then slides in steps of WINDOW_STEP
+        # messages so the prefix stays the same for several turns.
+        self.CONTEXT_CACHE = os.getenv("JARVIS_CONTEXT_CACHE", "0") == "1"
+        self.CONTEXT_CACHE_MIN_TOKENS = 1024
+        self.CONTEXT_CACHE_TTL = 600
+        self.CONTEXT_CACHE_REFRESH_TOKENS = 512
+        self.CONTEXT_CACHE_MAX_ENTRIES = 32
+        self.CONTEXT_CACHE_WINDOW_STEP = 8
+        
+        # Follow-up prefetch: after each reply, a few likely next questions are predicted and
+        # answered in the background; a close enough next message is answered at once.
+        # Off by default (it spends quota on answers that may go unused). Prefetching never
+        # uses more than RATE_SHARE of the rate limit (all sessions together, on WORKERS
+        # shared threads), and new input cancels it
+        self.PREFETCH = os.getenv("JARVIS_PREFETCH", "0") == "1"
+        self.PREFETCH_QUESTIONS = 3
+        self.PREFETCH_WORKERS = 2
+        self.PREFETCH_TTL = 120
+        self.PREFETCH_BUDGET_SECONDS = 30
+        self.PREFETCH_RATE_SHARE = 0.2
+        self.PREFETCH_MATCH_THRESHOLD = 0.9
+        
+        # Prompt size limit (estimated tokens for system prompt + history + user input)
+        self.PROMPT_TOKEN_BUDGET = 4000
+        
+        # Rolling summary of old turns: "gemini" (background API call), "local" (no API) or "off"
+        self.SUMMARIZER = os.getenv("JARVIS_SUMMARIZER", "gemini")
+        self.SUMMARY_TRIGGER_MESSAGES = 30
+        self.SUMMARY_KEEP_RECENT = 10
+        self.SUMMARY_MAX_CHARS = 2000
+        # Messages folded per summary request (estimated tokens); a longer backlog is folded in steps
+        self.SUMMARY_MAX_INPUT_TOKENS = 3000
+        
+        # Memory storage backend: "journal" (append-only, default), "json" (full rewrite),
+        # "sqlite" (one database shared by all sessions, history kept per session)
+        # or "mmap" (memory-mapped log: startup cost doesn't grow with the history)
+        self.MEMORY_BACKEND = os.getenv("JARVIS_MEMORY_BACKEND", "journal")
+        self.MEMORY_JOURNAL_FILE = Path(__file__).parent.parent / "data" / "memory.journal"
+        self.MEMORY_DB_FILE = Path(__file__).parent.parent / "data" / "memory.db"
+        self.MEMORY_LOG_FILE = Path(__file__).parent.parent / "data" / "memory.log"
+        self.MEMORY_COMPACT_EVERY = 200
+        
+    def validate(self):
+        """
+        Check that the settings needed to call Gemini are present
+        
+        Called when a real Gemini client is needed, not at import time, so
+        importing the package (or running offline with a fake model) never fails.
+        
+        Raises:
+            ValueError: If GEMINI_API_KEY is not set
+        """
         if not self.GEMINI_API_KEY:
             raise ValueError(
                 "GEMINI_API_KEY not found in .env file. "
@@ -51,8 +190,15 @@ class Settings:
             "model": self.MODEL_NAME,
             "temperature": self.TEMPERATURE,
             "max_tokens": self.MAX_TOKENS,
+            "response_cache": self.RESPONSE_CACHE,
+            "semantic_cache": self.SEMANTIC_CACHE,
+            "context_cache": self.CONTEXT_CACHE,
+            "prefetch": self.PREFETCH,
             "memory_file": self.MEMORY_FILE,
-            "max_memory": self.MAX_MEMORY_ENTRIES
+            "max_memory": self.MAX_MEMORY_ENTRIES,
+            "prompt_token_budget": self.PROMPT_TOKEN_BUDGET,
+            "summarizer": self.SUMMARIZER,
+            "memory_backend": self.MEMORY_BACKEND
         }
 
 
@@ -3,14 +3,25 @@ JARVIS Assistant Module
 Main intelligence engine combining all components
 """
 
+import time
+import uuid
+from typing import TYPE_CHECKING
+
 from jarvis.gemini_engine import GeminiEngine
 from jarvis.prompt_controller import PromptController, AssistantRole
-from jarvis.memory import Memory
+from jarvis.memory import Memory, mark_truncated
+from jarvis.pool import get_compactor
+from config.settings import settings
 from jarvis.errors import JarvisError
-from jarvis.logger import get_logger
+from jarvis.logger import get_logger, request_context
+from jarvis.metrics import TurnTrace, get_metrics
 
 logger = get_logger(__name__)
 
+if TYPE_CHECKING:
+    from jarvis.prefetch import FollowUpPrefetcher
+    from jarvis.semantic_cache import SemanticCache
+
 
 class JarvisAssistant:
     """
@@ -18,24 +29,72 @@ class JarvisAssistant:
     Orchestrates all components: GeminiEngine, PromptController, and Memory
     Coordinates the workflow from user input to AI response
     
+    The engine and memory can be passed in, so several sessions can share the
+    process-wide ones from jarvis.pool; the role (PromptController) always
+    belongs to this assistant.
+    
     Attributes:
         engine: GeminiEngine instance for API communication
         controller: PromptController instance for prompt formatting
         memory: Memory instance for conversation persistence
+        compactor: ConversationCompactor folding old turns into a summary (None if disabled)
+        semantic_cache: SemanticCache answering near-duplicate questions (None if disabled)
+        prefetcher: FollowUpPrefetcher pre-answering likely next questions (None if disabled)
     """
     
-    def __init__(self):
+    def __init__(
+        self,
+        session_id: str = "default",
+        semantic_cache: "SemanticCache" = None,
+        engine: GeminiEngine = None,
+        memory: Memory = None,
+    ):
         """
         Initialize JarvisAssistant by creating all component instances
         
+        Args:
+            session_id (str): Conversation session key (separates users with the SQLite memory backend)
+            semantic_cache (SemanticCache, optional): Shared semantic cache (defaults to settings.SEMANTIC_CACHE)
+            engine (GeminiEngine, optional): Engine to use (defaults to a new one)
+            memory (Memory, optional): Memory to use (defaults to a new one for `session_id`)
+        
         Raises:
             RuntimeError: If any component fails to initialize
         """
         try:
             # Initialize all components
-            self.engine = GeminiEngine()
+            self.engine = engine or GeminiEngine()
             self.controller = PromptController()
-            self.memory = Memory()
+            self.memory = memory or Memory(session_id=session_id)
+            # Key of this conversation's prompt prefix in the engine's context cache
+            self.cache_scope = f"{session_id}:{uuid.uuid4().hex[:8]}"
+            
+            # One compactor per Memory, even when the Memory is shared
+            self.compactor = get_compactor(self.memory, self.engine)
+            
+            if semantic_cache is None and settings.SEMANTIC_CACHE:
+                # Imported here: it needs NumPy, which is only worth loading when enabled
+                from jarvis.semantic_cache import SemanticCache
+                
+                semantic_cache = SemanticCache(
+                    threshold=settings.SEMANTIC_CACHE_THRESHOLD,
+                    ttl_seconds=settings.SEMANTIC_CACHE_TTL,
+                )
+            self.semantic_cache = semantic_cache
+            
+            self.prefetcher: "FollowUpPrefetcher" = None
+            if settings.PREFETCH and settings.PREFETCH_RATE_SHARE > 0:
+                # Imported here: its answer cache needs NumPy too
+                from jarvis.prefetch import FollowUpPrefetcher
+                
+                self.prefetcher = FollowUpPrefetcher(
+                    self.engine,
+                    self._build_full_prompt,
+                    questions=settings.PREFETCH_QUESTIONS,
+                    ttl_seconds=settings.PREFETCH_TTL,
+                    budget_seconds=settings.PREFETCH_BUDGET_SECONDS,
+                    match_threshold=settings.PREFETCH_MATCH_THRESHOLD,
+                )
             
             logger.info("JARVIS Assistant initialized successfully")
         
@@ -48,11 +107,12 @@ class JarvisAssistant:
         Process user input and generate a response
         
         Workflow:
-        1. Get conversation history from Memory
+        1. Get conversation summary + recent history from Memory
         2. Build complete prompt with PromptController
-        3. Generate response with GeminiEngine
-        4. Save user input and response to Memory
-        5. Return response to user
+        3. Answer from the semantic cache if a similar question was asked (or
+           from a prefetched follow-up), otherwise generate response with GeminiEngine
+        4. Save user input and response to Memory (and summarize old turns if due)
+        5. Start prefetching likely follow-ups (if enabled) and return response to user
         
         Args:
             user_input (str): The user's question or input
@@ -62,66 +122,351 @@ class JarvisAssistant:
         Returns:
             str: The assistant's response
         """
-        try:
-            # Step 1: Get conversation history
-            history = self.memory.get_history()
-            
-            # Step 2: Build complete prompt with system instructions + history
-            prompt_user_input = user_input
-            if prompt_hint:
-                prompt_user_input = f"{user_input}\n\n{prompt_hint}"
-            full_prompt = self.controller.build_prompt(prompt_user_input, history)
-            
-            # Step 3: Generate response from Gemini
-            response = self.engine.generate(full_prompt)
+        with request_context():
+            trace = get_metrics().start_turn("respond")
+            self._cancel_prefetch()
+            try:
+                # Steps 1-2: Get summary + recent history and build the full prompt
+                full_prompt = self._build_full_prompt(user_input, prompt_hint, trace)
+                
+                # Step 3: Reuse an answer to a near-identical question, or generate one
+                cache_bucket = self._semantic_bucket(prompt_hint)
+                response = self._cached_answer(cache_bucket, user_input)
+                if response is None:
+                    with trace.span("gemini") as span:
+                        response = self.engine.generate(full_prompt)
+                        span.count(prompt=full_prompt, response=response)
+                    self._semantic_store(cache_bucket, user_input, response)
+                trace.count(prompt=full_prompt, response=response)
+                
+                # Step 4: Save to memory
+                user_text = store_user_input if store_user_input is not None else user_input
+                with trace.span("persist"):
+                    self._save_turn(user_text, response)
+                
+                # Step 5: Prefetch follow-ups and return response
+                self._prefetch_follow_ups(user_text, response)
+                return response
             
-            # Step 4: Save to memory
-            self.memory.add("user", store_user_input if store_user_input is not None else user_input)
-            self.memory.add("assistant", response)
-            
-            # Step 5: Return response
-            return response
-        
-        except JarvisError:
-            # Already classified; log and re-raise for UI to display.
-            logger.exception("JarvisError while generating response")
-            raise
-        except Exception as e:
-            logger.exception("Unexpected error while generating response")
-            raise JarvisError("❌ Something went wrong while generating a response. Please try again.", technical_message=str(e))
+            except JarvisError:
+                # Already classified; log and re-raise for UI to display.
+                trace.status = "error"
+                logger.exception("JarvisError while generating response")
+                raise
+            except Exception as e:
+                trace.status = "error"
+                logger.exception("Unexpected error while generating response")
+                raise JarvisError("❌ Something went wrong while generating a response. Please try again.", technical_message=str(e))
+            finally:
+                trace.finish()
     
-    def respond_stream(self, user_input: str):
+    def respond_stream(self, user_input: str, *, prompt_hint: str | None = None, store_user_input: str | None = None):
         """
         Process user input and generate response with streaming
         Yields response chunks as they arrive from the API
         
+        Chunks are collected in a list (joined once at the end). Every
+        settings.STREAM_CHECKPOINT_SECONDS the partial reply is checkpointed to
+        memory; if the stream is cut short (the consumer stops iterating, e.g. a
+        Streamlit rerun, or the API fails mid-reply) the partial turn is saved,
+        marked as truncated.
+        
         Args:
             user_input (str): The user's question or input
+            prompt_hint (str, optional): Extra instruction appended to the prompt (not stored in memory)
+            store_user_input (str, optional): What to store in memory for the user message (defaults to user_input)
             
         Yields:
             str: Response chunks
+            
+        Raises:
+            JarvisError: If the request fails (any partial reply is saved first)
         """
-        try:
-            # Get conversation history
-            history = self.memory.get_history()
+        with request_context():
+            user_text = store_user_input if store_user_input is not None else user_input
+            parts = []
+            full_prompt = ""
+            trace = get_metrics().start_turn("respond_stream")
+            self._cancel_prefetch()
+            try:
+                # Get summary + recent history and build the full prompt
+                full_prompt = self._build_full_prompt(user_input, prompt_hint, trace)
+                
+                # Reuse an answer to a near-identical question, or stream from Gemini
+                cache_bucket = self._semantic_bucket(prompt_hint)
+                cached = self._cached_answer(cache_bucket, user_input)
+                if cached is not None:
+                    parts.append(cached)
+                    trace.mark("first_token")
+                    yield cached
+                else:
+                    self.memory.save_draft(user_text, "")
+                    last_checkpoint = time.monotonic()
+                    with trace.span("gemini") as span:
+                        try:
+                            for chunk in self.engine.generate_stream(full_prompt, raise_errors=True):
+                                parts.append(chunk)
+                                trace.mark("first_token")
+                                yield chunk
+                                if time.monotonic() - last_checkpoint >= settings.STREAM_CHECKPOINT_SECONDS:
+                                    self.memory.save_draft(user_text, "".join(parts))
+                                    last_checkpoint = time.monotonic()
+                        finally:
+                            span.count(prompt=full_prompt, response="".join(parts))
+                    self._semantic_store(cache_bucket, user_input, "".join(parts))
+                
+                # Save to memory after streaming is complete
+                with trace.span("persist"):
+                    self._finish_stream(user_text, parts)
+                self._prefetch_follow_ups(user_text, "".join(parts))
             
-            # Build complete prompt
-            full_prompt = self.controller.build_prompt(user_input, history)
+            except GeneratorExit:
+                # The consumer stopped reading (page rerun / navigation): keep what we have.
+                trace.status = "truncated"
+                with trace.span("persist"):
+                    self._finish_stream(user_text, parts, truncated=True)
+                raise
+            except JarvisError:
+                trace.status = "error"
+                logger.exception("JarvisError while streaming response")
+                self._abort_stream(user_text, parts)
+                raise
+            except Exception as e:
+                trace.status = "error"
+                logger.exception("Unexpected error while streaming response")
+                self._abort_stream(user_text, parts)
+                raise JarvisError("❌ Something went wrong while generating a response. Please try again.", technical_message=str(e))
+            finally:
+                trace.count(prompt=full_prompt, response="".join(parts))
+                trace.finish()
+    
+    async def arespond(
+        self,
+        user_input: str,
+        *,
+        prompt_hint: str | None = None,
+        store_user_input: str | None = None,
+        timeout: float | None = None,
+    ) -> str:
+        """
+        Async version of respond(): same workflow, but the Gemini call doesn't block
+        
+        Args:
+            user_input (str): The user's question or input
+            prompt_hint (str, optional): Extra instruction appended to the prompt (not stored in memory)
+            store_user_input (str, optional): What to store in memory for the user message (defaults to user_input)
+            timeout (float, optional): Seconds before the Gemini call gives up
             
-            # Stream response from Gemini
-            full_response = ""
-            for chunk in self.engine.generate_stream(full_prompt):
-                full_response += chunk
-                yield chunk
+        Returns:
+            str: The assistant's response
+        """
+        with request_context():
+            trace = get_metrics().start_turn("arespond")
+            self._cancel_prefetch()
+            try:
+                full_prompt = self._build_full_prompt(user_input, prompt_hint, trace)
+                
+                cache_bucket = self._semantic_bucket(prompt_hint)
+                response = self._cached_answer(cache_bucket, user_input)
+                if response is None:
+                    with trace.span("gemini") as span:
+                        response = await self.engine.agenerate(full_prompt, timeout=timeout)
+                        span.count(prompt=full_prompt, response=response)
+                    self._semantic_store(cache_bucket, user_input, response)
+                trace.count(prompt=full_prompt, response=response)
+                
+                user_text = store_user_input if store_user_input is not None else user_input
+                with trace.span("persist"):
+                    self._save_turn(user_text, response)
+                self._prefetch_follow_ups(user_text, response)
+                return response
             
-            # Save to memory after streaming is complete
-            self.memory.add("user", user_input)
-            self.memory.add("assistant", full_response)
+            except JarvisError:
+                trace.status = "error"
+                logger.exception("JarvisError while generating response")
+                raise
+            except Exception as e:
+                trace.status = "error"
+                logger.exception("Unexpected error while generating response")
+                raise JarvisError("❌ Something went wrong while generating a response. Please try again.", technical_message=str(e))
+            finally:
+                trace.finish()
+    
+    async def arespond_stream(self, user_input: str, timeout: float | None = None):
+        """
+        Async version of respond_stream() (same checkpointing and truncation handling)
         
-        except Exception as e:
-            error_msg = f"Error: {str(e)}"
-            print(error_msg)
-            yield error_msg
+        Args:
+            user_input (str): The user's question or input
+            timeout (float, optional): Seconds before the Gemini stream gives up
+            
+        Yields:
+            str: Response chunks
+            
+        Raises:
+            JarvisError: If the request fails (any partial reply is saved first)
+        """
+        with request_context():
+            parts = []
+            full_prompt = ""
+            trace = get_metrics().start_turn("arespond_stream")
+            self._cancel_prefetch()
+            try:
+                full_prompt = self._build_full_prompt(user_input, trace=trace)
+                
+                cache_bucket = self._semantic_bucket(None)
+                cached = self._cached_answer(cache_bucket, user_input)
+                if cached is not None:
+                    parts.append(cached)
+                    trace.mark("first_token")
+                    yield cached
+                else:
+                    self.memory.save_draft(user_input, "")
+                    last_checkpoint = time.monotonic()
+                    with trace.span("gemini") as span:
+                        try:
+                            async for chunk in self.engine.agenerate_stream(full_prompt, timeout=timeout, raise_errors=True):
+                                parts.append(chunk)
+                                trace.mark("first_token")
+                                yield chunk
+                                if time.monotonic() - last_checkpoint >= settings.STREAM_CHECKPOINT_SECONDS:
+                                    self.memory.save_draft(user_input, "".join(parts))
+                                    last_checkpoint = time.monotonic()
+                        finally:
+                            span.count(prompt=full_prompt, response="".join(parts))
+                    self._semantic_store(cache_bucket, user_input, "".join(parts))
+                
+                with trace.span("persist"):
+                    self._finish_stream(user_input, parts)
+                self._prefetch_follow_ups(user_input, "".join(parts))
+            
+            except GeneratorExit:
+                trace.status = "truncated"
+                with trace.span("persist"):
+                    self._finish_stream(user_input, parts, truncated=True)
+                raise
+            except JarvisError:
+                trace.status = "error"
+                logger.exception("JarvisError while streaming response")
+                self._abort_stream(user_input, parts)
+                raise
+            except Exception as e:
+                trace.status = "error"
+                logger.exception("Unexpected error while streaming response")
+                self._abort_stream(user_input, parts)
+                raise JarvisError("❌ Something went wrong while generating a response. Please try again.", technical_message=str(e))
+            finally:
+                trace.count(prompt=full_prompt, response="".join(parts))
+                trace.finish()
+    
+    def _build_full_prompt(self, user_input: str, prompt_hint: str | None = None, trace: TurnTrace | None = None) -> str:
+        """Build the prompt from the rolling summary, recent history, relevant earlier turns and the (hinted) user input"""
+        trace = trace or TurnTrace(None, "prompt")
+        relevant = None
+        with trace.span("history"):
+            summary, history = self.memory.get_context(self._history_window())
+        if settings.RETRIEVAL:
+            with trace.span("retrieve"):
+                relevant = self.memory.retrieve(user_input, exclude_recent=len(history))
+        prompt_user_input = user_input
+        if prompt_hint:
+            prompt_user_input = f"{user_input}\n\n{prompt_hint}"
+        with trace.span("build_prompt") as span:
+            prompt = self.controller.build_prompt(
+                prompt_user_input, history, summary=summary, relevant=relevant, scope=self.cache_scope
+            )
+            span.count(prompt=prompt)
+        return prompt
+    
+    def _history_window(self) -> int:
+        """
+        Number of recent messages to put in the prompt
+        
+        With context caching the window grows by whole steps before it
+        slides, so its first message (and the cached prompt prefix) stays the
+        same for several turns instead of changing every turn.
+        """
+        window = settings.RETRIEVAL_RECENT_MESSAGES if settings.RETRIEVAL else settings.MAX_MEMORY_ENTRIES
+        if self.engine.context_cache is None:
+            return window
+        step = max(1, settings.CONTEXT_CACHE_WINDOW_STEP)
+        return window + max(0, self.memory.count() - window) % step
+    
+    def _save_turn(self, user_text: str, response: str, truncated: bool = False) -> None:
+        """Store one user/assistant exchange (marking a cut-off reply) and summarize old turns if due"""
+        self.memory.add_turn(user_text, mark_truncated(response) if truncated else response)
+        self._maybe_compact()
+    
+    def _finish_stream(self, user_text: str, parts: list, truncated: bool = False) -> None:
+        """Save a streamed turn and drop its draft checkpoint"""
+        self._save_turn(user_text, "".join(parts), truncated=truncated)
+        self.memory.discard_draft()
+    
+    def _abort_stream(self, user_text: str, parts: list) -> None:
+        """After a failed stream: keep a partial reply (marked truncated), or drop the draft if nothing arrived"""
+        if parts:
+            self._finish_stream(user_text, parts, truncated=True)
+        else:
+            self.memory.discard_draft()
+    
+    def _semantic_bucket(self, prompt_hint: str | None) -> str:
+        """Semantic cache bucket: answers are only shared within one role (and prompt hint)"""
+        role = self.controller.current_role.value
+        return f"{role}|{prompt_hint}" if prompt_hint else role
+    
+    def _semantic_lookup(self, bucket: str, user_input: str) -> str | None:
+        """Cached answer for a similar question, or None (cache errors never fail the turn)"""
+        if self.semantic_cache is None:
+            return None
+        try:
+            cached = self.semantic_cache.lookup(bucket, user_input)
+        except Exception:
+            logger.exception("Semantic cache lookup failed")
+            return None
+        if cached is not None:
+            logger.info("Semantic cache hit (bucket=%s)", bucket)
+        return cached
+    
+    def _cached_answer(self, bucket: str, user_input: str) -> str | None:
+        """Answer from the semantic cache or a prefetched follow-up, or None"""
+        cached = self._semantic_lookup(bucket, user_input)
+        if cached is None and self.prefetcher is not None:
+            cached = self.prefetcher.lookup(bucket, user_input)
+            if cached is not None:
+                logger.info("Answered from a prefetched follow-up (bucket=%s)", bucket)
+        return cached
+    
+    def _semantic_store(self, bucket: str, user_input: str, response: str) -> None:
+        """Remember a fresh answer in the semantic cache"""
+        if self.semantic_cache is None or not response:
+            return
+        try:
+            self.semantic_cache.add(bucket, user_input, response)
+        except Exception:
+            logger.exception("Semantic cache update failed")
+    
+    def _cancel_prefetch(self) -> None:
+        """Real input arrived: stop background prefetching so it doesn't compete with this turn"""
+        if self.prefetcher is not None:
+            self.prefetcher.cancel()
+    
+    def _prefetch_follow_ups(self, user_text: str, response: str) -> None:
+        """Start pre-answering likely next questions in the background (never fails the turn)"""
+        if self.prefetcher is None or not response:
+            return
+        try:
+            self.prefetcher.start(self._semantic_bucket(None), user_text, response)
+        except Exception:
+            logger.exception("Failed to start follow-up prefetching")
+    
+    def _maybe_compact(self) -> None:
+        """Fold old turns into the rolling summary if due (never fails the turn)"""
+        if self.compactor is None:
+            return
+        try:
+            self.compactor.maybe_compact()
+        except Exception:
+            logger.exception("Failed to start conversation summarization")
     
     def set_role(self, role: AssistantRole) -> str:
         """
@@ -133,8 +478,18 @@ class JarvisAssistant:
         Returns:
             str: Confirmation message
         """
+        # The sidebar calls this on every rerun; only a real change invalidates anything
+        if role != self.controller.current_role:
+            self._invalidate_context_cache()
+            if self.prefetcher is not None:
+                self.prefetcher.clear()
         return self.controller.set_role(role)
     
+    def _invalidate_context_cache(self) -> None:
+        """Drop this conversation's cached prompt prefix (it no longer matches)"""
+        if self.engine.context_cache is not None:
+            self.engine.context_cache.invalidate(self.cache_scope)
+    
     def get_available_roles(self):
         """
         Get list of available roles
@@ -161,6 +516,15 @@ class JarvisAssistant:
             "assistant_messages": summary["assistant_messages"]
         }
     
+    def get_memory_stats(self):
+        """
+        Get detailed statistics about conversation memory
+        
+        Returns:
+            dict: Counts per role, total characters and estimated tokens
+        """
+        return self.memory.get_stats()
+    
     def clear_memory(self) -> str:
         """
         Clear all conversation history
@@ -168,20 +532,45 @@ class JarvisAssistant:
         Returns:
             str: Confirmation message
         """
+        self._invalidate_context_cache()
+        if self.prefetcher is not None:
+            self.prefetcher.clear()
         return self.memory.clear()
     
-    def get_conversation_history(self):
+    def get_conversation_history(self, limit: int = None):
         """
-        Get full conversation history
+        Get conversation history
+        
+        Args:
+            limit (int, optional): Number of most recent messages (defaults to settings.MAX_MEMORY_ENTRIES)
         
         Returns:
-            list: List of conversation messages
+            list: List of conversation messages, oldest first
         """
-        return self.memory.get_history()
+        return self.memory.get_history(limit)
+    
+    def search_history(self, query: str, role: str = None, limit: int = 10):
+        """
+        Search the conversation for messages containing all words of `query`
+        
+        Args:
+            query (str): Words to look for
+            role (str, optional): Only "user" or "assistant" messages
+            limit (int): Max number of results
+        
+        Returns:
+            list: {"role", "content", "snippet", "score"} dicts, best match first
+        """
+        if not (query or "").strip():
+            return []
+        return self.memory.search(query, role=role, limit=limit)
     
     def export_conversation(self, format: str = "json") -> str:
         """
-        Export conversation to string format
+        Export the whole conversation to string format
+        
+        Messages are read with Memory.iter_all() (streamed from the database
+        with the SQLite backend), not limited to the recent prompt window.
         
         Args:
             format (str): "json" or "txt"
@@ -192,9 +581,8 @@ class JarvisAssistant:
         import json
         from datetime import datetime
         
-        history = self.memory.get_history()
-        
         if format == "json":
+            history = list(self.memory.iter_all())
             export_data = {
                 "exported_at": datetime.now().isoformat(),
                 "total_messages": len(history),
@@ -203,19 +591,23 @@ class JarvisAssistant:
             return json.dumps(export_data, indent=2)
         
         elif format == "txt":
+            body = []
+            total = 0
+            for msg in self.memory.iter_all():
+                role = "You" if msg["role"] == "user" else "JARVIS"
+                body.append(f"{role}:")
+                body.append(msg["content"])
+                body.append("")
+                total += 1
+            
             lines = []
             lines.append("=" * 60)
             lines.append("JARVIS Conversation Export")
             lines.append(f"Exported: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
-            lines.append(f"Total Messages: {len(history)}")
+            lines.append(f"Total Messages: {total}")
             lines.append("=" * 60)
             lines.append("")
-            
-            for msg in history:
-                role = "You" if msg["role"] == "user" else "JARVIS"
-                lines.append(f"{role}:")
-                lines.append(msg["content"])
-                lines.append("")
+            lines.extend(body)
             
             return "\n".join(lines)
         
@@ -0,0 +1,257 @@
+"""
+Audio Preprocessing Module
+Prepares recordings for speech-to-text with NumPy
+
+1. Decode in memory: WAV with the standard library; FLAC/AIFF through
+   SpeechRecognition; anything else (MP3, M4A, OGG, WebM...) through ffmpeg,
+   if it is installed
+2. Mix down to mono and resample to 16 kHz
+3. Energy-based voice activity detection: drop leading/trailing silence and
+   split the speech at long pauses
+
+Less audio reaches the recognizer, so transcription is faster (and cheaper).
+"""
+
+from __future__ import annotations
+
+import io
+import shutil
+import subprocess
+import wave
+from dataclasses import dataclass, field
+from typing import List, Tuple
+
+import numpy as np
+
+from config.settings import settings
+from jarvis.logger import get_logger
+from jarvis.speech_to_text import TranscriptionError
+
+logger = get_logger(__name__)
+
+TARGET_RATE = 16000
+
+# Decoded without ffmpeg (WAV via `wave`, the others via SpeechRecognition)
+NATIVE_FORMATS = {".wav", ".flac", ".aiff", ".aif", ".aifc"}
+
+
+class AudioDecodeError(TranscriptionError):
+    """Raised when a recording can't be decoded (message is shown to the user)."""
+
+
+@dataclass
+class PreparedAudio:
+    """
+    Result of preprocess()
+
+    Attributes:
+        segments: Speech segments (float32 mono at `sample_rate`), in order
+        sample_rate: Sample rate of the segments (16 kHz)
+        original_seconds: Length of the decoded recording
+    """
+    segments: List[np.ndarray] = field(default_factory=list)
+    sample_rate: int = TARGET_RATE
+    original_seconds: float = 0.0
+
+    @property
+    def speech_seconds(self) -> float:
+        return sum(len(segment) for segment in self.segments) / self.sample_rate
+
+
+def ffmpeg_available() -> bool:
+    """True if the configured ffmpeg binary can be found"""
+    return shutil.which(settings.FFMPEG_BINARY) is not None
+
+
+def decode(file_bytes: bytes, suffix: str) -> Tuple[np.ndarray, int]:
+    """
+    Decode a recording to mono float32 samples in [-1, 1]
+
+    Args:
+        file_bytes: Raw file bytes
+        suffix: File extension including dot, e.g. ".wav"
+
+    Returns:
+        Tuple[np.ndarray, int]: (samples, sample rate)
+
+    Raises:
+        AudioDecodeError: If the format is unsupported or the data is invalid
+    """
+    suffix = suffix.lower()
+    if suffix == ".wav":
+        try:
+            return _decode_wav(file_bytes)
+        except (wave.Error, EOFError, ValueError):
+            pass  # e.g. float or compressed WAV: let ffmpeg (or SpeechRecognition) try
+    if ffmpeg_available():
+        return _decode_ffmpeg(file_bytes)
+    if suffix in NATIVE_FORMATS:
+        return _decode_speech_recognition(file_bytes)
+    raise AudioDecodeError(f"Unsupported audio format ({suffix}). Install ffmpeg, or upload WAV or FLAC.")
+
+
+def _decode_wav(file_bytes: bytes) -> Tuple[np.ndarray, int]:
+    with wave.open(io.BytesIO(file_bytes), "rb") as reader:
+        channels = reader.getnchannels()
+        width = reader.getsampwidth()
+        rate = reader.getframerate()
+        raw = reader.readframes(reader.getnframes())
+    return _pcm_to_float(raw, width, channels), rate
+
+
+def _decode_speech_recognition(file_bytes: bytes) -> Tuple[np.ndarray, int]:
+    import speech_recognition as sr
+
+    try:
+        with sr.AudioFile(io.BytesIO(file_bytes)) as source:
+            audio = sr.Recognizer().record(source)
+    except Exception as e:
+        raise AudioDecodeError(f"Could not read the audio file: {e}")
+    return _pcm_to_float(audio.get_raw_data(convert_width=2), 2, 1), audio.sample_rate
+
+
+def _decode_ffmpeg(file_bytes: bytes) -> Tuple[np.ndarray, int]:
+    """Transcode through ffmpeg pipes (no temp files), straight to 16 kHz mono 16-bit PCM"""
+    result = subprocess.run(
+        [settings.FFMPEG_BINARY, "-hide_banner", "-loglevel", "error", "-i", "pipe:0",
+         "-f", "s16le", "-ac", "1", "-ar", str(TARGET_RATE), "pipe:1"],
+        input=file_bytes,
+        capture_output=True,
+        timeout=120,
+    )
+    if result.returncode != 0:
+        raise AudioDecodeError(f"ffmpeg could not decode the audio: {result.stderr.decode(errors='replace').strip()[:200]}")
+    return _pcm_to_float(result.stdout, 2, 1), TARGET_RATE
+
+
+def _pcm_to_float(raw: bytes, width: int, channels: int) -> np.ndarray:
+    """Interleaved little-endian PCM -> mono float32"""
+    if width == 1:
+        samples = (np.frombuffer(raw, dtype=np.uint8).astype(np.float32) - 128.0) / 128.0
+    elif width == 2:
+        samples = np.frombuffer(raw, dtype="<i2").astype(np.float32) / 32768.0
+    elif width == 3:
+        bytes3 = np.frombuffer(raw, dtype=np.uint8).reshape(-1, 3)
+        ints = (bytes3[:, 0].astype(np.int32) | (bytes3[:, 1].astype(np.int32) << 8) | (bytes3[:, 2].astype(np.int32) << 16))
+        ints = np.where(ints >= 1 << 23, ints - (1 << 24), ints)
+        samples = ints.astype(np.float32) / float(1 << 23)
+    elif width == 4:
+        samples = np.frombuffer(raw, dtype="<i4").astype(np.float32) / float(1 << 31)
+    else:
+        raise ValueError(f"Unsupported sample width: {width}")
+
+    if channels > 1:
+        samples = samples[: len(samples) - len(samples) % channels].reshape(-1, channels).mean(axis=1)
+    return samples
+
+
+def resample(samples: np.ndarray, rate: int, target_rate: int = TARGET_RATE) -> np.ndarray:
+    """
+    Resample by linear interpolation (low-pass filtered first when downsampling)
+
+    Good enough for speech recognition, which only needs the band below 8 kHz.
+    """
+    if rate == target_rate or len(samples) == 0:
+        return samples.astype(np.float32, copy=False)
+
+    if target_rate < rate:
+        # Windowed-sinc low-pass at the new Nyquist frequency, to avoid aliasing
+        cutoff = target_rate / rate / 2
+        taps = np.arange(-32, 33)
+        kernel = np.sinc(2 * cutoff * taps) * np.hamming(len(taps))
+        samples = np.convolve(samples, kernel / kernel.sum(), mode="same")
+
+    duration = len(samples) / rate
+    target_len = int(round(duration * target_rate))
+    positions = np.arange(target_len) * (rate / target_rate)
+    return np.interp(positions, np.arange(len(samples)), samples).astype(np.float32)
+
+
+def detect_speech(
+    samples: np.ndarray,
+    rate: int,
+    frame_ms: int = 30,
+    threshold_db: float = 12.0,
+    min_level_db: float = -50.0,
+    pad_ms: int = 200,
+    split_silence_s: float = 1.0,
+) -> List[Tuple[int, int]]:
+    """
+    Find speech regions by frame energy
+
+    A frame counts as speech if it is `threshold_db` above the noise floor (the
+    10th percentile of frame levels) and above `min_level_db` (dBFS). Speech
+    frames are padded by `pad_ms`; pauses shorter than `split_silence_s` are
+    bridged, longer ones split the audio.
+
+    Returns:
+        List[Tuple[int, int]]: (start, end) sample indexes of each speech segment
+    """
+    frame = max(1, int(rate * frame_ms / 1000))
+    n_frames = len(samples) // frame
+    if n_frames == 0:
+        return []
+
+    frames = samples[: n_frames * frame].reshape(n_frames, frame)
+    level_db = 10 * np.log10(np.mean(frames ** 2, axis=1) + 1e-12)
+
+    noise_floor = np.percentile(level_db, 10)
+    if np.percentile(level_db, 90) - noise_floor < threshold_db:
+        # No real quiet part (e.g. speech from start to end): keep everything loud enough
+        is_speech = level_db > min_level_db
+    else:
+        is_speech = level_db > max(noise_floor + threshold_db, min_level_db)
+
+    if not is_speech.any():
+        return []
+
+    # Pad speech frames so word onsets/endings aren't clipped
+    pad = int(round(pad_ms / frame_ms))
+    if pad:
+        is_speech = np.convolve(is_speech.astype(np.int32), np.ones(2 * pad + 1, dtype=np.int32), mode="same") > 0
+
+    # Runs of speech frames -> segments; bridge short pauses
+    edges = np.diff(np.concatenate(([0], is_speech.astype(np.int8), [0])))
+    starts = np.flatnonzero(edges == 1)
+    ends = np.flatnonzero(edges == -1)
+    max_gap = int(round(split_silence_s * 1000 / frame_ms))
+
+    segments: List[Tuple[int, int]] = []
+    for start, end in zip(starts, ends):
+        if segments and start - segments[-1][1] < max_gap:
+            segments[-1] = (segments[-1][0], end)
+        else:
+            segments.append((start, end))
+    return [(start * frame, min(end * frame, len(samples))) for start, end in segments]
+
+
+def preprocess(file_bytes: bytes, suffix: str) -> PreparedAudio:
+    """
+    Decode, resample to 16 kHz mono and cut a recording into speech segments
+
+    Raises:
+        AudioDecodeError: If the recording can't be decoded
+    """
+    samples, rate = decode(file_bytes, suffix)
+    samples = resample(samples, rate)
+    prepared = PreparedAudio(original_seconds=len(samples) / TARGET_RATE)
+
+    regions = detect_speech(
+        samples,
+        TARGET_RATE,
+        frame_ms=settings.VAD_FRAME_MS,
+        threshold_db=settings.VAD_THRESHOLD_DB,
+        pad_ms=settings.VAD_PAD_MS,
+        split_silence_s=settings.VAD_SPLIT_SILENCE_SECONDS,
+    )
+    prepared.segments = [samples[start:end] for start, end in regions]
+    logger.info(
+        "Audio preprocessed: %.1fs -> %.1fs of speech in %s segment(s)",
+        prepared.original_seconds, prepared.speech_seconds, len(prepared.segments),
+    )
+    return prepared
+
+
+def to_pcm16(samples: np.ndarray) -> bytes:
+    """Float samples -> little-endian 16-bit PCM bytes"""
+    return (np.clip(samples, -1.0, 1.0) * 32767).astype("<i2").tobytes()
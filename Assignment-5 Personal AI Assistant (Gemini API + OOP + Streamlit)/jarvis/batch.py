@@ -0,0 +1,222 @@
+"""
+Batch Module
+Offline bulk generation with bounded parallelism and resumable checkpoints
+
+Input: an iterator of prompts (strings or {"id": ..., "prompt": ...} dicts) or a
+JSONL file of the same. Each finished item is appended to an output JSONL file
+right away, so a crashed job can be restarted with the same arguments and only
+the missing (or failed) items are sent again.
+
+Usage:
+    python -m jarvis.batch prompts.jsonl results.jsonl --concurrency 8
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, Set, Tuple
+
+from jarvis.errors import JarvisError
+from jarvis.logger import get_logger, request_context
+
+logger = get_logger(__name__)
+
+
+@dataclass
+class BatchResult:
+    """
+    Outcome of one batch item
+
+    Attributes:
+        id: Item id (from the input, or its position)
+        prompt: The prompt that was sent
+        response: Model response (None if the item failed)
+        error: The JarvisError that made it fail (None on success)
+    """
+    id: str
+    prompt: str
+    response: str | None = None
+    error: JarvisError | None = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+    def to_record(self) -> Dict:
+        record = {"id": self.id, "prompt": self.prompt, "response": self.response, "error": None}
+        if self.error is not None:
+            record["error"] = {
+                "type": type(self.error).__name__,
+                "message": self.error.user_message,
+                "details": self.error.technical_message,
+            }
+        return record
+
+
+def read_prompts(source: str | Path | Iterable) -> Iterator[Tuple[str, str]]:
+    """
+    Normalize batch input into (id, prompt) pairs
+
+    Args:
+        source: Path to a JSONL file, or an iterable of strings / {"id", "prompt"} dicts
+
+    Yields:
+        Tuple[str, str]: (item id, prompt)
+    """
+    if isinstance(source, (str, Path)):
+        yield from _read_jsonl_prompts(Path(source))
+        return
+
+    for index, item in enumerate(source):
+        yield _as_pair(item, index)
+
+
+def _read_jsonl_prompts(path: Path) -> Iterator[Tuple[str, str]]:
+    with open(path, "r", encoding="utf-8") as f:
+        index = 0
+        for line in f:
+            if not line.strip():
+                continue
+            yield _as_pair(json.loads(line), index)
+            index += 1
+
+
+def _as_pair(item, index: int) -> Tuple[str, str]:
+    if isinstance(item, dict):
+        return str(item.get("id", index)), item["prompt"]
+    return str(index), str(item)
+
+
+def completed_ids(output_path: Path) -> Set[str]:
+    """
+    Ids that already have a successful result in an output file
+
+    A torn last line (from a crash mid-write) is ignored.
+    """
+    done: Set[str] = set()
+    if not output_path.exists():
+        return done
+    with open(output_path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if record.get("error") is None:
+                done.add(str(record["id"]))
+            else:
+                done.discard(str(record["id"]))
+    return done
+
+
+def generate_batch(
+    engine,
+    prompts: str | Path | Iterable,
+    *,
+    concurrency: int = 4,
+    output_path: str | Path | None = None,
+) -> Iterator[BatchResult]:
+    """
+    Run many prompts through engine.generate() with bounded parallelism
+
+    Results are yielded in completion order. At most `concurrency` requests are
+    in flight, and input is read lazily, so huge JSONL files are fine. Errors are
+    captured per item (as JarvisError) instead of stopping the batch.
+
+    Args:
+        engine: GeminiEngine (anything with generate(prompt) -> str)
+        prompts: JSONL path or iterable of strings / {"id", "prompt"} dicts
+        concurrency (int): Max requests in flight
+        output_path (optional): JSONL checkpoint file; items already completed there are skipped
+
+    Yields:
+        BatchResult: One per item that was run
+    """
+    output = Path(output_path) if output_path else None
+    done = completed_ids(output) if output else set()
+    if done:
+        logger.info("Resuming batch: %s items already completed", len(done))
+
+    out_file = None
+    if output is not None:
+        output.parent.mkdir(parents=True, exist_ok=True)
+        _drop_torn_tail(output)
+        out_file = open(output, "a", encoding="utf-8")
+
+    pending_items = ((item_id, prompt) for item_id, prompt in read_prompts(prompts) if item_id not in done)
+    try:
+        with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="jarvis-batch") as pool:
+            in_flight = {}
+            for item_id, prompt in pending_items:
+                in_flight[pool.submit(_run_one, engine, item_id, prompt)] = item_id
+                if len(in_flight) >= concurrency:
+                    yield from _drain(in_flight, out_file, FIRST_COMPLETED)
+            while in_flight:
+                yield from _drain(in_flight, out_file, FIRST_COMPLETED)
+    finally:
+        if out_file is not None:
+            out_file.close()
+
+
+def _run_one(engine, item_id: str, prompt: str) -> BatchResult:
+    with request_context(f"batch-{item_id}"):
+        try:
+            return BatchResult(item_id, prompt, response=engine.generate(prompt))
+        except JarvisError as e:
+            return BatchResult(item_id, prompt, error=e)
+        except Exception as e:
+            logger.exception("Unexpected error in batch item %s", item_id)
+            return BatchResult(item_id, prompt, error=JarvisError("❌ Unexpected error while generating.", technical_message=str(e)))
+
+
+def _drain(in_flight: Dict, out_file, return_when) -> Iterator[BatchResult]:
+    finished, _ = wait(list(in_flight), return_when=return_when)
+    for future in finished:
+        del in_flight[future]
+        result = future.result()
+        if out_file is not None:
+            out_file.write(json.dumps(result.to_record(), ensure_ascii=False) + "\n")
+            out_file.flush()
+            os.fsync(out_file.fileno())
+        yield result
+
+
+def _drop_torn_tail(path: Path) -> None:
+    """Cut a partial last line (from a crash mid-write) so new records start on a fresh line"""
+    if not path.exists() or path.stat().st_size == 0:
+        return
+    with open(path, "rb+") as f:
+        data = f.read()
+        if data.endswith(b"\n"):
+            return
+        f.truncate(data.rfind(b"\n") + 1)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Run a JSONL file of prompts through Gemini.")
+    parser.add_argument("input", help='JSONL file: one {"id": ..., "prompt": ...} object (or JSON string) per line')
+    parser.add_argument("output", help="JSONL results file (also the checkpoint for resuming)")
+    parser.add_argument("--concurrency", type=int, default=4, help="Max requests in flight (default: 4)")
+    args = parser.parse_args(argv)
+
+    from jarvis.gemini_engine import GeminiEngine
+
+    engine = GeminiEngine()
+    ok = failed = 0
+    for result in generate_batch(engine, args.input, concurrency=args.concurrency, output_path=args.output):
+        if result.ok:
+            ok += 1
+        else:
+            failed += 1
+            logger.warning("Item %s failed: %s", result.id, result.error.technical_message)
+    print(f"Batch finished: {ok} succeeded, {failed} failed -> {args.output}")
+    return 0 if failed == 0 else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
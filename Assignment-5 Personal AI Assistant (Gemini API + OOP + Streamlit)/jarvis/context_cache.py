@@ -0,0 +1,205 @@
+"""
+Context Cache Module
+Reuses the unchanged start of the prompt between turns (Gemini context caching)
+
+Every turn re-sends the system prompt, the summary and the conversation
+history, although they barely change from one turn to the next. Gemini can
+store such a prefix once (a CachedContent) and bill later requests that
+reference it at a reduced rate, without uploading it again.
+
+ContextCacheManager keeps one cache entry per conversation (PromptParts.scope):
+
+- A turn whose system instruction is unchanged and whose prefix starts with
+  the cached text reuses the entry: only the new part of the prefix and the
+  suffix (retrieved turns + user input) are sent.
+- A prefix of at least `min_tokens` with no usable entry (first turn, role
+  change, cleared or trimmed history, entry expired) is cached. So is one that
+  has grown `refresh_tokens` past its entry; the old entry is deleted.
+- Smaller prompts are sent as usual (Gemini has a minimum cache size).
+
+The entries themselves are created by a backend: GeminiCacheBackend for the
+real API, jarvis.fake_model.FakeCacheBackend offline.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import timedelta
+from typing import Any, Dict, Tuple
+
+from jarvis.logger import get_logger
+from jarvis.prompt_controller import PromptParts
+from jarvis.tokens import estimate_tokens
+
+logger = get_logger(__name__)
+
+# Entries are dropped locally this long before Gemini expires them, so a
+# request never references a cache that is about to disappear
+EXPIRY_MARGIN = 30
+
+
+def _digest(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+@dataclass
+class CacheEntry:
+    """One cached prefix: what it covers (hashes + length) and the backend handle"""
+    handle: Any
+    system_hash: str
+    prefix_hash: str
+    prefix_length: int
+    tokens: int
+    expires_at: float
+    hits: int = 0
+
+
+class GeminiCacheBackend:
+    """Creates and deletes google.generativeai CachedContent objects"""
+
+    def __init__(self, model_name: str):
+        self.model_name = model_name
+
+    def create(self, system_instruction: str, text: str, ttl_seconds: float):
+        from google.generativeai import caching
+
+        return caching.CachedContent.create(
+            model=self.model_name,
+            system_instruction=system_instruction,
+            contents=[text],
+            ttl=timedelta(seconds=ttl_seconds),
+        )
+
+    def delete(self, handle) -> None:
+        handle.delete()
+
+
+class ContextCacheManager:
+    """
+    Decides per request whether a cached prefix is reused, created or skipped
+
+    Thread-safe. Backend calls (network) happen outside the lock.
+
+    Attributes:
+        backend: Object with create(system_instruction, text, ttl_seconds) and delete(handle)
+        min_tokens: Smallest system + prefix worth caching
+        ttl_seconds: Lifetime of a cache entry
+        max_entries: Conversations cached at once (least recently used is deleted)
+        refresh_tokens: Uncached prefix growth that triggers a new entry
+    """
+
+    def __init__(
+        self,
+        backend,
+        min_tokens: int = 1024,
+        ttl_seconds: float = 600,
+        max_entries: int = 32,
+        refresh_tokens: int = 512,
+    ):
+        self.backend = backend
+        self.min_tokens = min_tokens
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max(1, max_entries)
+        self.refresh_tokens = refresh_tokens
+        self._entries: OrderedDict[str, CacheEntry] = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"created": 0, "reused": 0, "deleted": 0, "reused_tokens": 0, "uploaded_tokens": 0}
+
+    def resolve(self, prompt: PromptParts) -> Tuple[Any, str] | None:
+        """
+        Cache entry to send `prompt` with
+
+        Args:
+            prompt (PromptParts): The built prompt
+
+        Returns:
+            Tuple[Any, str] | None: (cache handle, text still to send), or
+            None to send the prompt without a cache
+        """
+        now = time.time()
+        system_hash = _digest(prompt.system)
+        tokens = estimate_tokens(prompt.system) + estimate_tokens(prompt.prefix)
+        hit = None
+        with self._lock:
+            stale = self._pop_expired(now)
+            entry = self._entries.get(prompt.scope)
+            if entry is not None and self._covers(entry, system_hash, prompt.prefix):
+                remainder = prompt.prefix[entry.prefix_length:]
+                if estimate_tokens(remainder) < self.refresh_tokens:
+                    self._entries.move_to_end(prompt.scope)
+                    entry.hits += 1
+                    self._stats["reused"] += 1
+                    self._stats["reused_tokens"] += entry.tokens
+                    logger.debug("Context cache hit (%s cached tokens, %s chars sent)", entry.tokens, len(remainder) + len(prompt.suffix))
+                    hit = (entry.handle, remainder + prompt.suffix)
+            if hit is None and entry is not None and tokens < self.min_tokens:
+                # The prompt changed under the entry (role, history) and is too small to re-cache
+                stale.append(self._entries.pop(prompt.scope))
+        self._delete(stale)
+        if hit is not None or tokens < self.min_tokens:
+            return hit
+
+        handle = self.backend.create(prompt.system, prompt.prefix, self.ttl_seconds)
+        entry = CacheEntry(
+            handle=handle,
+            system_hash=system_hash,
+            prefix_hash=_digest(prompt.prefix),
+            prefix_length=len(prompt.prefix),
+            tokens=tokens,
+            expires_at=now + self.ttl_seconds - EXPIRY_MARGIN,
+        )
+        with self._lock:
+            # Replaces the scope's old entry (different role/history, or outgrown)
+            stale = [self._entries.pop(prompt.scope)] if prompt.scope in self._entries else []
+            self._entries[prompt.scope] = entry
+            self._stats["created"] += 1
+            self._stats["uploaded_tokens"] += tokens
+            while len(self._entries) > self.max_entries:
+                stale.append(self._entries.popitem(last=False)[1])
+        logger.info("Context cache created (%s tokens)", tokens)
+        self._delete(stale)
+        return handle, prompt.suffix
+
+    def invalidate(self, scope: str) -> None:
+        """Drop the entry of one conversation (its role or history changed)"""
+        with self._lock:
+            entry = self._entries.pop(scope, None)
+        self._delete([entry] if entry is not None else [])
+
+    def clear(self) -> None:
+        with self._lock:
+            entries = list(self._entries.values())
+            self._entries.clear()
+        self._delete(entries)
+
+    def stats(self) -> Dict[str, int]:
+        """Counters: entries, created, reused, deleted, reused_tokens, uploaded_tokens"""
+        with self._lock:
+            return {"entries": len(self._entries), **self._stats}
+
+    @staticmethod
+    def _covers(entry: CacheEntry, system_hash: str, prefix: str) -> bool:
+        """True if `prefix` starts with exactly the text cached in `entry`"""
+        return (
+            entry.system_hash == system_hash
+            and len(prefix) >= entry.prefix_length
+            and _digest(prefix[:entry.prefix_length]) == entry.prefix_hash
+        )
+
+    def _pop_expired(self, now: float) -> list:
+        expired = [scope for scope, entry in self._entries.items() if entry.expires_at <= now]
+        return [self._entries.pop(scope) for scope in expired]
+
+    def _delete(self, entries) -> None:
+        """Delete entries at the backend (best effort: they expire on their own anyway)"""
+        for entry in entries:
+            try:
+                self.backend.delete(entry.handle)
+            except Exception:
+                logger.warning("Could not delete a context cache entry", exc_info=True)
+            with self._lock:
+                self._stats["deleted"] += 1
@@ -26,3 +26,9 @@ class GeminiRequestError(JarvisError):
     """Raised when Gemini request fails for other reasons."""
 
 
+class GeminiTransientError(GeminiRequestError):
+    """Raised when Gemini fails with a temporary server/network error (worth retrying)."""
+
+
+class GeminiTimeoutError(GeminiRequestError):
+    """Raised when a Gemini request takes longer than its timeout."""
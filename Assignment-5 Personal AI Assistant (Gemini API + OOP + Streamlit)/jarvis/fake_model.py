@@ -0,0 +1,162 @@
+"""
+Fake Model Module
+A local stand-in for genai.GenerativeModel (no network, deterministic)
+
+Pass it to GeminiEngine(model=FakeGenerativeModel()) to exercise the assistant
+offline, e.g. in tests or benchmarks.
+
+FakeCacheBackend stands in for Gemini context caching (see jarvis.context_cache):
+with GeminiEngine(model=..., context_cache=ContextCacheManager(FakeCacheBackend()))
+`model.requests` shows, per call, which part of the prompt came from a cache
+and which part was actually sent.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import time
+from dataclasses import dataclass
+from typing import Callable, List, Optional
+
+
+@dataclass
+class FakeResponse:
+    """Mimics the `.text` attribute of a Gemini response (or stream chunk)"""
+    text: str
+
+
+@dataclass
+class FakeCachedContent:
+    """Mimics genai.caching.CachedContent: a stored system instruction + prefix"""
+    name: str
+    system_instruction: str
+    text: str
+    expire_time: float
+    deleted: bool = False
+
+
+@dataclass
+class FakeRequest:
+    """What one generate call received, split the way Gemini would bill it"""
+    system_instruction: Optional[str]
+    cached: Optional[str]
+    contents: str
+
+
+class FakeCacheBackend:
+    """
+    Offline backend for jarvis.context_cache.ContextCacheManager
+
+    Attributes:
+        created: Every cache entry created (oldest first)
+        deleted: Names of deleted entries
+    """
+
+    def __init__(self):
+        self.created: List[FakeCachedContent] = []
+        self.deleted: List[str] = []
+
+    def create(self, system_instruction: str, text: str, ttl_seconds: float) -> FakeCachedContent:
+        content = FakeCachedContent(f"cachedContents/fake-{len(self.created)}", system_instruction, text, time.time() + ttl_seconds)
+        self.created.append(content)
+        return content
+
+    def delete(self, handle: FakeCachedContent) -> None:
+        handle.deleted = True
+        self.deleted.append(handle.name)
+
+
+class FakeGenerativeModel:
+    """
+    Deterministic fake of genai.GenerativeModel
+
+    Attributes:
+        reply: Function mapping a prompt to the reply text (default: echoes the last prompt line)
+        latency: Seconds to sleep per call, to simulate network time
+        chunk_size: Characters per chunk when streaming
+        calls: Prompts received so far (oldest first), with the system
+            instruction and cached prefix put back in front
+        requests: The same calls as FakeRequest (what was sent vs. reused)
+    """
+
+    def __init__(self, reply: Callable[[str], str] | None = None, latency: float = 0.0, chunk_size: int = 16):
+        self.reply = reply or self._echo
+        self.latency = latency
+        self.chunk_size = chunk_size
+        self.calls: List[str] = []
+        self.requests: List[FakeRequest] = []
+        self.system_instruction: str | None = None
+        self.cached_content: FakeCachedContent | None = None
+
+    def variant(self, system_instruction: str | None = None, cached_content: FakeCachedContent | None = None) -> "FakeGenerativeModel":
+        """
+        The same model with a system instruction or a cached prefix, like
+        GenerativeModel(name, system_instruction=...) / GenerativeModel.from_cached_content()
+
+        The variant shares `calls` and `requests` with this model.
+        """
+        model = FakeGenerativeModel(self.reply, self.latency, self.chunk_size)
+        model.calls = self.calls
+        model.requests = self.requests
+        model.system_instruction = system_instruction
+        model.cached_content = cached_content
+        return model
+
+    def _receive(self, prompt) -> str:
+        """Record a call; returns the full prompt the model sees"""
+        prompt = prompt if isinstance(prompt, str) else str(prompt)
+        cached = self.cached_content
+        if cached is not None:
+            if cached.deleted or cached.expire_time <= time.time():
+                raise RuntimeError(f"404 {cached.name} not found")
+            system, head = cached.system_instruction, cached.text
+        else:
+            system, head = self.system_instruction, ""
+        self.requests.append(FakeRequest(system, head if cached is not None else None, prompt))
+        full_prompt = f"{system}\n\n{head}{prompt}" if system is not None else head + prompt
+        self.calls.append(full_prompt)
+        return full_prompt
+
+    def generate_content(self, prompt, stream: bool = False, generation_config=None, **kwargs):
+        prompt = self._receive(prompt)
+        text = self.reply(prompt)
+
+        if not stream:
+            if self.latency:
+                time.sleep(self.latency)
+            return FakeResponse(text)
+        return self._stream(text)
+
+    async def generate_content_async(self, prompt, stream: bool = False, generation_config=None, **kwargs):
+        prompt = self._receive(prompt)
+        text = self.reply(prompt)
+
+        if not stream:
+            if self.latency:
+                await asyncio.sleep(self.latency)
+            return FakeResponse(text)
+        return self._astream(text)
+
+    def _chunks(self, text: str) -> List[str]:
+        return [text[i:i + self.chunk_size] for i in range(0, len(text), self.chunk_size)] or [""]
+
+    async def _astream(self, text: str):
+        chunks = self._chunks(text)
+        delay = self.latency / len(chunks) if self.latency else 0.0
+        for chunk in chunks:
+            if delay:
+                await asyncio.sleep(delay)
+            yield FakeResponse(chunk)
+
+    def _stream(self, text: str):
+        chunks = self._chunks(text)
+        delay = self.latency / len(chunks) if self.latency else 0.0
+        for chunk in chunks:
+            if delay:
+                time.sleep(delay)
+            yield FakeResponse(chunk)
+
+    @staticmethod
+    def _echo(prompt: str) -> str:
+        last_line = prompt.strip().splitlines()[-1] if prompt.strip() else ""
+        return f"Echo: {last_line}"
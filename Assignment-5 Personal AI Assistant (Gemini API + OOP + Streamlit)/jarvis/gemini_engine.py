@@ -1,44 +1,159 @@
 """
 Gemini API Engine Module
 Handles communication with Google Gemini API
+
+The google.generativeai SDK takes most of a second to import, so it is only
+imported when the first real request needs the model.
+
+Prompts built by PromptController (PromptParts) are sent in pieces: the role
+instructions as the model's system_instruction, and with context caching on
+(settings.CONTEXT_CACHE) the conversation prefix from a Gemini cache, so only
+what changed since the last turn is uploaded. Plain string prompts are sent
+as they are.
 """
 
-import google.generativeai as genai
+import asyncio
+import re
+import threading
+import time
+import weakref
+from collections import OrderedDict
+
 from config.settings import settings
-from jarvis.errors import GeminiQuotaExceededError, GeminiRequestError
+from jarvis.errors import (
+    JarvisError,
+    GeminiQuotaExceededError,
+    GeminiRequestError,
+    GeminiTimeoutError,
+    GeminiTransientError,
+)
+from jarvis.context_cache import ContextCacheManager, GeminiCacheBackend
 from jarvis.logger import get_logger
+from jarvis.prompt_controller import PromptParts
+from jarvis.rate_limiter import RateLimiter, RetryPolicy, CircuitBreaker, get_shared_limiter, get_shared_breaker
+from jarvis.response_cache import ResponseCache, make_cache_key
+from jarvis.tokens import estimate_tokens
 
 logger = get_logger(__name__)
 
+# Models kept per system instruction / cached content (see GeminiEngine._variant)
+_MAX_VARIANTS = 16
+
+
+# google.api_core exception classes (matched by name, so the SDK needn't be imported)
+_QUOTA_ERRORS = {"ResourceExhausted", "TooManyRequests"}
+_TRANSIENT_ERRORS = {"ServiceUnavailable", "InternalServerError", "DeadlineExceeded", "GatewayTimeout", "BadGateway"}
+_QUOTA_STATUS = {429}
+_TRANSIENT_STATUS = {500, 502, 503, 504}
+
+# Fallbacks for errors without a type/status: status codes only as whole words
+_QUOTA_MESSAGE = re.compile(r"\b429\b|resource[_ ]exhausted|quota|rate[ _-]?limit|too many requests", re.IGNORECASE)
+_TRANSIENT_MESSAGE = re.compile(
+    r"\b50[0234]\b|deadline|unavailable|internal error|connection reset|temporarily",
+    re.IGNORECASE,
+)
+
+
+def _error_kind(exc: Exception, msg: str) -> str:
+    """
+    "quota", "transient" or "request" for a failed call
+    
+    Decided by exception class (google.api_core), then HTTP status code, then
+    message text.
+    """
+    names = {cls.__name__ for cls in type(exc).__mro__}
+    if names & _QUOTA_ERRORS:
+        return "quota"
+    if names & _TRANSIENT_ERRORS:
+        return "transient"
+    
+    status = getattr(exc, "code", None)
+    if isinstance(status, int):
+        if status in _QUOTA_STATUS:
+            return "quota"
+        if status in _TRANSIENT_STATUS:
+            return "transient"
+    
+    if _QUOTA_MESSAGE.search(msg):
+        return "quota"
+    if _TRANSIENT_MESSAGE.search(msg):
+        return "transient"
+    return "request"
+
 
 class GeminiEngine:
     """
     Encapsulates Google Gemini API interactions
     Handles model initialization, response generation, and error handling
     
+    Every call goes through a rate limiter and circuit breaker shared by the
+    whole process, and quota/transient errors are retried with jittered
+    exponential backoff.
+    
+    The Gemini client is created lazily, on first use of `model`.
+    
     Attributes:
         model: The generative model instance
         api_key: API key from settings
         model_name: Model name from settings
+        cache: Optional ResponseCache for exactly repeated prompts
+        max_concurrency: Max async requests in flight at once (per event loop)
+        limiter: RateLimiter for requests/tokens per minute
+        retry: RetryPolicy for quota and transient errors
+        breaker: CircuitBreaker that fails fast while the quota is exhausted
+        context_cache: Optional ContextCacheManager for the prompt prefix
     """
     
-    def __init__(self):
+    def __init__(
+        self,
+        model=None,
+        cache: ResponseCache = None,
+        limiter: RateLimiter = None,
+        retry: RetryPolicy = None,
+        breaker: CircuitBreaker = None,
+        context_cache: ContextCacheManager = None,
+    ):
         """
         Initialize Gemini Engine with API key and model from settings
         
+        Args:
+            model (optional): Model object to use instead of genai.GenerativeModel
+                (e.g. jarvis.fake_model.FakeGenerativeModel for offline tests)
+            cache (ResponseCache, optional): Response cache (defaults to settings.RESPONSE_CACHE)
+            limiter (RateLimiter, optional): Defaults to the process-wide limiter
+            retry (RetryPolicy, optional): Defaults to settings.RETRY_* values
+            breaker (CircuitBreaker, optional): Defaults to the process-wide breaker
+            context_cache (ContextCacheManager, optional): Defaults to settings.CONTEXT_CACHE
+                (only for the real client; an injected model needs one passed in)
+        
         Raises:
-            RuntimeError: If API configuration fails
+            ValueError: If no model is given and GEMINI_API_KEY is not set
         """
+        if model is None:
+            settings.validate()
+        
         try:
             # Get settings
             self.api_key = settings.GEMINI_API_KEY
             self.model_name = settings.MODEL_NAME
+            self.cache = cache if cache is not None else self._create_default_cache()
+            self.max_concurrency = settings.MAX_CONCURRENT_REQUESTS
+            # asyncio primitives belong to one event loop, so keep a semaphore per loop
+            self._semaphores = weakref.WeakKeyDictionary()
+            
+            self.limiter = limiter or get_shared_limiter()
+            self.retry = retry or RetryPolicy(settings.RETRY_MAX_ATTEMPTS, settings.RETRY_BASE_DELAY, settings.RETRY_MAX_DELAY)
+            self.breaker = breaker or get_shared_breaker()
             
-            # Configure the Gemini API
-            genai.configure(api_key=self.api_key)
+            # The real client is built on first use (see the `model` property)
+            self._model = model
+            self._model_lock = threading.Lock()
+            self._owns_model = model is None
+            self._variants = OrderedDict()
             
-            # Initialize the model
-            self.model = genai.GenerativeModel(self.model_name)
+            if context_cache is None and model is None:
+                context_cache = self._create_default_context_cache()
+            self.context_cache = context_cache
             
             logger.info("Gemini Engine initialized with model: %s", self.model_name)
         
@@ -49,24 +164,195 @@ class GeminiEngine:
                 technical_message=str(e),
             )
 
+    @property
+    def model(self):
+        """The generative model; the Gemini SDK is imported and configured on first access"""
+        if self._model is None:
+            with self._model_lock:
+                if self._model is None:
+                    import google.generativeai as genai
+                    
+                    # Configure the Gemini API
+                    genai.configure(api_key=self.api_key)
+                    
+                    # Initialize the model
+                    self._model = genai.GenerativeModel(self.model_name)
+                    logger.info("Gemini client created for model: %s", self.model_name)
+        return self._model
+    
+    @model.setter
+    def model(self, model) -> None:
+        with self._model_lock:
+            self._model = model
+            self._owns_model = False
+            self._variants.clear()
+    
+    @staticmethod
+    def _create_default_cache():
+        """Create the response cache selected in settings (None when "off")"""
+        if settings.RESPONSE_CACHE == "off":
+            return None
+        return ResponseCache(
+            max_entries=settings.RESPONSE_CACHE_MAX_ENTRIES,
+            ttl_seconds=settings.RESPONSE_CACHE_TTL,
+            disk_path=settings.RESPONSE_CACHE_FILE if settings.RESPONSE_CACHE == "disk" else None,
+            max_disk_bytes=settings.RESPONSE_CACHE_MAX_DISK_BYTES,
+        )
+    
+    def _create_default_context_cache(self):
+        """Create the context cache manager if enabled in settings"""
+        if not settings.CONTEXT_CACHE:
+            return None
+        return ContextCacheManager(
+            GeminiCacheBackend(self.model_name),
+            min_tokens=settings.CONTEXT_CACHE_MIN_TOKENS,
+            ttl_seconds=settings.CONTEXT_CACHE_TTL,
+            max_entries=settings.CONTEXT_CACHE_MAX_ENTRIES,
+            refresh_tokens=settings.CONTEXT_CACHE_REFRESH_TOKENS,
+        )
+    
+    def _variant(self, system_instruction: str = None, cached_content=None):
+        """
+        The model with a system instruction or a cached prefix attached
+        
+        Returns:
+            The model variant, or None if the model can't take either (an
+            injected model without a variant() method)
+        """
+        model = self.model
+        if not self._owns_model and not hasattr(model, "variant"):
+            return None
+        key = ("cache", id(cached_content)) if cached_content is not None else ("system", system_instruction)
+        with self._model_lock:
+            variant = self._variants.get(key)
+            if variant is not None and (cached_content is None or variant[1] is cached_content):
+                self._variants.move_to_end(key)
+                return variant[0]
+        
+        if not self._owns_model:
+            variant = model.variant(system_instruction=system_instruction, cached_content=cached_content)
+        else:
+            import google.generativeai as genai
+            
+            if cached_content is not None:
+                variant = genai.GenerativeModel.from_cached_content(cached_content=cached_content)
+            else:
+                variant = genai.GenerativeModel(self.model_name, system_instruction=system_instruction)
+        with self._model_lock:
+            # The cached content is kept alongside, so its id can't be reused while stored
+            self._variants[key] = (variant, cached_content)
+            while len(self._variants) > _MAX_VARIANTS:
+                self._variants.popitem(last=False)
+        return variant
+    
+    def _prepare(self, prompt: str):
+        """
+        Model + contents for one request
+        
+        PromptParts go out as system instruction + the rest, or as a cached
+        prefix + whatever isn't cached (context caching). Anything else, or
+        a model that can't take the pieces, gets the whole prompt text.
+        
+        Returns:
+            tuple: (model, contents)
+        
+        Raises:
+            JarvisError: If the client can't be created
+        """
+        try:
+            return self._split(prompt)
+        except Exception as e:
+            logger.exception("Gemini client setup failed")
+            self._classify_and_raise(e)
+    
+    def _split(self, prompt: str):
+        if not isinstance(prompt, PromptParts):
+            return self.model, prompt
+        
+        if self.context_cache is not None:
+            try:
+                cached = self.context_cache.resolve(prompt)
+                if cached is not None:
+                    handle, contents = cached
+                    model = self._variant(cached_content=handle)
+                    if model is not None:
+                        return model, contents
+            except Exception:
+                # The cache is an optimization: send the prompt without it
+                logger.warning("Context cache unavailable; sending the full prompt", exc_info=True)
+        
+        model = self._variant(system_instruction=prompt.system)
+        if model is None:
+            return self.model, str(prompt)
+        return model, prompt.prefix + prompt.suffix
+    
+    async def _aprepare(self, prompt: str):
+        """_prepare() for async callers (creating a cache entry is a blocking API call)"""
+        if self.context_cache is None or not isinstance(prompt, PromptParts):
+            return self._prepare(prompt)
+        return await asyncio.to_thread(self._prepare, prompt)
+    
+    def _cache_key(self, prompt: str) -> str:
+        return make_cache_key(self.model_name, settings.TEMPERATURE, settings.MAX_TOKENS, prompt)
+    
+    def _generation_config(self):
+        # Plain dict form of genai.types.GenerationConfig (no SDK import needed)
+        return {
+            "temperature": settings.TEMPERATURE,
+            "max_output_tokens": settings.MAX_TOKENS,
+        }
+    
+    def _semaphore(self) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        semaphore = self._semaphores.get(loop)
+        if semaphore is None:
+            semaphore = self._semaphores[loop] = asyncio.Semaphore(self.max_concurrency)
+        return semaphore
+    
+    def _retry_delay(self, error: JarvisError, attempt: int) -> float | None:
+        """
+        Decide whether a failed attempt is retried
+        
+        Returns:
+            float | None: Seconds to wait before the next attempt, or None to give up
+        """
+        if isinstance(error, GeminiQuotaExceededError):
+            self.breaker.record_quota_error(error.technical_message)
+        elif not isinstance(error, GeminiTransientError):
+            return None
+        
+        if attempt + 1 >= self.retry.max_attempts or self.breaker.state == "open":
+            return None
+        delay = self.retry.delay(attempt)
+        logger.warning("Gemini call failed (%s); retry %s in %.1fs", error.technical_message, attempt + 1, delay)
+        return delay
+    
+    def _record_success(self, text: str) -> None:
+        self.breaker.record_success()
+        self.limiter.charge(estimate_tokens(text))
+    
     def _classify_and_raise(self, exc: Exception) -> None:
+        """
+        Raise the JarvisError type matching a failed Gemini call
+        
+        Quota is checked before transient failures: a 429 message can contain
+        other numbers (e.g. "quota_value: 1500") that must not make it look
+        like a retryable server error, or the circuit breaker would never see it.
+        """
         msg = str(exc) or exc.__class__.__name__
-        msg_lower = msg.lower()
-
-        # Common quota / rate / resource exhaustion signals across Gemini SDKs.
-        quota_markers = [
-            "resource_exhausted",
-            "quota",
-            "429",
-            "rate limit",
-            "too many requests",
-            "exceeded",
-        ]
-        if any(m in msg_lower for m in quota_markers):
+        kind = _error_kind(exc, msg)
+        
+        if kind == "quota":
             raise GeminiQuotaExceededError(
                 "⚠️ Gemini API limit reached (quota/rate limit). Please wait and try again, or use a different API key.",
                 technical_message=msg,
             )
+        
+        if kind == "transient":
+            raise GeminiTransientError(
+                "❌ Gemini is temporarily unavailable. Please try again.",
+                technical_message=msg,
+            )
 
         raise GeminiRequestError(
             "❌ Gemini request failed. Please try again.",
@@ -84,25 +370,70 @@ class GeminiEngine:
             str: The model's response
             
         Raises:
-            RuntimeError: If API call fails
+            GeminiQuotaExceededError / GeminiRequestError: If the API call fails (after retries)
         """
+        cache_key = None
+        if self.cache is not None:
+            cache_key = self._cache_key(prompt)
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                logger.debug("Response cache hit")
+                return cached
+        
+        prompt_tokens = estimate_tokens(prompt)
+        model, contents = self._prepare(prompt)
+        attempt = 0
+        while True:
+            self.breaker.check()
+            self.limiter.acquire(prompt_tokens)
+            try:
+                text = self._generate_once(model, contents)
+            except JarvisError as e:
+                delay = self._retry_delay(e, attempt)
+                if delay is None:
+                    raise
+                time.sleep(delay)
+                attempt += 1
+                continue
+            break
+        
+        self._record_success(text)
+        if cache_key is not None and text:
+            self.cache.put(cache_key, text)
+        
+        # Return the response text
+        return text
+    
+    def _generate_once(self, model, prompt: str) -> str:
+        """Single generate_content() call; errors are classified into JarvisError types"""
         try:
             # Generate content with settings
-            response = self.model.generate_content(
+            response = model.generate_content(
                 prompt,
-                generation_config=genai.types.GenerationConfig(
-                    temperature=settings.TEMPERATURE,
-                    max_output_tokens=settings.MAX_TOKENS
-                )
+                generation_config=self._generation_config()
             )
-            
-            # Return the response text
             return response.text
         
         except Exception as e:
             logger.exception("Gemini generate() failed")
             self._classify_and_raise(e)
     
+    def generate_batch(self, prompts, concurrency: int = 4, output_path=None):
+        """
+        Run many prompts with bounded parallelism (see jarvis.batch)
+        
+        Args:
+            prompts: JSONL file path, or an iterable of strings / {"id", "prompt"} dicts
+            concurrency (int): Max requests in flight
+            output_path (optional): JSONL checkpoint file; a rerun skips items already completed there
+        
+        Yields:
+            BatchResult: One per item, in completion order (failures carry a JarvisError)
+        """
+        from jarvis.batch import generate_batch
+        
+        return generate_batch(self, prompts, concurrency=concurrency, output_path=output_path)
+    
     def test_connection(self) -> bool:
         """
         Test if API connection is working
@@ -117,32 +448,263 @@ class GeminiEngine:
             print(f"Connection test failed: {e}")
             return False
     
-    def generate_stream(self, prompt: str):
+    def generate_stream(self, prompt: str, raise_errors: bool = False):
         """
         Generate response with streaming (word-by-word)
         
         Args:
             prompt (str): The prompt to send to the model
+            raise_errors (bool): Raise the JarvisError instead of yielding a final "Error: ..." chunk
             
         Yields:
             str: Response chunks as they arrive
         """
+        cache_key = None
+        if self.cache is not None:
+            cache_key = self._cache_key(prompt)
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                yield cached
+                return
+        
+        prompt_tokens = estimate_tokens(prompt)
+        model, contents = self._prepare(prompt)
+        attempt = 0
+        while True:
+            chunks = []
+            try:
+                self.breaker.check()
+                self.limiter.acquire(prompt_tokens)
+                try:
+                    response = model.generate_content(
+                        contents,
+                        stream=True,
+                        generation_config=self._generation_config()
+                    )
+                    for chunk in response:
+                        if chunk.text:
+                            chunks.append(chunk.text)
+                            yield chunk.text
+                except Exception as e:
+                    logger.exception("Gemini generate_stream() failed")
+                    self._classify_and_raise(e)
+            except JarvisError as e:
+                # Only retry if nothing was sent to the caller yet.
+                delay = None if chunks else self._retry_delay(e, attempt)
+                if delay is None:
+                    if raise_errors:
+                        raise
+                    # Streaming callers can choose to show the chunked error; keep it short but informative.
+                    yield f"Error: {e.user_message}"
+                    return
+                time.sleep(delay)
+                attempt += 1
+                continue
+            break
+        
+        # Only a stream that finished without errors is cached
+        text = "".join(chunks)
+        self._record_success(text)
+        if cache_key is not None and chunks:
+            self.cache.put(cache_key, text)
+    
+    def try_generate_stream(self, prompt: str):
+        """
+        Best-effort streaming for optional background work (see jarvis.prefetch)
+        
+        A single attempt that never waits: the request is only sent if the
+        circuit breaker is closed and the rate limiter has room right now. A
+        failure is not retried and is not recorded by the circuit breaker, so
+        optional work can't open it for real requests.
+        
+        Args:
+            prompt (str): The prompt to send to the model
+            
+        Returns:
+            Iterator[str] | None: Response chunks, or None if the request wasn't sent
+            
+        Raises:
+            JarvisError: While iterating, if the request fails
+        """
+        cache_key = self._cache_key(prompt) if self.cache is not None else None
+        if cache_key is not None:
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                return (chunk for chunk in [cached])
+        
+        if self.breaker.state != "closed" or not self.limiter.try_acquire(estimate_tokens(prompt)):
+            return None
+        return self._stream_once(prompt, cache_key)
+    
+    def _stream_once(self, prompt: str, cache_key: str | None):
+        chunks = []
         try:
-            response = self.model.generate_content(
-                prompt,
-                stream=True,
-                generation_config=genai.types.GenerationConfig(
-                    temperature=settings.TEMPERATURE,
-                    max_output_tokens=settings.MAX_TOKENS
+            model, contents = self._prepare(prompt)
+            try:
+                response = model.generate_content(
+                    contents,
+                    stream=True,
+                    generation_config=self._generation_config()
                 )
+                for chunk in response:
+                    if chunk.text:
+                        chunks.append(chunk.text)
+                        yield chunk.text
+            except Exception as e:
+                self._classify_and_raise(e)
+        finally:
+            # Output tokens count against the quota even if the caller stopped early
+            self.limiter.charge(estimate_tokens("".join(chunks)))
+        # Only reached when the stream finished without errors
+        if cache_key is not None and chunks:
+            self.cache.put(cache_key, "".join(chunks))
+
+    async def agenerate(self, prompt: str, timeout: float | None = None) -> str:
+        """
+        Async version of generate(): many calls can be in flight at once
+        
+        At most `max_concurrency` requests run concurrently; the rest wait their turn.
+        Cancelling the awaiting task cancels the request.
+        
+        Args:
+            prompt (str): The prompt to send to the model
+            timeout (float, optional): Seconds before giving up (defaults to settings.REQUEST_TIMEOUT)
+            
+        Returns:
+            str: The model's response
+            
+        Raises:
+            GeminiTimeoutError: If the request takes longer than `timeout`
+            GeminiQuotaExceededError / GeminiRequestError: If the API call fails
+        """
+        if timeout is None:
+            timeout = settings.REQUEST_TIMEOUT
+        
+        cache_key = None
+        if self.cache is not None:
+            cache_key = self._cache_key(prompt)
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                return cached
+        
+        prompt_tokens = estimate_tokens(prompt)
+        attempt = 0
+        async with self._semaphore():
+            model, contents = await self._aprepare(prompt)
+            while True:
+                self.breaker.check()
+                await self.limiter.aacquire(prompt_tokens)
+                try:
+                    text = await self._agenerate_once(model, contents, timeout)
+                except JarvisError as e:
+                    delay = self._retry_delay(e, attempt)
+                    if delay is None:
+                        raise
+                    await asyncio.sleep(delay)
+                    attempt += 1
+                    continue
+                break
+        
+        self._record_success(text)
+        if cache_key is not None and text:
+            self.cache.put(cache_key, text)
+        return text
+    
+    async def _agenerate_once(self, model, prompt: str, timeout: float) -> str:
+        """Single generate_content_async() call with a timeout; errors are classified"""
+        try:
+            response = await asyncio.wait_for(
+                model.generate_content_async(prompt, generation_config=self._generation_config()),
+                timeout,
+            )
+            return response.text
+        except asyncio.TimeoutError:
+            logger.warning("Gemini agenerate() timed out after %ss", timeout)
+            raise GeminiTimeoutError(
+                "⏱️ Gemini took too long to respond. Please try again.",
+                technical_message=f"Request timed out after {timeout}s",
             )
-            for chunk in response:
-                if chunk.text:
-                    yield chunk.text
         except Exception as e:
-            logger.exception("Gemini generate_stream() failed")
-            # Streaming callers can choose to show the chunked error; keep it short but informative.
-            try:
-                self._classify_and_raise(e)
-            except Exception as classified:
-                yield f"Error: {getattr(classified, 'user_message', str(classified))}"
+            logger.exception("Gemini agenerate() failed")
+            self._classify_and_raise(e)
+    
+    async def agenerate_stream(self, prompt: str, timeout: float | None = None, raise_errors: bool = False):
+        """
+        Async version of generate_stream()
+        
+        The timeout is a deadline for the whole stream; the concurrency slot is
+        held until the stream finishes or the consumer stops iterating.
+        
+        Args:
+            prompt (str): The prompt to send to the model
+            timeout (float, optional): Seconds before giving up (defaults to settings.REQUEST_TIMEOUT)
+            raise_errors (bool): Raise the JarvisError instead of yielding a final "Error: ..." chunk
+            
+        Yields:
+            str: Response chunks as they arrive
+        """
+        if timeout is None:
+            timeout = settings.REQUEST_TIMEOUT
+        
+        cache_key = None
+        if self.cache is not None:
+            cache_key = self._cache_key(prompt)
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                yield cached
+                return
+        
+        prompt_tokens = estimate_tokens(prompt)
+        attempt = 0
+        async with self._semaphore():
+            loop = asyncio.get_running_loop()
+            deadline = loop.time() + timeout
+            model, contents = await self._aprepare(prompt)
+            while True:
+                chunks = []
+                try:
+                    self.breaker.check()
+                    await self.limiter.aacquire(prompt_tokens)
+                    try:
+                        response = await asyncio.wait_for(
+                            model.generate_content_async(contents, stream=True, generation_config=self._generation_config()),
+                            deadline - loop.time(),
+                        )
+                        iterator = response.__aiter__()
+                        while True:
+                            try:
+                                chunk = await asyncio.wait_for(iterator.__anext__(), deadline - loop.time())
+                            except StopAsyncIteration:
+                                break
+                            if chunk.text:
+                                chunks.append(chunk.text)
+                                yield chunk.text
+                    except asyncio.TimeoutError:
+                        logger.warning("Gemini agenerate_stream() timed out after %ss", timeout)
+                        raise GeminiTimeoutError(
+                            "⏱️ Gemini took too long to respond. Please try again.",
+                            technical_message=f"Stream timed out after {timeout}s",
+                        )
+                    except JarvisError:
+                        raise
+                    except Exception as e:
+                        logger.exception("Gemini agenerate_stream() failed")
+                        self._classify_and_raise(e)
+                except JarvisError as e:
+                    # Same convention as generate_stream(): retry only before the first chunk,
+                    # otherwise surface the error as a final chunk.
+                    delay = None if chunks else self._retry_delay(e, attempt)
+                    if delay is None:
+                        if raise_errors:
+                            raise
+                        yield f"Error: {e.user_message}"
+                        return
+                    await asyncio.sleep(delay)
+                    attempt += 1
+                    continue
+                break
+        
+        text = "".join(chunks)
+        self._record_success(text)
+        if cache_key is not None and chunks:
+            self.cache.put(cache_key, text)
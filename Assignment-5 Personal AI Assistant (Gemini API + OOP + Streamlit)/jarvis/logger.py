@@ -2,25 +2,171 @@
 Logging setup for JARVIS.
 
 Writes logs to: logs/jarvis.log (rotating).
+
+Options (config/settings.py):
+- LOG_ASYNC: log calls only put the record on a queue; a background
+  QueueListener thread formats it and does the file/console I/O, so logging
+  (tracebacks included) costs the request thread almost nothing.
+- LOG_FORMAT: "text" (default) or "json" (one JSON object per line in the log
+  file, with the request id; the console stays human-readable).
+- LOG_DEBUG_SAMPLE_RATE: fraction of requests whose DEBUG records are kept
+  (the whole request or nothing). INFO and above are never sampled.
+
+Every record carries `request_id`: set with request_context() around one
+unit of work (a chat turn, a batch item); "-" outside of one.
 """
 
 from __future__ import annotations
 
+import atexit
+import contextvars
+import copy
+import json
 import logging
-from logging.handlers import RotatingFileHandler
+import queue
+import uuid
+import zlib
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
 from pathlib import Path
+from typing import Iterator
 
-
-_CONFIGURED = False
+from config.settings import settings
 
 
-def configure_logging(log_file: Path | None = None, level: int = logging.INFO) -> None:
-    global _CONFIGURED
+_CONFIGURED = False
+_LISTENER: QueueListener | None = None
+
+_request_id: contextvars.ContextVar[str | None] = contextvars.ContextVar("jarvis_request_id", default=None)
+
+# Attributes every LogRecord has; anything else came from `extra=` and goes into JSON output
+_RECORD_FIELDS = set(vars(logging.makeLogRecord({}))) | {"message", "asctime", "request_id"}
+
+
+def new_request_id() -> str:
+    return uuid.uuid4().hex[:12]
+
+
+def get_request_id() -> str | None:
+    """The request id of the current context (None outside of request_context())"""
+    return _request_id.get()
+
+
+@contextmanager
+def request_context(request_id: str | None = None) -> Iterator[str]:
+    """
+    Tag every log record inside the block with a request id
+
+    Nested blocks without an explicit id keep the outer one, so a chat turn
+    that goes through several layers logs under one id.
+
+    Args:
+        request_id (str, optional): Id to use (default: the current one, or a new one)
+
+    Yields:
+        str: The request id in effect
+    """
+    current = _request_id.get()
+    request_id = request_id or current or new_request_id()
+    token = _request_id.set(request_id)
+    try:
+        yield request_id
+    finally:
+        try:
+            _request_id.reset(token)
+        except ValueError:
+            # Closed from another context (e.g. a generator finished elsewhere)
+            _request_id.set(current)
+
+
+class RequestIdFilter(logging.Filter):
+    """Adds `record.request_id` (filters run on the thread that logged, where the context is)"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if not hasattr(record, "request_id"):
+            record.request_id = _request_id.get() or "-"
+        return True
+
+
+class DebugSampler(logging.Filter):
+    """
+    Keeps DEBUG records for a fraction of requests
+
+    The decision is a hash of the request id, so a sampled request keeps all
+    its debug lines. Records outside a request are sampled one by one.
+    """
+
+    def __init__(self, rate: float = 1.0):
+        super().__init__()
+        self.rate = max(0.0, min(1.0, rate))
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno > logging.DEBUG or self.rate >= 1.0:
+            return True
+        if self.rate <= 0.0:
+            return False
+        request_id = getattr(record, "request_id", None) or _request_id.get()
+        if request_id and request_id != "-":
+            key = zlib.crc32(request_id.encode("utf-8"))
+        else:
+            # Same answer for every handler this record passes through
+            key = zlib.crc32(f"{record.created}:{record.thread}:{record.lineno}".encode("utf-8"))
+        return key % 10_000 < self.rate * 10_000
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: ts, level, logger, request_id, message (+ exc, extra fields)"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "request_id": getattr(record, "request_id", "-"),
+            "message": record.getMessage(),
+            "thread": record.threadName,
+        }
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exc"] = record.exc_text
+        for key, value in vars(record).items():
+            if key not in _RECORD_FIELDS and key not in entry:
+                entry[key] = value
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class _DeferredQueueHandler(QueueHandler):
+    """
+    QueueHandler that leaves the formatting to the listener thread
+
+    The stock prepare() formats the whole record (traceback included) on the
+    calling thread. Here only the message is merged with its args (so later
+    changes to mutable args don't leak in); the exception is formatted by the
+    listener. The queue is in-process, so nothing needs to be picklable.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+
+def configure_logging(log_file: Path | None = None, level: int | None = None, *, use_queue: bool | None = None) -> None:
+    global _CONFIGURED, _LISTENER
     if _CONFIGURED:
         return
 
     if log_file is None:
         log_file = Path(__file__).parent.parent / "logs" / "jarvis.log"
+    if level is None:
+        level = logging.getLevelName(settings.LOG_LEVEL.upper())
+        if not isinstance(level, int):
+            level = logging.INFO
+    if use_queue is None:
+        use_queue = settings.LOG_ASYNC
 
     log_file.parent.mkdir(parents=True, exist_ok=True)
 
@@ -40,21 +186,43 @@ def configure_logging(log_file: Path | None = None, level: int = logging.INFO) -
         encoding="utf-8",
     )
     fh.setLevel(level)
-    fh.setFormatter(fmt)
-    root.addHandler(fh)
+    fh.setFormatter(JsonFormatter() if settings.LOG_FORMAT == "json" else fmt)
 
     # Console handler (useful in terminals)
     ch = logging.StreamHandler()
     ch.setLevel(level)
     ch.setFormatter(fmt)
-    root.addHandler(ch)
+
+    # Request id + sampling are decided on the calling thread (where the request context is)
+    filters = [RequestIdFilter(), DebugSampler(settings.LOG_DEBUG_SAMPLE_RATE)]
+
+    if use_queue:
+        qh = _DeferredQueueHandler(queue.SimpleQueue())
+        qh.setLevel(level)
+        for f in filters:
+            qh.addFilter(f)
+        root.addHandler(qh)
+        _LISTENER = QueueListener(qh.queue, fh, ch, respect_handler_level=True)
+        _LISTENER.start()
+        atexit.register(shutdown_logging)
+    else:
+        for handler in (fh, ch):
+            for f in filters:
+                handler.addFilter(f)
+            root.addHandler(handler)
 
     _CONFIGURED = True
 
 
+def shutdown_logging() -> None:
+    """Flush queued records and stop the listener thread (async mode; safe to call twice)"""
+    global _LISTENER
+    if _LISTENER is not None:
+        _LISTENER.stop()
+        _LISTENER = None
+
+
 def get_logger(name: str) -> logging.Logger:
     if not _CONFIGURED:
         configure_logging()
     return logging.getLogger(name)
-
-
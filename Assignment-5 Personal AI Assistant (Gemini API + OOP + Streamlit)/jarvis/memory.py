@@ -3,36 +3,110 @@ Memory Module
 Handles conversation memory and persistence
 """
 
-import json
+import re
+import threading
+from collections import Counter
 from pathlib import Path
-from typing import List, Dict
+from typing import List, Dict, Tuple
 from config.settings import settings
 from jarvis.logger import get_logger
+from jarvis.search import SearchIndex, expand_turns, search_result, tokenize
+from jarvis.tokens import estimate_tokens
+from jarvis.storage import MemoryStorage, JsonFileStorage, JournalStorage, MappedStorage, SQLiteStorage
 
 logger = get_logger(__name__)
 
+# Appended to a reply that was cut off (page rerun, crash, API error mid-stream)
+TRUNCATED_MARKER = "[reply interrupted]"
+
+
+def mark_truncated(text: str) -> str:
+    """Tag a partial reply so it reads as unfinished in the chat and in later prompts"""
+    text = text.rstrip()
+    return f"{text} … {TRUNCATED_MARKER}" if text else TRUNCATED_MARKER
+
 
 class Memory:
     """
     Manages conversation history storage and retrieval
-    Saves conversations to JSON file for persistence
+    Persists conversations through a pluggable storage backend
     Loads conversation history when app starts
     
+    With a queryable backend (SQLite, or the memory-mapped log) the history
+    stays in the backend and `conversations` is left empty; queries go
+    straight to the backend.
+    
+    Statistics (per-role counts, characters, estimated tokens) are kept as
+    running totals: rebuilt once on load, then updated by add()/clear().
+    
+    Older messages can be folded into a rolling summary (see
+    jarvis.summarizer.ConversationCompactor); get_context() then returns the
+    summary plus only the messages it doesn't cover.
+    
+    While a reply streams in, it is checkpointed as a draft (save_draft). A
+    draft still present on startup belongs to a turn that never finished; it
+    is saved as a normal turn, marked truncated.
+    
+    Every session has its own history: the SQLite backend keys its rows by
+    session_id, the file backends use one set of files per session (the
+    "default" session keeps the plain memory.json / memory.journal / memory.log
+    names). Writes are serialized with a lock, since several browser tabs of
+    one session share a Memory (see jarvis.pool).
+    
+    search() finds past messages by keyword: the SQLite backend uses its FTS5
+    index; the file backends build an in-process SearchIndex on the first
+    search and keep it current as messages are added.
+    
     Attributes:
         memory_file: Path to JSON file storing conversations
+        session_id: Conversation session this memory belongs to
+        storage: MemoryStorage backend used for persistence
         conversations: List of conversation messages in memory
+        summary_text: Rolling summary of the oldest messages ("" if none)
+        summary_covers: How many of the oldest messages the summary covers
     """
     
-    def __init__(self):
-        """Initialize Memory and load existing conversations from file"""
-        self.memory_file = settings.MEMORY_FILE
-        self.conversations = []
+    def __init__(self, storage: MemoryStorage = None, session_id: str = "default"):
+        """
+        Initialize Memory and load existing conversations from storage
+        
+        Args:
+            storage (MemoryStorage, optional): Backend to use (defaults to settings.MEMORY_BACKEND)
+            session_id (str): Session key (selects the rows / files holding this session's history)
+        """
+        self.session_id = session_id
+        self.memory_file = self._session_file(settings.MEMORY_FILE)
         
         # Create data directory if it doesn't exist
         self.memory_file.parent.mkdir(parents=True, exist_ok=True)
         
+        self.storage = storage or self._create_default_storage()
+        self.conversations = []
+        self._lock = threading.RLock()
+        self._search_index = None
+        self._index_ready = threading.Event()
+        self._index_ready.set()
+        
+        # Running statistics (see _rebuild_stats)
+        self._role_counts = Counter()
+        self._total_chars = 0
+        self._estimated_tokens = 0
+        
+        # Rolling summary; `generation` changes on clear() so stale summaries are discarded
+        self.summary_text = ""
+        self.summary_covers = 0
+        self.generation = 0
+        
         # Load existing conversations
         self._load_from_file()
+        self._rebuild_stats()
+        self._load_summary()
+        self._recover_draft()
+        
+        # Retrieval reads the search index on every turn: build it in the background
+        if settings.RETRIEVAL and self.conversations and not self.storage.queryable:
+            self._index_ready.clear()
+            threading.Thread(target=self._warm_index, name="jarvis-search-index", daemon=True).start()
         
         logger.info("Memory initialized (%s messages loaded)", len(self.conversations))
     
@@ -48,10 +122,31 @@ class Memory:
             "role": role.lower(),
             "content": content
         }
-        self.conversations.append(message)
+        with self._lock:
+            if not self.storage.queryable:
+                self.conversations.append(message)
+                if self._search_index is not None:
+                    self._search_index.add(message["role"], content)
+            self._count(message)
+            
+            # Persist just this message (a single journal append for the default backend)
+            try:
+                self.storage.append(message, self.conversations)
+            except Exception as e:
+                logger.exception("Error saving memory: %s", e)
+    
+    def add_turn(self, user_text: str, response: str) -> None:
+        """
+        Add a user message and its reply as one unit
         
-        # Save to file after each message
-        self._save_to_file()
+        Args:
+            user_text (str): The user message
+            response (str): The assistant reply
+        """
+        # Held across both adds so two tabs of one session can't interleave their turns
+        with self._lock:
+            self.add("user", user_text)
+            self.add("assistant", response)
     
     def get_history(self, limit: int = None) -> List[Dict]:
         """
@@ -66,9 +161,202 @@ class Memory:
         if limit is None:
             limit = settings.MAX_MEMORY_ENTRIES
         
+        if self.storage.queryable:
+            return self.storage.tail(limit)
+        
         # Return most recent conversations up to limit
         return self.conversations[-limit:] if self.conversations else []
     
+    def count(self) -> int:
+        """
+        Get the total number of stored messages
+        
+        Returns:
+            int: Message count (constant time)
+        """
+        return sum(self._role_counts.values())
+    
+    def get_context(self, limit: int = None) -> Tuple[str, List[Dict]]:
+        """
+        Get what the next prompt needs: the rolling summary plus recent messages
+        
+        Messages already folded into the summary are never returned again.
+        
+        Args:
+            limit (int, optional): Max number of recent messages (defaults to settings.MAX_MEMORY_ENTRIES)
+            
+        Returns:
+            Tuple[str, List[Dict]]: (summary text, recent messages not covered by it)
+        """
+        if limit is None:
+            limit = settings.MAX_MEMORY_ENTRIES
+        
+        uncovered = self.count() - self.summary_covers
+        limit = min(limit, uncovered)
+        history = self.get_history(limit) if limit > 0 else []
+        return self.summary_text, history
+    
+    def set_summary(self, text: str, covers: int, generation: int = None) -> bool:
+        """
+        Replace the rolling summary
+        
+        Args:
+            text (str): New summary text
+            covers (int): Number of oldest messages the summary covers
+            generation (int, optional): Memory generation the summary was built from;
+                if the memory was cleared since, the summary is dropped
+            
+        Returns:
+            bool: True if the summary was stored
+        """
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return False
+            
+            self.summary_text = text
+            self.summary_covers = covers
+            try:
+                self.storage.save_summary({"text": text, "covers": covers} if text else None)
+            except Exception as e:
+                logger.exception("Error saving memory summary: %s", e)
+            return True
+    
+    def save_draft(self, user_text: str, content: str) -> None:
+        """
+        Checkpoint a reply that is still streaming
+        
+        Args:
+            user_text (str): The user message being answered
+            content (str): Reply text received so far
+        """
+        try:
+            self.storage.save_draft({"user": user_text, "content": content})
+        except Exception as e:
+            logger.exception("Error saving reply draft: %s", e)
+    
+    def discard_draft(self) -> None:
+        """Drop the draft once its turn has been saved (or abandoned)"""
+        try:
+            self.storage.save_draft(None)
+        except Exception as e:
+            logger.exception("Error removing reply draft: %s", e)
+    
+    def search(self, query: str, role: str = None, limit: int = 10) -> List[Dict]:
+        """
+        Search past messages by keyword (every word must match)
+        
+        Args:
+            query (str): Words to look for
+            role (str, optional): Only "user" or "assistant" messages
+            limit (int): Max results
+            
+        Returns:
+            List[Dict]: {"role", "content", "snippet", "score"}, best match first
+        """
+        if self.storage.queryable:
+            try:
+                return self.storage.search(query, role=role, limit=limit)
+            except Exception as e:
+                logger.exception("Error searching memory: %s", e)
+                return []
+        
+        self._index_ready.wait()  # reuse the index being built in the background, if any
+        with self._lock:
+            hits = self._index().search(query, role=role, limit=limit)
+            terms = tokenize(query)
+            return [
+                search_result(self.conversations[position]["role"], self.conversations[position]["content"], terms, score)
+                for position, score in hits
+            ]
+    
+    def retrieve(self, query: str, exclude_recent: int = 0, limit: int = None) -> List[Dict]:
+        """
+        Find earlier turns relevant to the new input (for the prompt)
+        
+        Messages sharing the most (and rarest) content words with `query` are
+        ranked with BM25; each hit comes with the other half of its turn, so
+        the model sees the question together with its answer.
+        
+        Args:
+            query (str): The new user input
+            exclude_recent (int): Skip the newest messages (already in the prompt)
+            limit (int, optional): Max matching messages (defaults to settings.RETRIEVAL_TOP_K)
+            
+        Returns:
+            List[Dict]: Relevant messages, oldest first (empty if nothing matches)
+        """
+        if limit is None:
+            limit = settings.RETRIEVAL_TOP_K
+        if limit <= 0:
+            return []
+        
+        if self.storage.queryable:
+            try:
+                return self.storage.retrieve(query, exclude_recent=exclude_recent, limit=limit)
+            except Exception as e:
+                logger.exception("Error retrieving from memory: %s", e)
+                return []
+        
+        with self._lock:
+            end = len(self.conversations) - max(0, exclude_recent)
+            if end <= 0 or (self._search_index is None and not self._index_ready.is_set()):
+                return []  # still indexing a long history: answer without retrieval
+            hits = self._index().search(query, limit=limit, match_all=False, before=end)
+            positions = expand_turns(hits, lambda position: self.conversations[position]["role"], end)
+            return [self.conversations[position] for position in positions]
+    
+    def _index(self) -> SearchIndex:
+        """The in-process search index, built on first use (file backends; call under the lock)"""
+        if self._search_index is None:
+            self._search_index = SearchIndex()
+            self._search_index.add_all(self.conversations)
+        return self._search_index
+    
+    def _warm_index(self) -> None:
+        """Build the search index from a snapshot without holding the lock, then catch up"""
+        try:
+            with self._lock:
+                if self._search_index is not None:
+                    return
+                generation, snapshot = self.generation, list(self.conversations)
+            
+            index = SearchIndex()
+            index.add_all(snapshot)
+            
+            with self._lock:
+                # The history only grows (or is cleared, which bumps the generation)
+                if self._search_index is None and generation == self.generation:
+                    index.add_all(self.conversations[len(snapshot):])
+                    self._search_index = index
+        except Exception as e:
+            logger.exception("Error building the search index: %s", e)
+        finally:
+            self._index_ready.set()
+    
+    def wait_until_indexed(self, timeout: float = None) -> bool:
+        """
+        Wait for the background search indexing started at load time
+        
+        Args:
+            timeout (float, optional): Max seconds to wait
+            
+        Returns:
+            bool: True once no indexing is in progress
+        """
+        return self._index_ready.wait(timeout) and self.storage.wait_until_indexed(timeout)
+    
+    def iter_all(self):
+        """
+        Iterate over the full conversation history, oldest first
+        
+        Yields:
+            Dict: Conversation messages
+        """
+        if self.storage.queryable:
+            yield from self.storage.iter_messages()
+        else:
+            yield from list(self.conversations)
+    
     def clear(self) -> str:
         """
         Clear all conversation history
@@ -76,8 +364,17 @@ class Memory:
         Returns:
             str: Confirmation message
         """
-        self.conversations = []
-        self._save_to_file()
+        with self._lock:
+            self.conversations = []
+            self._search_index = None
+            self._reset_stats()
+            self.generation += 1
+            try:
+                self.storage.clear()
+            except Exception as e:
+                logger.exception("Error clearing memory: %s", e)
+            self.set_summary("", 0)
+            self.discard_draft()
         return "✓ Memory cleared"
     
     def get_summary(self) -> Dict:
@@ -88,28 +385,134 @@ class Memory:
             Dict: Statistics about stored conversations
         """
         return {
-            "total_messages": len(self.conversations),
-            "user_messages": len([m for m in self.conversations if m["role"] == "user"]),
-            "assistant_messages": len([m for m in self.conversations if m["role"] == "assistant"]),
-            "memory_file": str(self.memory_file)
+            "total_messages": sum(self._role_counts.values()),
+            "user_messages": self._role_counts["user"],
+            "assistant_messages": self._role_counts["assistant"],
+            "memory_file": str(self.storage.db_file if self.storage.queryable else self.memory_file)
         }
     
-    def _save_to_file(self) -> None:
-        """Save conversations to JSON file"""
+    def get_stats(self) -> Dict:
+        """
+        Get detailed memory statistics (constant time, from running totals)
+        
+        Returns:
+            Dict: Message counts per role, total characters and estimated tokens
+        """
+        total = sum(self._role_counts.values())
+        return {
+            "total_messages": total,
+            "messages_by_role": dict(self._role_counts),
+            "total_chars": self._total_chars,
+            "estimated_tokens": self._estimated_tokens,
+            "avg_chars_per_message": round(self._total_chars / total, 1) if total else 0.0,
+            "summarized_messages": self.summary_covers,
+            "session_id": self.session_id
+        }
+    
+    def close(self) -> None:
+        """Flush and release the storage backend"""
+        self.storage.close()
+    
+    def _count(self, message: Dict) -> None:
+        """Add one message to the running statistics"""
+        content = message.get("content", "")
+        self._role_counts[message.get("role", "")] += 1
+        self._total_chars += len(content)
+        self._estimated_tokens += estimate_tokens(content)
+    
+    def _reset_stats(self) -> None:
+        """Zero the running statistics"""
+        self._role_counts = Counter()
+        self._total_chars = 0
+        self._estimated_tokens = 0
+    
+    def _rebuild_stats(self) -> None:
+        """Recompute the running statistics from storage (called once on load)"""
+        self._reset_stats()
+        if self.storage.queryable:
+            try:
+                for role, stats in self.storage.role_stats().items():
+                    self._role_counts[role] = stats["messages"]
+                    self._total_chars += stats["chars"]
+                    self._estimated_tokens += stats["tokens"]
+            except Exception as e:
+                logger.exception("Error reading memory statistics: %s", e)
+            return
+        
+        for message in self.conversations:
+            self._count(message)
+    
+    def _load_summary(self) -> None:
+        """Load the stored rolling summary, ignoring one that doesn't match the history"""
         try:
-            with open(self.memory_file, "w") as f:
-                json.dump(self.conversations, f, indent=2)
+            summary = self.storage.load_summary()
         except Exception as e:
-            logger.exception("Error saving memory: %s", e)
+            logger.exception("Error loading memory summary: %s", e)
+            return
+        
+        if summary and 0 < summary.get("covers", 0) <= self.count():
+            self.summary_text = summary.get("text", "")
+            self.summary_covers = summary["covers"]
+    
+    def _recover_draft(self) -> None:
+        """Save a draft left behind by an interrupted stream as a truncated turn"""
+        try:
+            draft = self.storage.load_draft()
+        except Exception as e:
+            logger.exception("Error loading reply draft: %s", e)
+            return
+        if not draft:
+            return
+        
+        # A crash between saving the turn and removing the draft leaves the turn already stored.
+        last_two = self.get_history(2)
+        already_saved = (
+            len(last_two) == 2
+            and last_two[0]["role"] == "user"
+            and last_two[0]["content"] == draft["user"]
+            and last_two[1]["content"].startswith(draft["content"])
+        )
+        if not already_saved:
+            self.add("user", draft["user"])
+            self.add("assistant", mark_truncated(draft["content"]))
+            logger.info("Recovered an interrupted reply (%s chars)", len(draft["content"]))
+        self.discard_draft()
+    
+    def _session_file(self, path: Path) -> Path:
+        """This session's copy of a file backend path (memory.json -> memory.<session>.json)"""
+        if self.session_id == "default":
+            return path
+        name = re.sub(r"[^A-Za-z0-9_-]", "_", self.session_id)[:64]
+        return path.with_name(f"{path.stem}.{name}{path.suffix}")
+    
+    def _create_default_storage(self) -> MemoryStorage:
+        """Create the storage backend selected in settings"""
+        if settings.MEMORY_BACKEND == "json":
+            return JsonFileStorage(self.memory_file)
+        if settings.MEMORY_BACKEND == "journal":
+            return JournalStorage(
+                self.memory_file,
+                self._session_file(settings.MEMORY_JOURNAL_FILE),
+                compact_every=settings.MEMORY_COMPACT_EVERY,
+            )
+        if settings.MEMORY_BACKEND == "sqlite":
+            return SQLiteStorage(settings.MEMORY_DB_FILE, session_id=self.session_id)
+        if settings.MEMORY_BACKEND == "mmap":
+            # The first start imports the journal/JSON history
+            return MappedStorage(
+                self._session_file(settings.MEMORY_LOG_FILE),
+                import_from=JournalStorage(self.memory_file, self._session_file(settings.MEMORY_JOURNAL_FILE)),
+                warm_search=settings.RETRIEVAL,
+            )
+        raise ValueError(f"Unknown memory backend: {settings.MEMORY_BACKEND}")
     
     def _load_from_file(self) -> None:
-        """Load conversations from JSON file if it exists"""
+        """Load conversations from storage (the journal backend replays its journal here)"""
+        if self.storage.queryable:
+            # Nothing to load: history is queried from the backend on demand.
+            return
         try:
-            if self.memory_file.exists():
-                with open(self.memory_file, "r") as f:
-                    self.conversations = json.load(f)
-            else:
-                self.conversations = []
+            self.conversations = self.storage.load()
         except Exception as e:
             logger.exception("Error loading memory: %s", e)
             self.conversations = []
@@ -0,0 +1,313 @@
+"""
+Message Log Module
+Compact, memory-mapped on-disk history (used by storage.MappedStorage)
+
+Two append-only files:
+
+- <name>.log: message contents (UTF-8) back to back, nothing else
+- <name>.idx: a fixed header (count + per-role totals) followed by one
+  16-byte entry per message: content offset, content length, role code
+
+Both are read through mmap, so opening a log costs the same for 10 or
+10 million messages, and reading the newest N messages touches only the
+last N index entries and their contents. Per-role totals live in the
+header, so statistics don't need a scan either.
+
+Messages come back as Message records (__slots__, role interned as a small
+int) and are only turned into dicts at the storage API boundary.
+
+Appends write the content, then the index entry and header (fsync'd in that
+order). On open, a torn or half-written append from a crash is detected
+(header count vs. index size vs. log size) and rolled back. A log whose
+index is gone can't be split back into messages; it is moved aside
+(<name>.log.corrupt-<timestamp>), not overwritten.
+"""
+
+from __future__ import annotations
+
+import mmap
+import os
+import struct
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Tuple
+
+from jarvis.logger import get_logger
+from jarvis.tokens import estimate_tokens
+
+logger = get_logger(__name__)
+
+# Role codes are stored on disk: only append to this tuple
+ROLES = ("user", "assistant", "system")
+ROLE_CODES = {role: code for code, role in enumerate(ROLES)}
+
+MAGIC = b"JVMLOG01"
+# magic, message count, then (messages, chars, tokens) per role
+_HEADER = struct.Struct("<8sQ" + "QQQ" * len(ROLES))
+HEADER_SIZE = 128
+# content offset, content length in bytes, role code (+ 3 bytes padding)
+_ENTRY = struct.Struct("<QIB3x")
+ENTRY_SIZE = _ENTRY.size
+
+# Entries decoded per slice when iterating the whole log
+_BATCH = 4096
+
+
+class Message:
+    """One stored message (compact: no per-instance dict)"""
+
+    __slots__ = ("role_code", "content")
+
+    def __init__(self, role_code: int, content: str):
+        self.role_code = role_code
+        self.content = content
+
+    @property
+    def role(self) -> str:
+        return ROLES[self.role_code]
+
+    def as_dict(self) -> Dict:
+        return {"role": ROLES[self.role_code], "content": self.content}
+
+    def __repr__(self) -> str:
+        return f"Message({self.role!r}, {self.content[:40]!r})"
+
+
+class MessageLog:
+    """
+    Append-only message log with a memory-mapped index
+
+    Thread-safe: appends and remaps are serialized with a lock. Meant for one
+    writing process (like the journal backend).
+
+    Attributes:
+        log_file: Path to the contents file
+        index_file: Path to the index file
+    """
+
+    def __init__(self, log_file: Path, index_file: Path | None = None):
+        self.log_file = Path(log_file)
+        self.index_file = Path(index_file) if index_file else self.log_file.with_suffix(".idx")
+        self._lock = threading.Lock()
+        self._log = None
+        self._index = None
+        self._log_map: mmap.mmap | None = None
+        self._index_map: mmap.mmap | None = None
+        self._count = 0
+        self._log_size = 0
+        self._totals = [[0, 0, 0] for _ in ROLES]
+        self._open()
+
+    def __len__(self) -> int:
+        return self._count
+
+    def append(self, role: str, content: str) -> int:
+        """
+        Append one message (durable when this returns)
+
+        Returns:
+            int: Position of the new message
+
+        Raises:
+            ValueError: If the role is not one of ROLES
+        """
+        return self.extend([(role, content)]) - 1
+
+    def extend(self, messages: Iterable[Tuple[str, str]]) -> int:
+        """
+        Append (role, content) pairs with a single write + fsync per file
+
+        Returns:
+            int: Number of messages in the log afterwards
+
+        Raises:
+            ValueError: If a role is not one of ROLES (nothing is written)
+        """
+        encoded = []
+        for role, content in messages:
+            code = ROLE_CODES.get(role)
+            if code is None:
+                raise ValueError(f"Unsupported message role: {role!r}")
+            encoded.append((code, content, content.encode("utf-8")))
+        if not encoded:
+            return self._count
+
+        with self._lock:
+            entries = []
+            # Where the bytes will really land (after a failed append the log may be longer)
+            offset = self._log.seek(0, os.SEEK_END)
+            # Counted on a copy: if a write fails, the header keeps describing what's on disk
+            new_totals = [list(totals) for totals in self._totals]
+            for code, content, data in encoded:
+                entries.append(_ENTRY.pack(offset, len(data), code))
+                offset += len(data)
+                totals = new_totals[code]
+                totals[0] += 1
+                totals[1] += len(content)
+                totals[2] += estimate_tokens(content)
+
+            self._log.write(b"".join(data for _, _, data in encoded))
+            self._log.flush()
+            os.fsync(self._log.fileno())
+
+            self._index.seek(HEADER_SIZE + self._count * ENTRY_SIZE)
+            self._index.write(b"".join(entries))
+            self._count += len(encoded)
+            self._log_size = offset
+            self._totals = new_totals
+            self._write_header()
+            self._index.flush()
+            os.fsync(self._index.fileno())
+            return self._count
+
+    def tail(self, limit: int) -> List[Message]:
+        """The newest `limit` messages, oldest first"""
+        count = self._count
+        return self.read(max(0, count - max(0, limit)), count)
+
+    def read(self, start: int, stop: int) -> List[Message]:
+        """Messages at positions [start, stop), oldest first"""
+        with self._lock:
+            stop = min(stop, self._count)
+            if start >= stop:
+                return []
+            index_map, log_map = self._maps()
+            entries = index_map[HEADER_SIZE + start * ENTRY_SIZE:HEADER_SIZE + stop * ENTRY_SIZE]
+            return [
+                Message(code, log_map[offset:offset + length].decode("utf-8"))
+                for offset, length, code in _ENTRY.iter_unpack(entries)
+            ]
+
+    def get(self, position: int) -> Message:
+        messages = self.read(position, position + 1)
+        if not messages:
+            raise IndexError(position)
+        return messages[0]
+
+    def roles(self, start: int, stop: int) -> List[int]:
+        """Role codes of positions [start, stop) (no content is read)"""
+        with self._lock:
+            stop = min(stop, self._count)
+            if start >= stop:
+                return []
+            index_map, _ = self._maps()
+            entries = index_map[HEADER_SIZE + start * ENTRY_SIZE:HEADER_SIZE + stop * ENTRY_SIZE]
+        return [code for _, _, code in _ENTRY.iter_unpack(entries)]
+
+    def __iter__(self) -> Iterator[Message]:
+        count = self._count
+        for start in range(0, count, _BATCH):
+            yield from self.read(start, min(start + _BATCH, count))
+
+    def role_stats(self) -> Dict[str, Dict[str, int]]:
+        """Per-role totals from the header: role -> {"messages", "chars", "tokens"}"""
+        with self._lock:
+            return {
+                ROLES[code]: {"messages": messages, "chars": chars, "tokens": tokens}
+                for code, (messages, chars, tokens) in enumerate(self._totals)
+                if messages
+            }
+
+    def clear(self) -> None:
+        with self._lock:
+            # Mappings must be closed before the files can shrink (Windows)
+            self._close_maps()
+            self._log.truncate(0)
+            self._index.truncate(HEADER_SIZE)
+            self._count = 0
+            self._log_size = 0
+            self._totals = [[0, 0, 0] for _ in ROLES]
+            self._write_header()
+            self._index.flush()
+            os.fsync(self._index.fileno())
+
+    def close(self) -> None:
+        with self._lock:
+            self._close_maps()
+            for f in (self._log, self._index):
+                if f is not None:
+                    f.close()
+            self._log = self._index = None
+
+    def _open(self) -> None:
+        self.log_file.parent.mkdir(parents=True, exist_ok=True)
+        new = not self.index_file.exists()
+        if new and self.log_file.exists() and self.log_file.stat().st_size:
+            # Contents alone can't be split back into messages: keep them aside, never truncate them
+            orphan_file = self.log_file.with_name(f"{self.log_file.name}.corrupt-{int(time.time())}")
+            os.replace(self.log_file, orphan_file)
+            logger.error("Message log %s has no index; moved it to %s and starting a new log", self.log_file.name, orphan_file.name)
+        self._log = open(self.log_file, "a+b")
+        self._index = open(self.index_file, "w+b" if new else "r+b")
+        if new:
+            self._write_header()
+            self._index.flush()
+            return
+
+        self._index.seek(0)
+        header = self._index.read(_HEADER.size)
+        if len(header) < _HEADER.size or not header.startswith(MAGIC):
+            raise ValueError(f"{self.index_file} is not a message log index")
+        values = _HEADER.unpack(header)
+        self._count = values[1]
+        self._totals = [list(values[2 + 3 * code:5 + 3 * code]) for code in range(len(ROLES))]
+        self._recover()
+
+    def _recover(self) -> None:
+        """Roll back a partial append (index entries and log bytes past the last complete message)"""
+        index_size = os.fstat(self._index.fileno()).st_size
+        log_size = os.fstat(self._log.fileno()).st_size
+        entries = max(0, (index_size - HEADER_SIZE) // ENTRY_SIZE)
+
+        valid = min(entries, self._count)
+        end = 0
+        while valid:
+            self._index.seek(HEADER_SIZE + (valid - 1) * ENTRY_SIZE)
+            offset, length, _ = _ENTRY.unpack(self._index.read(ENTRY_SIZE))
+            end = offset + length
+            if end <= log_size:
+                break
+            valid -= 1
+            end = 0
+
+        if valid != self._count:
+            logger.warning("Message log %s: header says %s messages, %s are complete; recounting", self.index_file.name, self._count, valid)
+            self._count = valid
+            self._log_size = log_size
+            self._totals = [[0, 0, 0] for _ in ROLES]
+            for message in self:
+                totals = self._totals[message.role_code]
+                totals[0] += 1
+                totals[1] += len(message.content)
+                totals[2] += estimate_tokens(message.content)
+            self._write_header()
+        if index_size != HEADER_SIZE + valid * ENTRY_SIZE or log_size != end:
+            self._close_maps()
+            self._index.truncate(HEADER_SIZE + valid * ENTRY_SIZE)
+            self._log.truncate(end)
+            self._index.flush()
+            os.fsync(self._index.fileno())
+        self._log_size = end
+
+    def _write_header(self) -> None:
+        values = [value for totals in self._totals for value in totals]
+        self._index.seek(0)
+        self._index.write(_HEADER.pack(MAGIC, self._count, *values).ljust(HEADER_SIZE, b"\0"))
+
+    def _maps(self) -> Tuple[mmap.mmap, mmap.mmap]:
+        """Read-only mappings covering every complete message (re-mapped after appends; call under the lock)"""
+        if self._index is None:
+            raise ValueError("Message log is closed")
+        index_needed = HEADER_SIZE + self._count * ENTRY_SIZE
+        if self._index_map is None or len(self._index_map) < index_needed:
+            self._index_map = mmap.mmap(self._index.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._log_size and (self._log_map is None or len(self._log_map) < self._log_size):
+            self._log_map = mmap.mmap(self._log.fileno(), 0, access=mmap.ACCESS_READ)
+        return self._index_map, self._log_map if self._log_map is not None else b""
+
+    def _close_maps(self) -> None:
+        for mapping in (self._index_map, self._log_map):
+            if mapping is not None:
+                mapping.close()
+        self._index_map = self._log_map = None
@@ -0,0 +1,373 @@
+"""
+Metrics Module
+Per-turn latency and size instrumentation with pluggable sinks
+
+Each chat turn is recorded as a TurnTrace made of stage spans:
+
+    history       Memory.get_context() (summary + recent messages)
+    retrieve      Memory.retrieve() (earlier turns relevant to the input)
+    build_prompt  PromptController.build_prompt()
+    gemini        The model call (for streaming: first to last chunk)
+    first_token   Turn start -> first streamed chunk (streaming only)
+    persist       Saving the turn to memory
+    total         The whole turn
+    tts           Spoken reply (recorded on its own by TextToSpeech)
+
+Spans also carry prompt/response sizes (characters and estimated tokens).
+Finished turns go to every sink:
+
+- HistogramSink: in-process, always on; latency buckets plus a window of
+  recent values for p50/p95 (the sidebar panel reads it)
+- PrometheusFileSink: rewrites a Prometheus text-format file (for the
+  node_exporter textfile collector, or anything that scrapes files)
+- JsonlSink: appends one JSON line per turn
+
+Streaming spans are measured while the caller consumes the stream, so they
+include the time the caller spends between chunks (e.g. UI redraws).
+"""
+
+from __future__ import annotations
+
+import atexit
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional
+
+from config.settings import settings
+from jarvis.logger import get_logger, get_request_id
+from jarvis.tokens import estimate_tokens
+
+logger = get_logger(__name__)
+
+# Display order (other stage names are listed after these)
+STAGES = ("history", "retrieve", "build_prompt", "gemini", "first_token", "persist", "total", "tts")
+
+# Histogram bucket upper bounds, in seconds
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+class Span:
+    """One timed stage (seconds) with optional prompt/response sizes"""
+
+    __slots__ = ("stage", "seconds", "counts")
+
+    def __init__(self, stage: str, seconds: float = 0.0):
+        self.stage = stage
+        self.seconds = seconds
+        self.counts: Dict[str, int] = {}
+
+    def count(self, *, prompt: str | None = None, response: str | None = None) -> None:
+        """Record the size of the text this stage consumed / produced"""
+        if prompt is not None:
+            self.counts["prompt_chars"] = len(prompt)
+            self.counts["prompt_tokens"] = estimate_tokens(prompt)
+        if response is not None:
+            self.counts["response_chars"] = len(response)
+            self.counts["response_tokens"] = estimate_tokens(response)
+
+    def to_record(self) -> dict:
+        return {"stage": self.stage, "ms": round(self.seconds * 1000, 3), **self.counts}
+
+
+class TurnTrace:
+    """
+    Spans of one turn, emitted to the sinks by finish()
+
+    Attributes:
+        kind: What produced the turn ("respond", "respond_stream", ...)
+        status: "ok", "error" or "truncated" (set by the caller before finish())
+    """
+
+    def __init__(self, metrics: "Metrics | None", kind: str):
+        self.metrics = metrics
+        self.kind = kind
+        self.status = "ok"
+        self.request_id = get_request_id()
+        self.spans: List[Span] = []
+        self.total = Span("total")
+        self._started = time.perf_counter()
+        self._marked = set()
+        self._finished = False
+
+    @contextmanager
+    def span(self, stage: str) -> Iterator[Span]:
+        """Time the block as `stage` (recorded even if it raises)"""
+        span = Span(stage)
+        start = time.perf_counter()
+        try:
+            yield span
+        finally:
+            span.seconds = time.perf_counter() - start
+            self.spans.append(span)
+
+    def mark(self, stage: str) -> None:
+        """Record time since the turn started as `stage` (first call only), e.g. first_token"""
+        if stage not in self._marked:
+            self._marked.add(stage)
+            self.spans.append(Span(stage, time.perf_counter() - self._started))
+
+    def count(self, *, prompt: str | None = None, response: str | None = None) -> None:
+        """Sizes for the turn as a whole (stored on the total span)"""
+        self.total.count(prompt=prompt, response=response)
+
+    def finish(self) -> None:
+        """Close the total span and send the turn to the sinks (once)"""
+        if self._finished:
+            return
+        self._finished = True
+        self.total.seconds = time.perf_counter() - self._started
+        self.spans.append(self.total)
+        if self.metrics is not None:
+            self.metrics.emit(self.to_record())
+
+    def to_record(self) -> dict:
+        return {
+            "ts": time.time(),
+            "kind": self.kind,
+            "status": self.status,
+            "request_id": self.request_id,
+            "spans": [span.to_record() for span in self.spans],
+        }
+
+
+class MetricsSink:
+    """Base class: receives one record per finished turn (see TurnTrace.to_record())"""
+
+    def emit(self, record: dict) -> None:
+        raise NotImplementedError
+
+    def flush(self) -> None:
+        """Write out anything buffered (called at exit)"""
+
+
+class _StageStats:
+    __slots__ = ("count", "sum", "buckets", "recent", "tokens")
+
+    def __init__(self, window: int):
+        self.count = 0
+        self.sum = 0.0
+        self.buckets = [0] * len(BUCKETS)
+        self.recent = deque(maxlen=window)
+        self.tokens = {"prompt": 0, "response": 0}
+
+
+class HistogramSink(MetricsSink):
+    """
+    In-process latency histograms per stage
+
+    Cumulative buckets (for Prometheus) plus the last `window` values of each
+    stage, which give exact recent percentiles for the UI.
+    """
+
+    def __init__(self, window: int = 1000):
+        self.window = window
+        self._stages: Dict[str, _StageStats] = {}
+        self._lock = threading.Lock()
+
+    def emit(self, record: dict) -> None:
+        with self._lock:
+            for span in record["spans"]:
+                stats = self._stages.get(span["stage"])
+                if stats is None:
+                    stats = self._stages[span["stage"]] = _StageStats(self.window)
+                seconds = span["ms"] / 1000
+                stats.count += 1
+                stats.sum += seconds
+                for i, bound in enumerate(BUCKETS):
+                    if seconds <= bound:
+                        stats.buckets[i] += 1
+                stats.recent.append(seconds)
+                stats.tokens["prompt"] += span.get("prompt_tokens", 0)
+                stats.tokens["response"] += span.get("response_tokens", 0)
+
+    def percentile(self, stage: str, q: float) -> Optional[float]:
+        """q-th percentile (0-100, nearest rank) of the recent `stage` latencies, in seconds"""
+        with self._lock:
+            stats = self._stages.get(stage)
+            values = sorted(stats.recent) if stats else []
+        if not values:
+            return None
+        rank = max(1, -(-len(values) * q // 100))
+        return values[int(rank) - 1]
+
+    def summary(self) -> List[dict]:
+        """One row per stage: count, p50/p95/mean in ms and token totals (STAGES order first)"""
+        with self._lock:
+            names = [s for s in STAGES if s in self._stages] + sorted(set(self._stages) - set(STAGES))
+            snapshot = {name: (self._stages[name].count, self._stages[name].sum, dict(self._stages[name].tokens)) for name in names}
+        rows = []
+        for name in names:
+            count, total, tokens = snapshot[name]
+            rows.append({
+                "stage": name,
+                "count": count,
+                "p50_ms": round(self.percentile(name, 50) * 1000, 1),
+                "p95_ms": round(self.percentile(name, 95) * 1000, 1),
+                "mean_ms": round(total / count * 1000, 1),
+                "prompt_tokens": tokens["prompt"],
+                "response_tokens": tokens["response"],
+            })
+        return rows
+
+    def render_prometheus(self) -> str:
+        """All stages in the Prometheus text exposition format"""
+        lines = [
+            "# HELP jarvis_stage_latency_seconds Latency of each stage of a JARVIS turn",
+            "# TYPE jarvis_stage_latency_seconds histogram",
+        ]
+        token_lines = [
+            "# HELP jarvis_stage_tokens_total Estimated tokens handled per stage",
+            "# TYPE jarvis_stage_tokens_total counter",
+        ]
+        with self._lock:
+            for name in sorted(self._stages):
+                stats = self._stages[name]
+                for bound, hits in zip(BUCKETS, stats.buckets):
+                    lines.append(f'jarvis_stage_latency_seconds_bucket{{stage="{name}",le="{bound:g}"}} {hits}')
+                lines.append(f'jarvis_stage_latency_seconds_bucket{{stage="{name}",le="+Inf"}} {stats.count}')
+                lines.append(f'jarvis_stage_latency_seconds_sum{{stage="{name}"}} {stats.sum:.6f}')
+                lines.append(f'jarvis_stage_latency_seconds_count{{stage="{name}"}} {stats.count}')
+                for kind, tokens in stats.tokens.items():
+                    if tokens:
+                        token_lines.append(f'jarvis_stage_tokens_total{{stage="{name}",kind="{kind}"}} {tokens}')
+        return "\n".join(lines + token_lines) + "\n"
+
+
+class PrometheusFileSink(MetricsSink):
+    """
+    Rewrites a Prometheus text file from a HistogramSink
+
+    At most every `interval` seconds (and at exit); the file is replaced
+    atomically, so a scraper never reads half of it.
+    """
+
+    def __init__(self, path: Path, histogram: HistogramSink, interval: float = 10.0):
+        self.path = Path(path)
+        self.histogram = histogram
+        self.interval = interval
+        self._last_write = 0.0
+        self._lock = threading.Lock()
+
+    def emit(self, record: dict) -> None:
+        if time.monotonic() - self._last_write >= self.interval:
+            self.flush()
+
+    def flush(self) -> None:
+        with self._lock:
+            self._last_write = time.monotonic()
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.path.with_suffix(self.path.suffix + ".tmp")
+            tmp.write_text(self.histogram.render_prometheus(), encoding="utf-8")
+            os.replace(tmp, self.path)
+
+
+class JsonlSink(MetricsSink):
+    """Appends every turn record as one JSON line"""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+
+    def emit(self, record: dict) -> None:
+        line = json.dumps(record, ensure_ascii=False) + "\n"
+        with self._lock:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line)
+
+
+class Metrics:
+    """
+    Fans turn records out to the sinks
+
+    The HistogramSink is always present (metrics.histogram); more sinks can be
+    added with add_sink(). A failing sink is logged and never fails a turn.
+    """
+
+    def __init__(self, sinks: List[MetricsSink] | None = None, window: int = 1000, enabled: bool = True):
+        self.enabled = enabled
+        self.histogram = HistogramSink(window)
+        self.sinks: List[MetricsSink] = [self.histogram, *(sinks or [])]
+
+    def add_sink(self, sink: MetricsSink) -> None:
+        self.sinks.append(sink)
+
+    def start_turn(self, kind: str) -> TurnTrace:
+        """New trace for one turn (a no-op trace when metrics are disabled)"""
+        return TurnTrace(self if self.enabled else None, kind)
+
+    @contextmanager
+    def timed(self, stage: str) -> Iterator[Span]:
+        """Time a stage that isn't part of a turn (e.g. tts); emitted as its own record"""
+        trace = self.start_turn(stage)
+        try:
+            with trace.span(stage) as span:
+                yield span
+        except Exception:
+            trace.status = "error"
+            raise
+        finally:
+            if trace.metrics is not None:
+                self.emit(trace.to_record())
+
+    def emit(self, record: dict) -> None:
+        for sink in self.sinks:
+            try:
+                sink.emit(record)
+            except Exception:
+                logger.exception("Metrics sink %s failed", type(sink).__name__)
+
+    def summary(self) -> List[dict]:
+        """Per-stage p50/p95 rows (see HistogramSink.summary())"""
+        return self.histogram.summary()
+
+    def flush(self) -> None:
+        for sink in self.sinks:
+            try:
+                sink.flush()
+            except Exception:
+                logger.exception("Metrics sink %s failed to flush", type(sink).__name__)
+
+
+_metrics: Metrics | None = None
+_metrics_lock = threading.Lock()
+
+
+def create_sinks(names: str, histogram: HistogramSink) -> List[MetricsSink]:
+    """
+    Export sinks from a comma-separated list
+
+    Export is optional: an unknown name (e.g. a typo in JARVIS_METRICS_EXPORT)
+    is logged and skipped, so it can't break every turn that records metrics.
+
+    Args:
+        names: e.g. "prometheus,jsonl" ("" for none)
+        histogram: The histogram the Prometheus file is rendered from
+    """
+    sinks: List[MetricsSink] = []
+    for name in filter(None, (part.strip() for part in names.split(","))):
+        if name == "prometheus":
+            sinks.append(PrometheusFileSink(settings.METRICS_PROMETHEUS_FILE, histogram, settings.METRICS_PROMETHEUS_INTERVAL))
+        elif name == "jsonl":
+            sinks.append(JsonlSink(settings.METRICS_JSONL_FILE))
+        else:
+            logger.warning("Unknown metrics sink %r ignored (expected: prometheus, jsonl)", name)
+    return sinks
+
+
+def get_metrics() -> Metrics:
+    """Process-wide Metrics configured from settings (created on first use)"""
+    global _metrics
+    with _metrics_lock:
+        if _metrics is None:
+            metrics = Metrics(window=settings.METRICS_WINDOW, enabled=settings.METRICS)
+            for sink in create_sinks(settings.METRICS_EXPORT, metrics.histogram):
+                metrics.add_sink(sink)
+            atexit.register(metrics.flush)
+            _metrics = metrics
+        return _metrics
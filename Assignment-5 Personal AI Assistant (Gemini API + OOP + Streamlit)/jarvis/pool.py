@@ -0,0 +1,68 @@
+"""
+Pool Module
+Process-wide shared resources, reused by every session
+
+Building a JarvisAssistant used to configure a new Gemini client for each
+browser session. Only the pieces that hold no per-session state are shared:
+
+- GeminiEngine: the model client (plus its response cache), one per process
+- Memory: one per session id (never shared between sessions), reused by all
+  browser tabs of that session while any of them holds it
+- ConversationCompactor: one per Memory, so a history is summarized once
+"""
+
+from __future__ import annotations
+
+import threading
+import weakref
+
+from config.settings import settings
+from jarvis.gemini_engine import GeminiEngine
+from jarvis.memory import Memory
+from jarvis.summarizer import ConversationCompactor, create_summarizer
+
+_lock = threading.Lock()
+_shared = {}
+_memories = weakref.WeakValueDictionary()
+_compactors = weakref.WeakKeyDictionary()
+
+
+def get_shared_engine() -> GeminiEngine:
+    """Process-wide GeminiEngine (created on first use)"""
+    with _lock:
+        if "engine" not in _shared:
+            _shared["engine"] = GeminiEngine()
+        return _shared["engine"]
+
+
+def get_shared_memory(session_id: str = "default") -> Memory:
+    """
+    Memory for a session
+
+    Args:
+        session_id (str): Conversation session key
+
+    Returns:
+        Memory: The session's Memory (shared by its open tabs, loaded on first use)
+    """
+    with _lock:
+        memory = _memories.get(session_id)
+        if memory is None:
+            memory = Memory(session_id=session_id)
+            _memories[session_id] = memory
+        return memory
+
+
+def get_compactor(memory: Memory, engine: GeminiEngine) -> ConversationCompactor | None:
+    """
+    The ConversationCompactor for a Memory (one per Memory, None if summaries are off)
+
+    Args:
+        memory (Memory): Memory to summarize
+        engine (GeminiEngine): Engine used by the Gemini summarizer (only when first created)
+    """
+    with _lock:
+        if memory not in _compactors:
+            summarizer = create_summarizer(settings.SUMMARIZER, engine)
+            _compactors[memory] = ConversationCompactor(memory, summarizer) if summarizer else None
+        return _compactors[memory]
@@ -0,0 +1,252 @@
+"""
+Prefetch Module
+Answers likely follow-up questions in the background, while the user reads
+
+After a reply, FollowUpPrefetcher asks Gemini for a few questions the user
+will probably ask next and answers them on a small worker pool, with the same
+conversation context a real turn would get. The answers are kept for a short
+time; the next message gets one at once if it asks the same question: close
+enough by the jarvis.semantic_cache similarity, with the same topic words in
+the same order ("convert a set to a list" is not "convert a list to a set").
+
+Prefetching is optional work, so it always gives way to real requests:
+
+- New input cancels the round: queued requests never start, streaming ones
+  stop at their next chunk, and late answers are dropped.
+- Each request is a single attempt (GeminiEngine.try_generate_stream): it is
+  only sent when the shared rate limiter has room right now, so it never makes
+  a real request wait; failures are not retried and don't count towards the
+  circuit breaker.
+- The worker pool and a second limiter holding PREFETCH_RATE_SHARE of the
+  quota are process-wide, so the cap holds for all sessions together.
+- A round is abandoned after `budget_seconds`.
+"""
+
+from __future__ import annotations
+
+import re
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, List
+
+from config.settings import settings
+from jarvis.errors import GeminiQuotaExceededError, JarvisError
+from jarvis.logger import get_logger
+from jarvis.rate_limiter import RateLimiter, get_prefetch_limiter
+from jarvis.semantic_cache import SemanticCache, same_question
+from jarvis.tokens import estimate_tokens
+
+logger = get_logger(__name__)
+
+# The exchange shown to the model when asking for follow-ups is cut to this many characters per side
+MAX_CONTEXT_CHARS = 2000
+
+_LIST_MARKER = re.compile(r"^\s*(?:[-*•]|\d+[.)])\s*")
+
+_pool_lock = threading.Lock()
+_pool: ThreadPoolExecutor | None = None
+
+
+def get_prefetch_pool() -> ThreadPoolExecutor:
+    """Process-wide worker pool for prefetching (settings.PREFETCH_WORKERS threads for all sessions)"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(max_workers=settings.PREFETCH_WORKERS, thread_name_prefix="jarvis-prefetch")
+        return _pool
+
+
+def follow_up_prompt(user_text: str, reply: str, count: int) -> str:
+    """Prompt asking for the `count` questions most likely to come next"""
+    return (
+        "Here is the latest exchange between a user and an AI assistant.\n\n"
+        f"User: {user_text[:MAX_CONTEXT_CHARS]}\n"
+        f"Assistant: {reply[:MAX_CONTEXT_CHARS]}\n\n"
+        f"List the {count} questions the user is most likely to ask next, written the way "
+        "the user would type them, one per line. No numbering and no other text."
+    )
+
+
+def parse_questions(text: str, limit: int) -> List[str]:
+    """Questions from the model's list: one per line, bullets/numbering removed, duplicates dropped"""
+    questions = []
+    for line in (text or "").splitlines():
+        question = _LIST_MARKER.sub("", line).strip().strip('"')
+        if question and question not in questions:
+            questions.append(question)
+    return questions[:limit]
+
+
+class _Round:
+    """The background work started after one reply"""
+
+    def __init__(self, bucket: str, deadline: float):
+        self.bucket = bucket
+        self.deadline = deadline
+        self.cancelled = threading.Event()
+        self.futures: List[Future] = []
+
+    def active(self) -> bool:
+        return not self.cancelled.is_set() and time.monotonic() < self.deadline
+
+
+class FollowUpPrefetcher:
+    """
+    Predicts and pre-answers the next question of one conversation
+
+    Attributes:
+        engine: GeminiEngine used for the questions and answers
+        build_prompt: Function turning a question into the full prompt (the conversation context)
+        questions: Follow-ups predicted per reply
+        budget_seconds: Time limit for one round
+        limiter: RateLimiter holding prefetching's share of the quota (process-wide by default)
+        answers: SemanticCache with (question, answer) pairs (short TTL)
+    """
+
+    def __init__(
+        self,
+        engine,
+        build_prompt: Callable[[str], str],
+        questions: int = 3,
+        ttl_seconds: float = 120,
+        budget_seconds: float = 30,
+        match_threshold: float = 0.9,
+        limiter: RateLimiter | None = None,
+        pool: ThreadPoolExecutor | None = None,
+    ):
+        self.engine = engine
+        self.build_prompt = build_prompt
+        self.questions = questions
+        self.budget_seconds = budget_seconds
+        self.limiter = limiter or get_prefetch_limiter()
+        self.answers = SemanticCache(threshold=match_threshold, ttl_seconds=ttl_seconds, max_entries=max(1, questions))
+
+        self._pool = pool or get_prefetch_pool()
+        self._lock = threading.Lock()
+        self._round: _Round | None = None
+        self._counters = {"rounds": 0, "answered": 0, "hits": 0, "cancelled": 0, "skipped": 0}
+
+    def start(self, bucket: str, user_text: str, reply: str) -> None:
+        """
+        Start a round for the latest exchange (cancels the previous one and
+        forgets its answers: they were written for an older context)
+
+        Args:
+            bucket (str): Semantic cache bucket the answers belong to (the role)
+            user_text (str): The user's last message
+            reply (str): The assistant's reply to it
+        """
+        if self.questions <= 0:
+            return
+        round_ = _Round(bucket, time.monotonic() + self.budget_seconds)
+        with self._lock:
+            self._cancel_locked()
+            self.answers.clear()
+            self._round = round_
+            self._counters["rounds"] += 1
+            round_.futures.append(self._pool.submit(self._plan, round_, user_text, reply))
+
+    def cancel(self) -> None:
+        """Stop the current round (real input arrived); answers already prefetched stay usable"""
+        with self._lock:
+            self._cancel_locked()
+
+    def lookup(self, bucket: str, query: str) -> str | None:
+        """
+        Prefetched answer to the question `query` asks
+
+        Returns:
+            str | None: The answer, or None if no prefetched question is the same question
+        """
+        entry = self.answers.lookup(bucket, query)
+        if entry is None or not same_question(entry[0], query):
+            return None
+        with self._lock:
+            self._counters["hits"] += 1
+        return entry[1]
+
+    def clear(self) -> None:
+        """Cancel the round and forget its answers (the role or history changed)"""
+        with self._lock:
+            self._cancel_locked()
+            self.answers.clear()
+
+    def stats(self) -> Dict[str, int]:
+        """Counters: rounds, answered, hits, cancelled, skipped (rate limit), entries"""
+        with self._lock:
+            stats = dict(self._counters)
+        stats["entries"] = sum(self.answers.stats()["entries"].values())
+        return stats
+
+    def _cancel_locked(self) -> None:
+        round_ = self._round
+        if round_ is None or round_.cancelled.is_set():
+            return
+        round_.cancelled.set()
+        if any(not future.done() for future in round_.futures):
+            self._counters["cancelled"] += 1
+        for future in round_.futures:
+            future.cancel()
+
+    def _plan(self, round_: _Round, user_text: str, reply: str) -> None:
+        """Ask for the likely follow-ups and queue one answer request per question"""
+        try:
+            text = self._generate(round_, follow_up_prompt(user_text, reply, self.questions))
+            questions = parse_questions(text, self.questions)
+            with self._lock:
+                if not round_.active():
+                    return
+                for question in questions:
+                    round_.futures.append(self._pool.submit(self._answer, round_, question))
+            logger.debug("Prefetching answers to %s follow-up questions", len(questions))
+        except Exception:
+            logger.exception("Follow-up prediction failed")
+
+    def _answer(self, round_: _Round, question: str) -> None:
+        try:
+            if not round_.active():
+                return
+            text = self._generate(round_, self.build_prompt(question))
+            if not text:
+                return
+            with self._lock:
+                # Checked under the lock: after cancel() returns, nothing from its round is added
+                if not round_.active():
+                    return
+                self.answers.add(round_.bucket, question, (question, text))
+                self._counters["answered"] += 1
+        except Exception:
+            logger.exception("Follow-up prefetch failed")
+
+    def _generate(self, round_: _Round, prompt: str) -> str | None:
+        """Stream one request; None if it was skipped (no quota to spare), cancelled or failed"""
+        if not round_.active():
+            return None
+        tokens = estimate_tokens(prompt)
+        stream = self.engine.try_generate_stream(prompt) if self.limiter.try_acquire(tokens) else None
+        if stream is None:
+            with self._lock:
+                self._counters["skipped"] += 1
+            return None
+
+        chunks = []
+        try:
+            for chunk in stream:
+                if not round_.active():
+                    return None
+                chunks.append(chunk)
+        except GeminiQuotaExceededError as e:
+            # The rest of the round would fail the same way
+            logger.debug("Prefetch stopped, quota exhausted: %s", e.technical_message)
+            round_.cancelled.set()
+            return None
+        except JarvisError as e:
+            logger.debug("Prefetch request failed: %s", e.technical_message)
+            return None
+        finally:
+            # Stops an unfinished stream (no more chunks are requested)
+            stream.close()
+        text = "".join(chunks)
+        self.limiter.charge(estimate_tokens(text))
+        return text
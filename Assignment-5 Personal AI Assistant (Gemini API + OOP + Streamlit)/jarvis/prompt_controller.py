@@ -4,7 +4,10 @@ Manages role-based assistant behaviors and prompts
 """
 
 from enum import Enum
-from typing import List, Dict
+from functools import lru_cache
+from typing import List, Dict, Tuple
+from config.settings import settings
+from jarvis.tokens import CHARS_PER_TOKEN, estimate_tokens
 
 
 class AssistantRole(Enum):
@@ -15,6 +18,39 @@ class AssistantRole(Enum):
     CAREER = "career"
 
 
+class PromptParts(str):
+    """
+    A built prompt: the full text (it is a str, so it works anywhere a prompt
+    string does) plus the pieces GeminiEngine sends separately
+    
+    Attributes:
+        system: Role instructions, sent as Gemini's system_instruction
+        prefix: Summary + conversation history; between turns it usually only
+            grows at the end, so a cached copy can be reused (see jarvis.context_cache)
+        suffix: Relevant earlier turns + the user input (new every turn)
+        scope: Conversation the prefix belongs to (one context cache entry per scope)
+    """
+    
+    def __new__(cls, system: str, prefix: str, suffix: str, scope: str = ""):
+        prompt = super().__new__(cls, f"{system}\n\n{prefix}{suffix}")
+        prompt.system = system
+        prompt.prefix = prefix
+        prompt.suffix = suffix
+        prompt.scope = scope
+        return prompt
+    
+    def __getnewargs__(self):
+        # pickle / copy rebuild the object through __new__, which needs the pieces, not the text
+        return self.system, self.prefix, self.suffix, self.scope
+
+
+@lru_cache(maxsize=4096)
+def _history_line(role: str, content: str) -> Tuple[str, int]:
+    """Format one history message and estimate its tokens (cached per message)"""
+    line = f"{role.capitalize()}: {content}\n"
+    return line, estimate_tokens(line)
+
+
 class PromptController:
     """
     Controls prompt formatting and system instructions
@@ -78,33 +114,82 @@ class PromptController:
         """
         return self.system_prompts[self.current_role]
     
-    def build_prompt(self, user_input: str, conversation_history: List[Dict] = None) -> str:
+    def build_prompt(
+        self,
+        user_input: str,
+        conversation_history: List[Dict] = None,
+        token_budget: int = None,
+        summary: str = None,
+        relevant: List[Dict] = None,
+        scope: str = "",
+    ) -> PromptParts:
         """
         Build a complete prompt with system instructions and conversation context
         
+        The system prompt, summary and user input are always included. History
+        is then added newest-first until the token budget is used up, so one
+        huge old message can't blow up the request. If the message that crosses
+        the budget is the newest one, it is cut short instead of dropped.
+        Relevant earlier messages (retrieval) get whatever budget is left, and
+        are skipped whole if they don't fit.
+        
+        Order: system prompt, summary, history, relevant messages, user input.
+        Everything that changes every turn comes last, so the start of the
+        prompt stays the same from one turn to the next (see PromptParts).
+        
         Args:
             user_input (str): The user's current question/input
             conversation_history (List[Dict], optional): Previous conversation messages
+            token_budget (int, optional): Max estimated prompt tokens (defaults to settings.PROMPT_TOKEN_BUDGET)
+            summary (str, optional): Rolling summary of older messages not in conversation_history
+            relevant (List[Dict], optional): Earlier messages related to the input, oldest first
+            scope (str, optional): Conversation key for reusing the prompt prefix across turns
             
         Returns:
-            str: Formatted prompt ready to send to Gemini
+            PromptParts: Formatted prompt (a str) ready to send to Gemini
         """
-        # Start with system prompt
-        prompt = f"{self.get_system_prompt()}\n\n"
+        if token_budget is None:
+            token_budget = settings.PROMPT_TOKEN_BUDGET
         
-        # Add conversation history if provided
-        if conversation_history:
-            prompt += "Previous conversation:\n"
-            for msg in conversation_history:
-                role = msg.get("role", "").capitalize()
-                content = msg.get("content", "")
-                prompt += f"{role}: {content}\n"
-            prompt += "\n"
+        system = self.get_system_prompt()
+        head = f"Summary of earlier conversation:\n{summary}\n\n" if summary else ""
+        tail = f"User: {user_input}"
+        remaining = token_budget - estimate_tokens(system) - estimate_tokens(head) - estimate_tokens(tail)
         
-        # Add current user input
-        prompt += f"User: {user_input}"
+        # Pick history lines newest-first while they fit
+        history_lines = []
+        for msg in reversed(conversation_history or []):
+            line, tokens = _history_line(msg.get("role", ""), msg.get("content", ""))
+            if tokens > remaining:
+                if not history_lines and remaining > 0:
+                    history_lines.append(line[: remaining * CHARS_PER_TOKEN].rstrip() + " …\n")
+                break
+            history_lines.append(line)
+            remaining -= tokens
         
-        return prompt
+        relevant_lines = []
+        for msg in relevant or []:
+            line, tokens = _history_line(msg.get("role", ""), msg.get("content", ""))
+            if tokens <= remaining:
+                relevant_lines.append(line)
+                remaining -= tokens
+        
+        # Join each part in a single pass
+        prefix = [head]
+        suffix = []
+        if history_lines:
+            prefix.append("Previous conversation:\n")
+            prefix.extend(reversed(history_lines))
+            # The blank line after the history goes with the suffix: the next
+            # turn's history continues right where this one ends
+            suffix.append("\n")
+        if relevant_lines:
+            suffix.append("Relevant earlier conversation:\n")
+            suffix.extend(relevant_lines)
+            suffix.append("\n")
+        suffix.append(tail)
+        
+        return PromptParts(system, "".join(prefix), "".join(suffix), scope=scope)
     
     def get_available_roles(self) -> List[str]:
         """
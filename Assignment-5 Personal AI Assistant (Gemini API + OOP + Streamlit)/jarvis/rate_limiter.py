@@ -0,0 +1,259 @@
+"""
+Rate Limiter Module
+Client-side quota handling for Gemini calls
+
+- RateLimiter: token buckets for requests/minute and tokens/minute, shared by every engine
+- RetryPolicy: jittered exponential backoff for retryable errors
+- CircuitBreaker: after repeated quota errors, fail fast until the quota recovers
+
+Together these turn a burst of 429 errors into steady throughput at the quota limit.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import random
+import re
+import threading
+import time
+
+from config.settings import settings
+from jarvis.errors import GeminiQuotaExceededError
+
+
+class TokenBucket:
+    """
+    Classic token bucket, reservation style
+
+    reserve() always succeeds immediately by taking the tokens (the level may go
+    negative) and returns how long the caller must wait before using them. This
+    keeps callers in FIFO order without holding the lock while sleeping.
+
+    Attributes:
+        rate: Tokens added per second
+        capacity: Max tokens stored (the allowed burst)
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self._level = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, amount: float) -> float:
+        """
+        Take `amount` tokens
+
+        Returns:
+            float: Seconds to wait before the tokens are really available (0 if none)
+        """
+        amount = min(amount, self.capacity)
+        with self._lock:
+            self._refill()
+            self._level -= amount
+            return 0.0 if self._level >= 0 else -self._level / self.rate
+
+    def available(self) -> float:
+        """Tokens that could be taken right now without waiting"""
+        with self._lock:
+            self._refill()
+            return self._level
+
+    def charge(self, amount: float) -> None:
+        """Take tokens after the fact (e.g. output tokens) without waiting"""
+        with self._lock:
+            self._refill()
+            self._level -= min(amount, self.capacity)
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._level = min(self.capacity, self._level + (now - self._updated) * self.rate)
+        self._updated = now
+
+
+class RateLimiter:
+    """
+    Requests-per-minute + tokens-per-minute limiter
+
+    Attributes:
+        requests_per_minute: Max requests per minute (0 = unlimited)
+        tokens_per_minute: Max estimated tokens per minute (0 = unlimited)
+    """
+
+    def __init__(self, requests_per_minute: float, tokens_per_minute: float):
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self._requests = TokenBucket(requests_per_minute / 60, requests_per_minute) if requests_per_minute else None
+        self._tokens = TokenBucket(tokens_per_minute / 60, tokens_per_minute) if tokens_per_minute else None
+
+    def reserve(self, tokens: int) -> float:
+        """
+        Reserve one request and `tokens` prompt tokens
+
+        Returns:
+            float: Seconds to wait before sending the request
+        """
+        wait = 0.0
+        if self._requests is not None:
+            wait = max(wait, self._requests.reserve(1))
+        if self._tokens is not None:
+            wait = max(wait, self._tokens.reserve(tokens))
+        return wait
+
+    def acquire(self, tokens: int) -> None:
+        """Block until a request with `tokens` prompt tokens may be sent"""
+        wait = self.reserve(tokens)
+        if wait > 0:
+            time.sleep(wait)
+
+    def has_capacity(self, tokens: int) -> bool:
+        """True if a request with `tokens` prompt tokens could be sent right now without waiting"""
+        if self._requests is not None and self._requests.available() < min(1, self._requests.capacity):
+            return False
+        if self._tokens is not None and self._tokens.available() < min(tokens, self._tokens.capacity):
+            return False
+        return True
+
+    def try_acquire(self, tokens: int) -> bool:
+        """
+        Reserve a request only if it needn't wait (for optional work that
+        should be skipped rather than delayed)
+
+        Returns:
+            bool: True if the request and tokens were taken
+        """
+        if not self.has_capacity(tokens):
+            return False
+        self.reserve(tokens)
+        return True
+
+    async def aacquire(self, tokens: int) -> None:
+        """Async version of acquire()"""
+        wait = self.reserve(tokens)
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    def charge(self, tokens: int) -> None:
+        """Count response tokens against the tokens-per-minute budget"""
+        if self._tokens is not None:
+            self._tokens.charge(tokens)
+
+
+class RetryPolicy:
+    """
+    Exponential backoff with full jitter
+
+    Attributes:
+        max_attempts: Total attempts including the first one
+        base_delay: Delay scale in seconds (attempt n waits up to base_delay * 2**n)
+        max_delay: Upper bound for a single delay
+    """
+
+    def __init__(self, max_attempts: int = 4, base_delay: float = 1.0, max_delay: float = 30.0):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def delay(self, attempt: int) -> float:
+        """Seconds to wait after failed attempt number `attempt` (0-based)"""
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+
+class CircuitBreaker:
+    """
+    Stops calling Gemini for a while after repeated quota errors
+
+    closed -> (failure_threshold consecutive quota errors) -> open
+    open   -> (cooldown elapsed) -> half-open: calls are let through again
+    A success closes the breaker; a single quota error in half-open reopens it.
+
+    Attributes:
+        failure_threshold: Consecutive quota errors that open the breaker
+        cooldown: Seconds to stay open (or the server's retry delay, if it gave one)
+    """
+
+    _RETRY_DELAY = re.compile(r"retry(?:_delay)?[^0-9]{0,20}?(\d+(?:\.\d+)?)\s*s", re.IGNORECASE)
+
+    def __init__(self, failure_threshold: int = 3, cooldown: float = 60.0):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self._failures = 0
+        self._open_until = 0.0
+        self._half_open = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._open_until > time.monotonic():
+                return "open"
+            # Cooldown over (or trial call in flight) but no success yet
+            return "half-open" if self._half_open or self._open_until else "closed"
+
+    def check(self) -> None:
+        """
+        Raise instead of calling Gemini while the breaker is open
+
+        Raises:
+            GeminiQuotaExceededError: If the quota is known to be exhausted
+        """
+        with self._lock:
+            remaining = self._open_until - time.monotonic()
+            if remaining > 0:
+                raise GeminiQuotaExceededError(
+                    f"⚠️ Gemini API limit reached (quota/rate limit). Please try again in about {int(remaining) + 1}s.",
+                    technical_message=f"Circuit breaker open for another {remaining:.1f}s",
+                )
+            if self._open_until and not self._half_open:
+                # Cooldown is over: let calls through, but reopen on the next quota error.
+                self._half_open = True
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._failures = 0
+            self._open_until = 0.0
+            self._half_open = False
+
+    def record_quota_error(self, message: str = "") -> None:
+        with self._lock:
+            self._failures += 1
+            if self._half_open or self._failures >= self.failure_threshold:
+                match = self._RETRY_DELAY.search(message or "")
+                cooldown = float(match.group(1)) if match else self.cooldown
+                self._open_until = time.monotonic() + cooldown
+                self._half_open = False
+
+
+_shared_lock = threading.Lock()
+_shared = {}
+
+
+def get_shared_limiter() -> RateLimiter:
+    """Process-wide RateLimiter built from settings (the quota is per API key, not per engine)"""
+    with _shared_lock:
+        if "limiter" not in _shared:
+            _shared["limiter"] = RateLimiter(settings.RATE_LIMIT_RPM, settings.RATE_LIMIT_TPM)
+        return _shared["limiter"]
+
+
+def get_shared_breaker() -> CircuitBreaker:
+    """Process-wide CircuitBreaker built from settings"""
+    with _shared_lock:
+        if "breaker" not in _shared:
+            _shared["breaker"] = CircuitBreaker(settings.CIRCUIT_BREAKER_THRESHOLD, settings.CIRCUIT_BREAKER_COOLDOWN)
+        return _shared["breaker"]
+
+
+def get_prefetch_limiter() -> RateLimiter:
+    """
+    Process-wide RateLimiter for follow-up prefetching (jarvis.prefetch)
+
+    Holds settings.PREFETCH_RATE_SHARE of the quota for all sessions together,
+    so prefetching stays within its share however many sessions are open.
+    """
+    with _shared_lock:
+        if "prefetch" not in _shared:
+            share = settings.PREFETCH_RATE_SHARE
+            _shared["prefetch"] = RateLimiter(settings.RATE_LIMIT_RPM * share, settings.RATE_LIMIT_TPM * share)
+        return _shared["prefetch"]
@@ -0,0 +1,213 @@
+"""
+Response Cache Module
+Caches Gemini responses for exactly repeated prompts
+
+Two tiers:
+- memory: small LRU dict, lost on restart
+- disk: SQLite file shared across restarts and sessions (optional)
+
+Entries are keyed by a hash of (model, temperature, max tokens, normalized prompt),
+expire after a TTL, and the disk tier is capped by total size (LRU eviction).
+"""
+
+from __future__ import annotations
+
+import hashlib
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict
+
+
+def normalize_prompt(prompt: str) -> str:
+    """Collapse whitespace so trivially different prompts share a cache entry"""
+    return " ".join((prompt or "").split())
+
+
+def make_cache_key(model_name: str, temperature: float, max_tokens: int, prompt: str) -> str:
+    """
+    Build the cache key for one request
+
+    Returns:
+        str: SHA-256 hex digest
+    """
+    raw = f"{model_name}\x1f{temperature}\x1f{max_tokens}\x1f{normalize_prompt(prompt)}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """
+    Two-tier (memory LRU + optional SQLite) response cache
+
+    Attributes:
+        max_entries: Max entries in the memory tier
+        ttl_seconds: Default time-to-live for new entries
+        disk_path: SQLite file for the disk tier (None = memory only)
+        max_disk_bytes: Size cap for the disk tier
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 256,
+        ttl_seconds: float = 3600,
+        disk_path: Path | None = None,
+        max_disk_bytes: int = 50_000_000,
+    ):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.disk_path = Path(disk_path) if disk_path else None
+        self.max_disk_bytes = max_disk_bytes
+
+        self._lock = threading.Lock()
+        self._memory: "OrderedDict[str, tuple[str, float]]" = OrderedDict()
+        self._counters = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "evictions": 0}
+        self._conn: sqlite3.Connection | None = None
+        self._disk_bytes = 0
+
+        if self.disk_path is not None:
+            self.disk_path.parent.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(str(self.disk_path), check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            with self._conn:
+                self._conn.execute(
+                    """
+                    CREATE TABLE IF NOT EXISTS responses (
+                        key TEXT PRIMARY KEY,
+                        value TEXT NOT NULL,
+                        size INTEGER NOT NULL,
+                        expires_at REAL NOT NULL,
+                        last_used REAL NOT NULL
+                    )
+                    """
+                )
+                self._conn.execute("CREATE INDEX IF NOT EXISTS idx_responses_last_used ON responses (last_used)")
+            self._disk_bytes = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+
+    def get(self, key: str) -> str | None:
+        """
+        Look up a cached response
+
+        Returns:
+            str | None: Cached text, or None on a miss (or expired entry)
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                value, expires_at = entry
+                if expires_at > now:
+                    self._memory.move_to_end(key)
+                    self._counters["memory_hits"] += 1
+                    return value
+                del self._memory[key]
+
+            if self._conn is not None:
+                row = self._conn.execute(
+                    "SELECT value, expires_at FROM responses WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None:
+                    value, expires_at = row
+                    if expires_at > now:
+                        with self._conn:
+                            self._conn.execute("UPDATE responses SET last_used = ? WHERE key = ?", (now, key))
+                        self._remember(key, value, expires_at)
+                        self._counters["disk_hits"] += 1
+                        return value
+                    self._delete_disk(key)
+
+            self._counters["misses"] += 1
+            return None
+
+    def put(self, key: str, value: str, ttl_seconds: float | None = None) -> None:
+        """
+        Store a response
+
+        Args:
+            key (str): Cache key from make_cache_key()
+            value (str): Response text
+            ttl_seconds (float, optional): Override the default TTL for this entry
+        """
+        now = time.time()
+        expires_at = now + (self.ttl_seconds if ttl_seconds is None else ttl_seconds)
+        with self._lock:
+            self._remember(key, value, expires_at)
+
+            if self._conn is not None:
+                self._delete_disk(key)
+                size = len(value.encode("utf-8"))
+                with self._conn:
+                    self._conn.execute(
+                        "INSERT INTO responses (key, value, size, expires_at, last_used) VALUES (?, ?, ?, ?, ?)",
+                        (key, value, size, expires_at, now),
+                    )
+                self._disk_bytes += size
+                if self._disk_bytes > self.max_disk_bytes:
+                    self._evict_disk(now)
+
+    def clear(self) -> None:
+        """Drop every entry (both tiers) and reset the counters"""
+        with self._lock:
+            self._memory.clear()
+            for name in self._counters:
+                self._counters[name] = 0
+            if self._conn is not None:
+                with self._conn:
+                    self._conn.execute("DELETE FROM responses")
+                self._disk_bytes = 0
+
+    def stats(self) -> Dict:
+        """
+        Get cache counters
+
+        Returns:
+            Dict: Hits per tier, misses, evictions, hit rate and memory-tier size
+        """
+        with self._lock:
+            counters = dict(self._counters)
+            entries = len(self._memory)
+        hits = counters["memory_hits"] + counters["disk_hits"]
+        lookups = hits + counters["misses"]
+        counters["hit_rate"] = round(hits / lookups, 3) if lookups else 0.0
+        counters["memory_entries"] = entries
+        return counters
+
+    def close(self) -> None:
+        """Close the disk tier"""
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def _remember(self, key: str, value: str, expires_at: float) -> None:
+        """Insert into the memory tier and evict least recently used entries (lock held)"""
+        self._memory[key] = (value, expires_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+            self._counters["evictions"] += 1
+
+    def _delete_disk(self, key: str) -> None:
+        """Remove one row from the disk tier (lock held)"""
+        row = self._conn.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return
+        with self._conn:
+            self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+        self._disk_bytes -= row[0]
+
+    def _evict_disk(self, now: float) -> None:
+        """Drop expired rows, then least recently used rows until under the size cap (lock held)"""
+        with self._conn:
+            self._conn.execute("DELETE FROM responses WHERE expires_at <= ?", (now,))
+        self._disk_bytes = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+
+        rows = self._conn.execute("SELECT key, size FROM responses ORDER BY last_used").fetchall()
+        with self._conn:
+            for key, size in rows:
+                if self._disk_bytes <= self.max_disk_bytes:
+                    break
+                self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._disk_bytes -= size
+                self._counters["evictions"] += 1
@@ -0,0 +1,239 @@
+"""
+Search Module
+Full-text search over conversation history
+
+The SQLite memory backend searches with SQLite's FTS5 (see
+jarvis.storage.SQLiteStorage). The file backends keep the history in memory,
+so they use SearchIndex: an inverted index built on the first search and
+then updated by every Memory.add().
+
+Postings are compact: per term, an array of message positions and an array
+of term counts (machine ints, not Python objects). A query matches messages
+that contain every query word and ranks them with BM25, newest first on
+ties. The cost depends on how many messages contain the rarest query word,
+not on the history size.
+
+Retrieval for the prompt (Memory.retrieve) uses match_all=False instead:
+any content word may match (see content_terms()), so "how do I sort a list
+in python" finds earlier turns about sorting or lists.
+"""
+
+from __future__ import annotations
+
+import heapq
+import math
+import re
+from array import array
+from bisect import bisect_left
+from collections import Counter
+from typing import Callable, Dict, Iterable, List, Sequence
+
+_WORD = re.compile(r"\w+", re.UNICODE)
+
+# BM25 parameters (the usual defaults; FTS5's bm25() uses the same)
+K1 = 1.2
+B = 0.75
+
+_ROLE_CODES = {"user": 0, "assistant": 1}
+
+# Words too common to say anything about relevance (dropped by content_terms)
+STOPWORDS = frozenset(
+    "a about after again all also am an and any are as at be because been before being but by can "
+    "could did do does doing don done for from get got had has have having he her here hers him his "
+    "how i if in into is it its just know let like me more most my no not now of off on once only "
+    "or other our out over please re same she should so some tell than thanks thank that the their "
+    "them then there these they this those to too up us very want was we were what when where which "
+    "while who whom why will with would yes you your yours".split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase words (letters/digits/underscore runs), in order"""
+    return _WORD.findall((text or "").lower())
+
+
+def content_terms(text: str) -> List[str]:
+    """Distinct query words worth matching on: no stopwords, no single characters"""
+    return [word for word in dict.fromkeys(tokenize(text)) if len(word) > 1 and word not in STOPWORDS]
+
+
+def make_snippet(content: str, terms: Iterable[str], width: int = 160) -> str:
+    """
+    Short excerpt of `content` around the first query word, with matches in **bold**
+
+    Args:
+        content: Message text
+        terms: Lowercase query words
+        width: Approximate length of the excerpt in characters
+    """
+    terms = set(terms)
+    matches = [m for m in _WORD.finditer(content) if m.group().lower() in terms]
+    if not matches:
+        return content[:width] + ("…" if len(content) > width else "")
+
+    start = max(0, matches[0].start() - width // 3)
+    end = min(len(content), start + width)
+    parts = []
+    cursor = start
+    for match in matches:
+        if match.start() < start or match.end() > end:
+            continue
+        parts.append(content[cursor:match.start()])
+        parts.append(f"**{match.group()}**")
+        cursor = match.end()
+    parts.append(content[cursor:end])
+    return ("…" if start > 0 else "") + "".join(parts).replace("\n", " ") + ("…" if end < len(content) else "")
+
+
+def search_result(role: str, content: str, terms: Iterable[str], score: float) -> Dict:
+    """One history search hit as returned by Memory.search()"""
+    return {"role": role, "content": content, "snippet": make_snippet(content, terms), "score": round(score, 3)}
+
+
+def expand_turns(hits: Iterable[tuple], role_at: Callable[[int], str], end: int) -> List[int]:
+    """
+    Hit positions plus the other half of each hit's turn (the reply to a
+    question, the question to a reply), oldest first
+
+    Args:
+        hits: (position, score) pairs from SearchIndex.search()
+        role_at: Role of the message at a position
+        end: Positions from here on are excluded
+    """
+    positions = set()
+    for position, _ in hits:
+        positions.add(position)
+        role = role_at(position)
+        partner = position + 1 if role == "user" else position - 1
+        if 0 <= partner < end and role_at(partner) != role:
+            positions.add(partner)
+    return sorted(positions)
+
+
+class SearchIndex:
+    """
+    In-process inverted index over a message list (positions = list indexes)
+
+    Not thread-safe on its own: Memory calls it under its lock.
+    """
+
+    def __init__(self):
+        self._postings: Dict[str, array] = {}
+        self._counts: Dict[str, array] = {}
+        self._lengths = array("I")
+        self._roles = bytearray()
+        self._total_length = 0
+
+    def __len__(self) -> int:
+        return len(self._lengths)
+
+    def add(self, role: str, content: str) -> None:
+        """Index the next message (its position is the current size of the index)"""
+        position = len(self._lengths)
+        words = tokenize(content)
+        for word, count in Counter(words).items():
+            postings = self._postings.get(word)
+            if postings is None:
+                postings = self._postings[word] = array("I")
+                self._counts[word] = array("H")
+            postings.append(position)
+            self._counts[word].append(min(count, 0xFFFF))
+        self._lengths.append(len(words))
+        self._roles.append(_ROLE_CODES.get(role, 2))
+        self._total_length += len(words)
+
+    def add_all(self, messages: Sequence[Dict]) -> None:
+        for message in messages:
+            self.add(message.get("role", ""), message.get("content", ""))
+
+    def search(
+        self,
+        query: str,
+        role: str | None = None,
+        limit: int = 10,
+        *,
+        match_all: bool = True,
+        before: int | None = None,
+    ) -> List[tuple]:
+        """
+        Best matches for `query`
+
+        Args:
+            query: Free text
+            role: Only messages with this role ("user" / "assistant")
+            limit: Max results
+            match_all: True: every word must appear in a match. False: any
+                content word may (stopwords are ignored), ranked by BM25
+            before: Only messages at positions below this one
+
+        Returns:
+            List[tuple]: (position, score) pairs, best first
+        """
+        if match_all:
+            terms = list(dict.fromkeys(tokenize(query)))
+        else:
+            terms = [term for term in content_terms(query) if term in self._postings]
+        if not terms or limit <= 0 or not self._lengths:
+            return []
+        if any(term not in self._postings for term in terms):
+            return []
+
+        postings = {term: (self._postings[term], self._counts[term]) for term in terms}
+        if before is not None and before < len(self._lengths):
+            # Positions are sorted, so the cut is one binary search per word
+            for term, (positions, counts) in postings.items():
+                cut = bisect_left(positions, before)
+                postings[term] = (positions[:cut], counts[:cut])
+
+        if match_all:
+            # Intersect starting from the rarest word: candidates only shrink
+            terms.sort(key=lambda term: len(postings[term][0]))
+            frequencies = {position: [count] for position, count in zip(*postings[terms[0]])}
+            for term in terms[1:]:
+                if not frequencies:
+                    return []
+                frequencies = self._intersect(frequencies, *postings[term])
+        else:
+            # Union: a missing word counts 0 for that message
+            frequencies = {}
+            for i, term in enumerate(terms):
+                for position, count in zip(*postings[term]):
+                    tfs = frequencies.get(position)
+                    if tfs is None:
+                        tfs = frequencies[position] = [0] * len(terms)
+                    tfs[i] = count
+
+        if role is not None:
+            code = _ROLE_CODES.get(role, 2)
+            frequencies = {p: c for p, c in frequencies.items() if self._roles[p] == code}
+
+        n = len(self._lengths)
+        average_length = self._total_length / n or 1.0
+        idf = [math.log(1 + (n - len(self._postings[t]) + 0.5) / (len(self._postings[t]) + 0.5)) for t in terms]
+
+        def score(item):
+            position, counts = item
+            norm = K1 * (1 - B + B * self._lengths[position] / average_length)
+            return sum(w * tf * (K1 + 1) / (tf + norm) for w, tf in zip(idf, counts))
+
+        best = heapq.nlargest(limit, frequencies.items(), key=lambda item: (score(item), item[0]))
+        return [(position, score((position, counts))) for position, counts in best]
+
+    @staticmethod
+    def _intersect(frequencies: Dict[int, list], postings: array, counts: array) -> Dict[int, list]:
+        """Keep the candidates that also appear in `postings` (appending their term count)"""
+        matched = {}
+        if len(frequencies) * max(1, len(postings).bit_length()) < len(postings):
+            # Few candidates, long postings (a common word): binary search; positions are sorted
+            for position, tfs in frequencies.items():
+                i = bisect_left(postings, position)
+                if i < len(postings) and postings[i] == position:
+                    tfs.append(counts[i])
+                    matched[position] = tfs
+        else:
+            for position, count in zip(postings, counts):
+                tfs = frequencies.get(position)
+                if tfs is not None:
+                    tfs.append(count)
+                    matched[position] = tfs
+        return matched
@@ -0,0 +1,257 @@
+"""
+Semantic Cache Module
+Answers near-duplicate questions ("what's python" / "what is Python?") from
+earlier answers, without calling Gemini
+
+Queries are embedded locally (no network) and compared by cosine similarity
+against a NumPy matrix of earlier queries, kept separately for each role.
+
+Word order and negation matter for the answer, so the embedding includes
+pairs of neighbouring topic words ("convert a list to a set" is not "convert
+a set to a list"), and a query never matches one with different negation
+words ("is it safe..." / "is it not safe...").
+"""
+
+from __future__ import annotations
+
+import re
+import threading
+import time
+import zlib
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+
+# Share of topic words two queries must have in common for same_question()
+MIN_WORD_OVERLAP = 0.75
+
+# Words that flip the meaning of a question; both queries must use the same ones
+NEGATIONS = frozenset({"not", "no", "never", "nothing", "nobody", "none", "nor", "neither", "without"})
+
+
+def _words(text: str) -> List[str]:
+    """Lowercase words, with "'s" -> "is" and "n't" / "cannot" -> "not" spelled out"""
+    text = (text or "").lower().replace("’", "'")
+    text = text.replace("can't", "can not").replace("won't", "will not").replace("cannot", "can not")
+    text = text.replace("n't", " not").replace("'s", " is")
+    return _TOKEN.findall(text)
+
+
+def negation_words(text: str) -> frozenset:
+    """The negation words in a query"""
+    return NEGATIONS.intersection(_words(text))
+
+
+def topic_words(text: str) -> List[str]:
+    """The words of a query without the common question words, in order"""
+    return [word for word in _words(text) if word not in HashingEmbedder._STOP_WORDS]
+
+
+def same_question(first: str, second: str) -> bool:
+    """
+    Stricter check than the similarity score, for answers that were never
+    asked for: the same words, or mostly the same topic words with the shared
+    ones in the same order
+    """
+    if _words(first) == _words(second):
+        return True
+    words_a, words_b = topic_words(first), topic_words(second)
+    shared = set(words_a) & set(words_b)
+    if not shared or len(shared) < MIN_WORD_OVERLAP * len(set(words_a) | set(words_b)):
+        return False
+    order_a = list(dict.fromkeys(word for word in words_a if word in shared))
+    order_b = list(dict.fromkeys(word for word in words_b if word in shared))
+    return order_a == order_b
+
+
+class Embedder:
+    """Base class: maps text to an L2-normalized vector"""
+
+    dim: int
+
+    def embed(self, text: str) -> np.ndarray:
+        raise NotImplementedError
+
+
+class HashingEmbedder(Embedder):
+    """
+    Local hashing vectorizer: word + character-trigram features hashed into a fixed-size vector
+
+    Common question words ("what", "is", "how"...) are down-weighted so that the
+    topic words decide the similarity. Consecutive topic words are also hashed
+    as pairs, so the same words in a different order score lower. CRC32 keeps
+    hashes stable across runs.
+
+    Attributes:
+        dim: Vector size
+    """
+
+    # Weight of a topic-word pair (a single topic word weighs 1.0)
+    BIGRAM_WEIGHT = 1.5
+
+    _STOP_WORDS = frozenset({
+        "a", "an", "and", "are", "can", "do", "does", "how", "i", "is", "me",
+        "of", "please", "s", "the", "to", "what", "you",
+    })
+
+    def __init__(self, dim: int = 1024):
+        self.dim = dim
+
+    def embed(self, text: str) -> np.ndarray:
+        vector = np.zeros(self.dim, dtype=np.float32)
+        words = _words(text)
+        for word in words:
+            weight = 0.3 if word in self._STOP_WORDS else 1.0
+            self._add(vector, "w:" + word, weight)
+            padded = f"<{word}>"
+            for i in range(len(padded) - 2):
+                self._add(vector, "c:" + padded[i:i + 3], weight / 2)
+        topic_words = [word for word in words if word not in self._STOP_WORDS]
+        for first, second in zip(topic_words, topic_words[1:]):
+            self._add(vector, f"b:{first} {second}", self.BIGRAM_WEIGHT)
+
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _add(self, vector: np.ndarray, feature: str, weight: float) -> None:
+        h = zlib.crc32(feature.encode("utf-8"))
+        vector[h % self.dim] += weight if h & 0x80000000 else -weight
+
+
+class _RoleIndex:
+    """Growable matrix of query vectors + their answers for one role"""
+
+    def __init__(self, dim: int, capacity: int = 64):
+        self.vectors = np.zeros((capacity, dim), dtype=np.float32)
+        self.answers: List[str] = []
+        self.created: List[float] = []
+        self.negations: List[frozenset] = []
+
+    def __len__(self) -> int:
+        return len(self.answers)
+
+    def add(self, vector: np.ndarray, answer: str, max_entries: int, negations: frozenset = frozenset()) -> None:
+        if len(self) >= max_entries:
+            # Drop the oldest entry (FIFO)
+            self.vectors[: len(self) - 1] = self.vectors[1: len(self)]
+            self.answers.pop(0)
+            self.created.pop(0)
+            self.negations.pop(0)
+        if len(self) == self.vectors.shape[0]:
+            grown = np.zeros((self.vectors.shape[0] * 2, self.vectors.shape[1]), dtype=np.float32)
+            grown[: len(self)] = self.vectors
+            self.vectors = grown
+        self.vectors[len(self)] = vector
+        self.answers.append(answer)
+        self.created.append(time.time())
+        self.negations.append(negations)
+
+    def best(self, vector: np.ndarray, negations: frozenset = frozenset()) -> Tuple[int, float]:
+        """Most similar entry among those with the same negation words (score -1 if there is none)"""
+        scores = self.vectors[: len(self)] @ vector
+        mismatched = [i for i, words in enumerate(self.negations) if words != negations]
+        if mismatched:
+            scores[mismatched] = -1.0
+        idx = int(np.argmax(scores))
+        return idx, float(scores[idx])
+
+
+class SemanticCache:
+    """
+    Per-role cache of answers, looked up by query similarity
+
+    Very short inputs ("why?", "go on") depend on the conversation rather than
+    standing alone, so they are never cached or looked up.
+
+    Attributes:
+        embedder: Embedder used for queries
+        threshold: Minimum cosine similarity for a hit
+        ttl_seconds: Entries older than this are ignored
+        max_entries: Max cached queries per role (oldest dropped first)
+        min_words: Queries with fewer words bypass the cache
+    """
+
+    def __init__(
+        self,
+        embedder: Embedder = None,
+        threshold: float = 0.88,
+        ttl_seconds: float = 86400,
+        max_entries: int = 1000,
+        min_words: int = 3,
+    ):
+        self.embedder = embedder or HashingEmbedder()
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.min_words = min_words
+
+        self._lock = threading.Lock()
+        self._indexes: Dict[str, _RoleIndex] = {}
+        self._counters = {"hits": 0, "misses": 0}
+
+    def lookup(self, role: str, query: str) -> str | None:
+        """
+        Find a cached answer for a similar query
+
+        Args:
+            role (str): Bucket to search (the assistant role)
+            query (str): The user's question
+
+        Returns:
+            str | None: Cached answer, or None if nothing is similar enough
+        """
+        if not self._cacheable(query):
+            return None
+        vector = self.embedder.embed(query)
+        with self._lock:
+            index = self._indexes.get(role)
+            if index is not None and len(index) and vector.any():
+                idx, score = index.best(vector, negation_words(query))
+                if score >= self.threshold and time.time() - index.created[idx] < self.ttl_seconds:
+                    self._counters["hits"] += 1
+                    return index.answers[idx]
+            self._counters["misses"] += 1
+            return None
+
+    def add(self, role: str, query: str, answer: str) -> None:
+        """
+        Remember the answer to a query
+
+        Args:
+            role (str): Bucket to store in (the assistant role)
+            query (str): The user's question
+            answer (str): The assistant's answer
+        """
+        if not self._cacheable(query):
+            return
+        vector = self.embedder.embed(query)
+        if not vector.any():
+            return
+        with self._lock:
+            index = self._indexes.get(role)
+            if index is None:
+                index = self._indexes[role] = _RoleIndex(self.embedder.dim)
+            index.add(vector, answer, self.max_entries, negation_words(query))
+
+    def clear(self) -> None:
+        """Forget every cached answer"""
+        with self._lock:
+            self._indexes.clear()
+            self._counters = {"hits": 0, "misses": 0}
+
+    def stats(self) -> Dict:
+        """
+        Get cache counters
+
+        Returns:
+            Dict: Hits, misses and cached queries per role
+        """
+        with self._lock:
+            stats = dict(self._counters)
+            stats["entries"] = {role: len(index) for role, index in self._indexes.items()}
+        return stats
+
+    def _cacheable(self, query: str) -> bool:
+        return len((query or "").replace("'", " ").split()) >= self.min_words
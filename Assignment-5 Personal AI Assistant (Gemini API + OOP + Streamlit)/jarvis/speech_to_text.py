@@ -2,67 +2,252 @@
 Speech-to-Text Module (basic)
 
 This is a minimal implementation that supports uploading audio files (WAV/FLAC)
-and transcribing them using SpeechRecognition's Google Web Speech API.
+and transcribing them with a pluggable backend:
+
+- "google": SpeechRecognition's Google Web Speech API (default; needs internet)
+- "vosk": offline recognition on CPU with a local Vosk model (`pip install vosk`
+  and unpack a model from https://alphacephei.com/vosk/models into models/vosk)
 
 Notes:
 - This is intended as a "basic" demo (no Google Cloud setup required).
-- It requires internet access for the Google Web Speech API.
-- Supported formats here: WAV/AIFF/FLAC. (MP3/M4A need ffmpeg conversion.)
+- Audio is decoded in memory (no temp files). With AUDIO_PREPROCESS on (default),
+  jarvis.audio_preprocess resamples it to 16 kHz mono, trims silence and splits
+  it at long pauses, and each speech segment is transcribed on its own.
+- The Vosk backend feeds the audio in short chunks and reports a partial
+  transcript after each one, so long recordings show text early.
+- Supported formats here: WAV/AIFF/FLAC, plus MP3/M4A/OGG/WebM when ffmpeg is installed.
+- speech_recognition (and vosk) are imported on first use, so the app starts without them.
 """
 
 from __future__ import annotations
 
-import tempfile
+import io
+import json
+import threading
 from pathlib import Path
-from typing import Optional, Tuple
+from typing import Callable, Iterator, Optional, Tuple
 
-import speech_recognition as sr
+from config.settings import settings
 
 
-class SpeechToText:
-    """Basic speech-to-text wrapper."""
+class TranscriptionError(Exception):
+    """Raised by a backend with a message that can be shown to the user."""
+
+
+def decode_audio(file_bytes: bytes):
+    """
+    Decode WAV/AIFF/FLAC bytes in memory.
+
+    Returns:
+        speech_recognition.AudioData: Mono audio (multi-channel input is averaged).
+    """
+    import speech_recognition as sr
+
+    with sr.AudioFile(io.BytesIO(file_bytes)) as source:
+        return sr.Recognizer().record(source)
+
+
+class SpeechBackend:
+    """Base class for speech-to-text engines."""
+
+    name = "base"
+
+    def transcribe(self, audio) -> str:
+        """
+        Transcribe decoded audio.
+
+        Args:
+            audio: speech_recognition.AudioData
+
+        Returns:
+            Recognized text ("" if nothing was recognized).
+        """
+        raise NotImplementedError
+
+    def stream(self, audio) -> Iterator[str]:
+        """
+        Transcribe decoded audio, yielding the transcript so far as it grows.
+
+        The last value yielded is the final transcript. Backends that can't
+        produce partial results yield it once.
+        """
+        yield self.transcribe(audio)
+
+
+class GoogleSpeechBackend(SpeechBackend):
+    """Google Web Speech API through SpeechRecognition (online, one request per recording)."""
+
+    name = "google"
 
     def __init__(self, language: str = "en-US"):
         self.language = language
-        self.recognizer = sr.Recognizer()
+        self._recognizer = None
+
+    @property
+    def recognizer(self):
+        """speech_recognition.Recognizer, created on first use"""
+        if self._recognizer is None:
+            import speech_recognition as sr
+
+            self._recognizer = sr.Recognizer()
+        return self._recognizer
+
+    def transcribe(self, audio) -> str:
+        return self.recognizer.recognize_google(audio, language=self.language)
+
+
+class VoskSpeechBackend(SpeechBackend):
+    """
+    Offline speech recognition with Vosk (Kaldi) on CPU.
+
+    The model is loaded once, on first use, and shared by all calls; each
+    call gets its own recognizer.
+    """
+
+    name = "vosk"
+    SAMPLE_RATE = 16000
+
+    def __init__(self, model_path: Path, chunk_seconds: float = 0.5):
+        self.model_path = Path(model_path)
+        self.chunk_seconds = chunk_seconds
+        self._model = None
+        self._lock = threading.Lock()
+
+    def _load_model(self):
+        with self._lock:
+            if self._model is None:
+                try:
+                    import vosk
+                except ImportError:
+                    raise TranscriptionError("Offline speech-to-text needs the vosk package: pip install vosk")
+                if not self.model_path.is_dir():
+                    raise TranscriptionError(
+                        f"Vosk model not found at {self.model_path}. "
+                        "Download one from https://alphacephei.com/vosk/models and unpack it there."
+                    )
+                vosk.SetLogLevel(-1)
+                self._model = vosk.Model(str(self.model_path))
+            return self._model
+
+    def _recognizer(self):
+        import vosk
+
+        return vosk.KaldiRecognizer(self._load_model(), self.SAMPLE_RATE)
+
+    def transcribe(self, audio) -> str:
+        text = ""
+        for text in self.stream(audio):
+            pass
+        return text
+
+    def stream(self, audio) -> Iterator[str]:
+        recognizer = self._recognizer()
+        pcm = audio.get_raw_data(convert_rate=self.SAMPLE_RATE, convert_width=2)
+        chunk_bytes = max(2, int(self.SAMPLE_RATE * self.chunk_seconds) * 2)
+
+        final_parts = []
+        last = None
+        for start in range(0, len(pcm), chunk_bytes):
+            if recognizer.AcceptWaveform(pcm[start:start + chunk_bytes]):
+                final_parts.append(json.loads(recognizer.Result()).get("text", ""))
+                partial = ""
+            else:
+                partial = json.loads(recognizer.PartialResult()).get("partial", "")
+            text = " ".join(part for part in final_parts + [partial] if part)
+            if text != last:
+                last = text
+                yield text
+
+        final_parts.append(json.loads(recognizer.FinalResult()).get("text", ""))
+        yield " ".join(part for part in final_parts if part)
+
+
+def create_speech_backend(name: str, language: str = "en-US") -> SpeechBackend:
+    """
+    Create the speech-to-text backend selected in settings.
+
+    Args:
+        name: "google" or "vosk"
+        language: Language code (the Vosk model decides its own language)
+    """
+    if name == "google":
+        return GoogleSpeechBackend(language=language)
+    if name == "vosk":
+        return VoskSpeechBackend(settings.VOSK_MODEL_PATH, chunk_seconds=settings.STT_CHUNK_SECONDS)
+    raise ValueError(f"Unknown speech-to-text backend: {name}")
 
-    def transcribe_file_bytes(self, file_bytes: bytes, *, suffix: str) -> Tuple[Optional[str], Optional[str]]:
+
+class SpeechToText:
+    """Basic speech-to-text wrapper."""
+
+    def __init__(self, language: str = "en-US", backend: SpeechBackend | None = None):
+        self.language = language
+        self.backend = backend or create_speech_backend(settings.STT_BACKEND, language)
+
+    def transcribe_file_bytes(
+        self,
+        file_bytes: bytes,
+        *,
+        suffix: str,
+        on_partial: Callable[[str], None] | None = None,
+    ) -> Tuple[Optional[str], Optional[str]]:
         """
-        Transcribe audio bytes by writing to a temporary file first.
+        Transcribe audio bytes (decoded in memory; silence trimmed when preprocessing is on).
 
         Args:
             file_bytes: Raw bytes from an uploaded file.
             suffix: File extension including dot, e.g. ".wav" or ".flac"
+            on_partial: Called with the transcript so far, each time it grows
+                (several times with the Vosk backend, once with Google).
 
         Returns:
             (text, error): Exactly one is non-None.
         """
         suffix = suffix.lower()
-        if suffix not in {".wav", ".flac", ".aiff", ".aif", ".aifc"}:
+        if suffix not in {".wav", ".flac", ".aiff", ".aif", ".aifc"} and not self._can_transcode():
             return None, "Unsupported audio format. Please upload WAV or FLAC for this basic implementation."
 
-        try:
-            with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as tmp:
-                tmp.write(file_bytes)
-                tmp_path = Path(tmp.name)
-
-            with sr.AudioFile(str(tmp_path)) as source:
-                audio = self.recognizer.record(source)
+        import speech_recognition as sr
 
-            text = self.recognizer.recognize_google(audio, language=self.language)
-            return text, None
+        try:
+            if settings.AUDIO_PREPROCESS:
+                from jarvis.audio_preprocess import TARGET_RATE, preprocess, to_pcm16
+
+                prepared = preprocess(file_bytes, suffix)
+                if not prepared.segments:
+                    return None, "No speech detected in the recording."
+                audios = [sr.AudioData(to_pcm16(segment), TARGET_RATE, 2) for segment in prepared.segments]
+            else:
+                audios = [decode_audio(file_bytes)]
+
+            texts = []
+            for audio in audios:
+                text = ""
+                try:
+                    for text in self.backend.stream(audio):
+                        if on_partial is not None and text:
+                            on_partial(" ".join(texts + [text]))
+                except sr.UnknownValueError:
+                    continue  # nothing recognizable in this segment; the others may still have speech
+                if text.strip():
+                    texts.append(text.strip())
+
+            if not texts:
+                return None, "Could not understand the audio (speech was unclear)."
+            return " ".join(texts), None
 
-        except sr.UnknownValueError:
-            return None, "Could not understand the audio (speech was unclear)."
         except sr.RequestError as e:
             return None, f"Speech recognition request failed: {e}"
+        except TranscriptionError as e:
+            return None, str(e)
         except Exception as e:
             return None, f"Transcription failed: {e}"
-        finally:
-            try:
-                if "tmp_path" in locals() and tmp_path.exists():
-                    tmp_path.unlink(missing_ok=True)
-            except Exception:
-                pass
 
+    @staticmethod
+    def _can_transcode() -> bool:
+        """Other formats (MP3, M4A...) work when preprocessing is on and ffmpeg is installed"""
+        if not settings.AUDIO_PREPROCESS:
+            return False
+        from jarvis.audio_preprocess import ffmpeg_available
 
+        return ffmpeg_available()
@@ -0,0 +1,794 @@
+"""
+Storage Module
+Pluggable persistence backends for conversation memory
+
+Backends:
+- JsonFileStorage: rewrites the whole JSON file on every message (original behavior)
+- JournalStorage: append-only JSON-lines journal + periodic snapshot compaction
+- SQLiteStorage: WAL-mode SQLite database keyed by session id, queried with indexes
+  (and searched with an FTS5 full-text index)
+- MappedStorage: memory-mapped append-only message log; startup and recent-history
+  reads don't depend on the history size
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Iterator, List
+
+from jarvis.logger import get_logger
+from jarvis.message_log import ROLE_CODES, ROLES, MessageLog
+from jarvis.search import SearchIndex, content_terms, expand_turns, search_result, tokenize
+from jarvis.tokens import CHARS_PER_TOKEN
+
+logger = get_logger(__name__)
+
+
+class MemoryStorage:
+    """
+    Base class for conversation storage backends
+
+    File backends only persist the history: Memory keeps the conversation list
+    and the backend gives it back on startup.
+
+    Backends with `queryable = True` keep the history themselves and answer
+    history queries directly, so Memory never loads the full conversation.
+
+    The rolling conversation summary ({"text": str, "covers": int}) is stored
+    next to the history: file backends use a small sidecar JSON file.
+
+    A reply that is still streaming is checkpointed the same way, as a draft
+    ({"user": str, "content": str}), so a crash or page reload doesn't lose it.
+    """
+
+    queryable = False
+    summary_file: Path | None = None
+    draft_file: Path | None = None
+
+    def load(self) -> List[Dict]:
+        """
+        Load all stored messages (oldest first)
+
+        Returns:
+            List[Dict]: Stored conversation messages
+        """
+        raise NotImplementedError
+
+    def append(self, message: Dict, conversations: List[Dict]) -> None:
+        """
+        Persist one new message
+
+        Args:
+            message (Dict): The message that was just added
+            conversations (List[Dict]): Full history, already including `message`
+        """
+        raise NotImplementedError
+
+    def clear(self) -> None:
+        """Remove all stored messages"""
+        raise NotImplementedError
+
+    def close(self) -> None:
+        """Release any open resources"""
+
+    def load_summary(self) -> Dict | None:
+        """
+        Load the stored rolling summary
+
+        Returns:
+            Dict | None: {"text": str, "covers": int}, or None if there is none
+        """
+        if self.summary_file is None or not self.summary_file.exists():
+            return None
+        with open(self.summary_file, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def save_summary(self, summary: Dict | None) -> None:
+        """
+        Store (or with None, remove) the rolling summary
+
+        Args:
+            summary (Dict | None): {"text": str, "covers": int}
+        """
+        if self.summary_file is None:
+            return
+        if summary is None:
+            self.summary_file.unlink(missing_ok=True)
+        else:
+            _write_json_atomic(self.summary_file, summary)
+
+    def load_draft(self) -> Dict | None:
+        """
+        Load the checkpoint of an unfinished streamed reply
+
+        Returns:
+            Dict | None: {"user": str, "content": str}, or None if there is none
+        """
+        if self.draft_file is None or not self.draft_file.exists():
+            return None
+        with open(self.draft_file, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def save_draft(self, draft: Dict | None) -> None:
+        """
+        Store (or with None, remove) the checkpoint of a streamed reply
+
+        Args:
+            draft (Dict | None): {"user": str, "content": str}
+        """
+        if self.draft_file is None:
+            return
+        if draft is None:
+            self.draft_file.unlink(missing_ok=True)
+        else:
+            _write_json_atomic(self.draft_file, draft)
+
+    def tail(self, limit: int) -> List[Dict]:
+        """Most recent `limit` messages, oldest first (queryable backends only)"""
+        raise NotImplementedError
+
+    def role_stats(self) -> Dict[str, Dict[str, int]]:
+        """
+        Per-role totals (queryable backends only)
+
+        Returns:
+            Dict[str, Dict[str, int]]: role -> {"messages", "chars", "tokens"}
+        """
+        raise NotImplementedError
+
+    def iter_messages(self) -> Iterator[Dict]:
+        """All stored messages, oldest first (queryable backends only)"""
+        raise NotImplementedError
+
+    def search(self, query: str, role: str | None = None, limit: int = 10) -> List[Dict]:
+        """
+        Full-text search (queryable backends only)
+
+        Returns:
+            List[Dict]: {"role", "content", "snippet", "score"}, best match first
+        """
+        raise NotImplementedError
+
+    def retrieve(self, query: str, exclude_recent: int = 0, limit: int = 4) -> List[Dict]:
+        """
+        Earlier turns relevant to `query`, for the prompt (queryable backends only)
+
+        Args:
+            query (str): The new user input
+            exclude_recent (int): Skip the newest messages (already in the prompt)
+            limit (int): Max matching messages; each comes with the other half of its turn
+
+        Returns:
+            List[Dict]: Messages, oldest first
+        """
+        raise NotImplementedError
+
+    def wait_until_indexed(self, timeout: float | None = None) -> bool:
+        """Wait for background search indexing, if the backend does any (True when done)"""
+        return True
+
+
+def _write_json_atomic(path: Path, data) -> None:
+    """Write JSON to a temp file and swap it in, so a crash never leaves a truncated file."""
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+class JsonFileStorage(MemoryStorage):
+    """
+    Original storage: the whole history is rewritten to one JSON file per message
+
+    Attributes:
+        memory_file: Path to the JSON file
+    """
+
+    def __init__(self, memory_file: Path):
+        self.memory_file = Path(memory_file)
+        self.summary_file = self.memory_file.with_suffix(".summary.json")
+        self.draft_file = self.memory_file.with_suffix(".draft.json")
+
+    def load(self) -> List[Dict]:
+        if not self.memory_file.exists():
+            return []
+        with open(self.memory_file, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def append(self, message: Dict, conversations: List[Dict]) -> None:
+        _write_json_atomic(self.memory_file, conversations)
+
+    def clear(self) -> None:
+        _write_json_atomic(self.memory_file, [])
+
+
+class JournalStorage(MemoryStorage):
+    """
+    Append-only storage: one fsync'd JSON line per message
+
+    The snapshot file (same format as JsonFileStorage, so old memory.json files
+    keep working) holds compacted history. New messages go to the journal, each
+    tagged with its absolute position (`seq`) so replay can skip anything the
+    snapshot already contains.
+
+    Compaction runs in a background thread every `compact_every` appends:
+    the journal is rotated to `<journal>.1`, merged into the snapshot and removed.
+    On load, the snapshot, any leftover rotated journal and the live journal are
+    replayed in order; a torn last line from a crash is dropped.
+
+    Attributes:
+        snapshot_file: Path to the compacted JSON snapshot
+        journal_file: Path to the JSON-lines journal
+        compact_every: Number of appends between background compactions
+    """
+
+    def __init__(self, snapshot_file: Path, journal_file: Path | None = None, compact_every: int = 200):
+        self.snapshot_file = Path(snapshot_file)
+        self.journal_file = Path(journal_file) if journal_file else self.snapshot_file.with_suffix(".journal")
+        self.rotated_file = self.journal_file.with_name(self.journal_file.name + ".1")
+        self.summary_file = self.snapshot_file.with_suffix(".summary.json")
+        self.draft_file = self.snapshot_file.with_suffix(".draft.json")
+        self.compact_every = compact_every
+
+        self._lock = threading.Lock()
+        self._compact_lock = threading.Lock()
+        self._journal = None
+        self._appends_since_compact = 0
+        self._compactor: threading.Thread | None = None
+
+    def load(self) -> List[Dict]:
+        with self._compact_lock, self._lock:
+            self._close_journal()
+            messages = self._read_snapshot()
+            replayed = self._replay(self.rotated_file, messages)
+            replayed += self._replay(self.journal_file, messages)
+
+            if replayed or self.rotated_file.exists() or self.journal_file.exists():
+                # Fold recovered entries into the snapshot so we start from a clean journal.
+                _write_json_atomic(self.snapshot_file, messages)
+                self.journal_file.unlink(missing_ok=True)
+                self.rotated_file.unlink(missing_ok=True)
+                logger.info("Memory journal recovered (%s entries replayed)", replayed)
+
+            self._appends_since_compact = 0
+            return messages
+
+    def append(self, message: Dict, conversations: List[Dict]) -> None:
+        record = {"seq": len(conversations) - 1, "role": message["role"], "content": message["content"]}
+        line = json.dumps(record, ensure_ascii=False) + "\n"
+
+        with self._lock:
+            journal = self._open_journal()
+            journal.write(line)
+            journal.flush()
+            os.fsync(journal.fileno())
+            self._appends_since_compact += 1
+            should_compact = self._appends_since_compact >= self.compact_every
+
+        if should_compact:
+            self._start_compaction()
+
+    def clear(self) -> None:
+        self.wait_for_compaction()
+        # Fold the journal in first, so clearing is a single atomic snapshot write.
+        self.compact()
+        with self._compact_lock, self._lock:
+            self._close_journal()
+            _write_json_atomic(self.snapshot_file, [])
+            self.journal_file.unlink(missing_ok=True)
+            self._appends_since_compact = 0
+
+    def close(self) -> None:
+        self.wait_for_compaction()
+        with self._lock:
+            self._close_journal()
+
+    def compact(self) -> None:
+        """Merge the journal into the snapshot (runs in the caller's thread)"""
+        with self._compact_lock:
+            with self._lock:
+                # A leftover rotated journal (from a crash) is merged before rotating again.
+                if not self.rotated_file.exists():
+                    if not self.journal_file.exists():
+                        return
+                    self._close_journal()
+                    os.replace(self.journal_file, self.rotated_file)
+                    self._appends_since_compact = 0
+
+            # Appends keep going to a fresh journal while we rewrite the snapshot.
+            messages = self._read_snapshot()
+            self._replay(self.rotated_file, messages)
+            _write_json_atomic(self.snapshot_file, messages)
+            self.rotated_file.unlink(missing_ok=True)
+            logger.info("Memory journal compacted (%s messages in snapshot)", len(messages))
+
+    def wait_for_compaction(self) -> None:
+        """Block until a running background compaction finishes"""
+        compactor = self._compactor
+        if compactor is not None and compactor.is_alive():
+            compactor.join()
+
+    def _start_compaction(self) -> None:
+        if self._compactor is not None and self._compactor.is_alive():
+            return
+        self._compactor = threading.Thread(target=self._compact_in_background, name="jarvis-memory-compactor", daemon=True)
+        self._compactor.start()
+
+    def _compact_in_background(self) -> None:
+        try:
+            self.compact()
+        except Exception:
+            logger.exception("Background memory compaction failed")
+
+    def _open_journal(self):
+        if self._journal is None:
+            self.journal_file.parent.mkdir(parents=True, exist_ok=True)
+            self._journal = open(self.journal_file, "a", encoding="utf-8")
+        return self._journal
+
+    def _close_journal(self) -> None:
+        if self._journal is not None:
+            self._journal.close()
+            self._journal = None
+
+    def _read_snapshot(self) -> List[Dict]:
+        if not self.snapshot_file.exists():
+            return []
+        try:
+            with open(self.snapshot_file, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (json.JSONDecodeError, UnicodeDecodeError):
+            # Keep the damaged file: load()/compact() are about to write a new snapshot
+            corrupt_file = self.snapshot_file.with_name(f"{self.snapshot_file.name}.corrupt-{int(time.time())}")
+            os.replace(self.snapshot_file, corrupt_file)
+            logger.exception("Memory snapshot is corrupt; moved it to %s and starting from the journal only", corrupt_file.name)
+            return []
+
+    def _replay(self, path: Path, messages: List[Dict]) -> int:
+        """Apply journal records from `path` onto `messages` in place; returns how many were applied."""
+        if not path.exists():
+            return 0
+
+        applied = 0
+        with open(path, "r", encoding="utf-8") as f:
+            for line_no, line in enumerate(f, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # Only a torn final write should look like this.
+                    logger.warning("Skipping unreadable journal line %s in %s", line_no, path.name)
+                    continue
+
+                seq = record.get("seq", len(messages))
+                if seq < len(messages):
+                    continue  # already in the snapshot
+                messages.append({"role": record["role"], "content": record["content"]})
+                applied += 1
+        return applied
+
+
+class SQLiteStorage(MemoryStorage):
+    """
+    SQLite storage shared by many sessions (and processes) in one database file
+
+    Messages are keyed by session id and role. The database runs in WAL mode so
+    any number of readers can query while one writer appends; writers in the
+    same process are serialized with a lock and other processes wait on
+    `busy_timeout`. Each thread gets its own connection, since Streamlit runs
+    every script rerun on a worker thread.
+
+    Message text is also indexed in an FTS5 table (kept in sync by triggers;
+    an existing database is indexed once when the table is first created).
+    If this SQLite build lacks FTS5, search falls back to a LIKE scan.
+
+    Attributes:
+        db_file: Path to the SQLite database
+        session_id: Session whose messages this instance reads and writes
+    """
+
+    queryable = True
+
+    # One write lock per database file, shared by every session in this process.
+    _write_locks: Dict[str, threading.Lock] = {}
+    _write_locks_guard = threading.Lock()
+
+    _SCHEMA = (
+        """
+        CREATE TABLE IF NOT EXISTS messages (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            session_id TEXT NOT NULL,
+            role TEXT NOT NULL,
+            content TEXT NOT NULL,
+            created_at REAL NOT NULL
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_messages_session ON messages (session_id, id)",
+        "CREATE INDEX IF NOT EXISTS idx_messages_session_role ON messages (session_id, role)",
+        """
+        CREATE TABLE IF NOT EXISTS summaries (
+            session_id TEXT PRIMARY KEY,
+            text TEXT NOT NULL,
+            covers INTEGER NOT NULL,
+            updated_at REAL NOT NULL
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS drafts (
+            session_id TEXT PRIMARY KEY,
+            user_text TEXT NOT NULL,
+            content TEXT NOT NULL,
+            updated_at REAL NOT NULL
+        )
+        """,
+    )
+
+    def __init__(self, db_file: Path, session_id: str = "default", busy_timeout_ms: int = 5000):
+        self.db_file = Path(db_file)
+        self.session_id = session_id
+        self.busy_timeout_ms = busy_timeout_ms
+        self._local = threading.local()
+
+        key = str(self.db_file.resolve())
+        with SQLiteStorage._write_locks_guard:
+            self._write_lock = SQLiteStorage._write_locks.setdefault(key, threading.Lock())
+
+        self.db_file.parent.mkdir(parents=True, exist_ok=True)
+        with self._write_lock:
+            conn = self._connection()
+            with conn:
+                for statement in self._SCHEMA:
+                    conn.execute(statement)
+            self.full_text = self._create_search_index(conn)
+
+    def load(self) -> List[Dict]:
+        return list(self.iter_messages())
+
+    def append(self, message: Dict, conversations: List[Dict]) -> None:
+        with self._write_lock:
+            conn = self._connection()
+            with conn:
+                conn.execute(
+                    "INSERT INTO messages (session_id, role, content, created_at) VALUES (?, ?, ?, ?)",
+                    (self.session_id, message["role"], message["content"], time.time()),
+                )
+
+    def clear(self) -> None:
+        with self._write_lock:
+            conn = self._connection()
+            with conn:
+                conn.execute("DELETE FROM messages WHERE session_id = ?", (self.session_id,))
+
+    def load_summary(self) -> Dict | None:
+        row = self._connection().execute(
+            "SELECT text, covers FROM summaries WHERE session_id = ?",
+            (self.session_id,),
+        ).fetchone()
+        return {"text": row[0], "covers": row[1]} if row else None
+
+    def save_summary(self, summary: Dict | None) -> None:
+        with self._write_lock:
+            conn = self._connection()
+            with conn:
+                if summary is None:
+                    conn.execute("DELETE FROM summaries WHERE session_id = ?", (self.session_id,))
+                else:
+                    conn.execute(
+                        "INSERT OR REPLACE INTO summaries (session_id, text, covers, updated_at) VALUES (?, ?, ?, ?)",
+                        (self.session_id, summary["text"], summary["covers"], time.time()),
+                    )
+
+    def load_draft(self) -> Dict | None:
+        row = self._connection().execute(
+            "SELECT user_text, content FROM drafts WHERE session_id = ?",
+            (self.session_id,),
+        ).fetchone()
+        return {"user": row[0], "content": row[1]} if row else None
+
+    def save_draft(self, draft: Dict | None) -> None:
+        with self._write_lock:
+            conn = self._connection()
+            with conn:
+                if draft is None:
+                    conn.execute("DELETE FROM drafts WHERE session_id = ?", (self.session_id,))
+                else:
+                    conn.execute(
+                        "INSERT OR REPLACE INTO drafts (session_id, user_text, content, updated_at) VALUES (?, ?, ?, ?)",
+                        (self.session_id, draft["user"], draft["content"], time.time()),
+                    )
+
+    def close(self) -> None:
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+    def tail(self, limit: int) -> List[Dict]:
+        rows = self._connection().execute(
+            "SELECT role, content FROM messages WHERE session_id = ? ORDER BY id DESC LIMIT ?",
+            (self.session_id, limit),
+        ).fetchall()
+        return [{"role": role, "content": content} for role, content in reversed(rows)]
+
+    def role_stats(self) -> Dict[str, Dict[str, int]]:
+        # Token estimate per message mirrors jarvis.tokens.estimate_tokens (ceil of chars / 4).
+        rows = self._connection().execute(
+            """
+            SELECT role, COUNT(*), COALESCE(SUM(LENGTH(content)), 0),
+                   COALESCE(SUM((LENGTH(content) + ? - 1) / ?), 0)
+            FROM messages WHERE session_id = ? GROUP BY role
+            """,
+            (CHARS_PER_TOKEN, CHARS_PER_TOKEN, self.session_id),
+        ).fetchall()
+        return {
+            role: {"messages": messages, "chars": chars, "tokens": tokens}
+            for role, messages, chars, tokens in rows
+        }
+
+    def iter_messages(self) -> Iterator[Dict]:
+        cursor = self._connection().execute(
+            "SELECT role, content FROM messages WHERE session_id = ? ORDER BY id",
+            (self.session_id,),
+        )
+        for role, content in cursor:
+            yield {"role": role, "content": content}
+
+    def search(self, query: str, role: str | None = None, limit: int = 10) -> List[Dict]:
+        terms = tokenize(query)
+        if not terms or limit <= 0:
+            return []
+        conn = self._connection()
+        if self.full_text:
+            # Every word must match; quoting makes FTS5 treat user text as plain words
+            match = " ".join(f'"{term}"' for term in dict.fromkeys(terms))
+            rows = conn.execute(
+                """
+                SELECT m.role, m.content, snippet(messages_fts, 0, '**', '**', '…', 24), bm25(messages_fts) AS rank
+                FROM messages_fts JOIN messages m ON m.id = messages_fts.rowid
+                WHERE messages_fts MATCH ? AND m.session_id = ? AND (? IS NULL OR m.role = ?)
+                ORDER BY rank, m.id DESC LIMIT ?
+                """,
+                (match, self.session_id, role, role, limit),
+            ).fetchall()
+            return [
+                {"role": r, "content": content, "snippet": snippet.replace("\n", " "), "score": round(-rank, 3)}
+                for r, content, snippet, rank in rows
+            ]
+
+        like = " AND ".join("content LIKE ?" for _ in terms)
+        rows = conn.execute(
+            f"SELECT role, content FROM messages WHERE session_id = ? AND (? IS NULL OR role = ?) AND {like} ORDER BY id DESC LIMIT ?",
+            (self.session_id, role, role, *(f"%{term}%" for term in terms), limit),
+        ).fetchall()
+        return [search_result(r, content, terms, 0.0) for r, content in rows]
+
+    def retrieve(self, query: str, exclude_recent: int = 0, limit: int = 4) -> List[Dict]:
+        terms = content_terms(query)
+        if not terms or limit <= 0 or not self.full_text:
+            return []
+        conn = self._connection()
+        cutoff = None
+        if exclude_recent > 0:
+            row = conn.execute(
+                "SELECT id FROM messages WHERE session_id = ? ORDER BY id DESC LIMIT 1 OFFSET ?",
+                (self.session_id, exclude_recent - 1),
+            ).fetchone()
+            if row is None:
+                return []
+            cutoff = row[0]
+
+        match = " OR ".join(f'"{term}"' for term in terms)
+        hits = conn.execute(
+            """
+            SELECT m.id, m.role FROM messages_fts JOIN messages m ON m.id = messages_fts.rowid
+            WHERE messages_fts MATCH ? AND m.session_id = ? AND (? IS NULL OR m.id < ?)
+            ORDER BY bm25(messages_fts), m.id DESC LIMIT ?
+            """,
+            (match, self.session_id, cutoff, cutoff, limit),
+        ).fetchall()
+
+        # Add the other half of each turn (the reply to a question, the question to a reply)
+        ids = set()
+        for message_id, role in hits:
+            ids.add(message_id)
+            if role == "user":
+                sql = "SELECT id, role FROM messages WHERE session_id = ? AND id > ? ORDER BY id LIMIT 1"
+            else:
+                sql = "SELECT id, role FROM messages WHERE session_id = ? AND id < ? ORDER BY id DESC LIMIT 1"
+            partner = conn.execute(sql, (self.session_id, message_id)).fetchone()
+            if partner and partner[1] != role and (cutoff is None or partner[0] < cutoff):
+                ids.add(partner[0])
+        if not ids:
+            return []
+        rows = conn.execute(
+            f"SELECT role, content FROM messages WHERE id IN ({', '.join('?' * len(ids))}) ORDER BY id",
+            tuple(ids),
+        ).fetchall()
+        return [{"role": role, "content": content} for role, content in rows]
+
+    def _create_search_index(self, conn: sqlite3.Connection) -> bool:
+        """Create the FTS5 index (+ sync triggers) if needed; False if FTS5 isn't available"""
+        exists = conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'messages_fts'").fetchone()
+        try:
+            with conn:
+                conn.execute("CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5(content, content='messages', content_rowid='id')")
+                conn.execute(
+                    """
+                    CREATE TRIGGER IF NOT EXISTS messages_fts_insert AFTER INSERT ON messages BEGIN
+                        INSERT INTO messages_fts(rowid, content) VALUES (new.id, new.content);
+                    END
+                    """
+                )
+                conn.execute(
+                    """
+                    CREATE TRIGGER IF NOT EXISTS messages_fts_delete AFTER DELETE ON messages BEGIN
+                        INSERT INTO messages_fts(messages_fts, rowid, content) VALUES ('delete', old.id, old.content);
+                    END
+                    """
+                )
+                if not exists:
+                    conn.execute("INSERT INTO messages_fts(messages_fts) VALUES ('rebuild')")
+        except sqlite3.OperationalError:
+            logger.warning("SQLite FTS5 is not available; history search will scan messages")
+            return False
+        return True
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(str(self.db_file), timeout=self.busy_timeout_ms / 1000)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(f"PRAGMA busy_timeout={int(self.busy_timeout_ms)}")
+            self._local.conn = conn
+        return conn
+
+
+class MappedStorage(MemoryStorage):
+    """
+    Memory-mapped message log (see jarvis.message_log)
+
+    Opening it doesn't read the history and get_history(limit) reads only the
+    last `limit` messages, so startup and per-turn cost don't grow with the
+    conversation. Memory keeps no copy of the history (queryable backend).
+
+    Search and retrieval use an in-process SearchIndex, built from the log in
+    a background thread on open (`warm_search`) or on the first search, then
+    updated on every append.
+
+    On first start (no log yet), the history of `import_from` (e.g. the
+    journal backend's memory.json) is copied into the log once.
+
+    Attributes:
+        log_file: Path to the message contents file (its index is next to it, .idx)
+        db_file: Same as log_file (shown as the memory file)
+    """
+
+    queryable = True
+
+    def __init__(self, log_file: Path, import_from: MemoryStorage | None = None, warm_search: bool = False):
+        self.log_file = Path(log_file)
+        self.db_file = self.log_file
+        self.summary_file = self.log_file.with_suffix(".summary.json")
+        self.draft_file = self.log_file.with_suffix(".draft.json")
+
+        fresh = not self.log_file.with_suffix(".idx").exists()
+        self.log = MessageLog(self.log_file)
+        self._index_lock = threading.Lock()
+        self._search_index: SearchIndex | None = None
+        self._index_ready = threading.Event()
+        self._index_ready.set()
+        self._generation = 0
+        self._closed = False
+
+        if fresh and import_from is not None:
+            self._import(import_from)
+        if warm_search and len(self.log):
+            self._index_ready.clear()
+            threading.Thread(target=self._warm_index, name="jarvis-log-index", daemon=True).start()
+
+    def load(self) -> List[Dict]:
+        return list(self.iter_messages())
+
+    def append(self, message: Dict, conversations: List[Dict]) -> None:
+        # Under the index lock, so the background index build can't miss or repeat it
+        with self._index_lock:
+            self.log.append(message["role"], message["content"])
+            if self._search_index is not None:
+                self._search_index.add(message["role"], message["content"])
+
+    def clear(self) -> None:
+        with self._index_lock:
+            self.log.clear()
+            self._search_index = None
+            self._generation += 1
+
+    def close(self) -> None:
+        self._closed = True
+        self.log.close()
+
+    def tail(self, limit: int) -> List[Dict]:
+        return [message.as_dict() for message in self.log.tail(limit)]
+
+    def role_stats(self) -> Dict[str, Dict[str, int]]:
+        return self.log.role_stats()
+
+    def iter_messages(self) -> Iterator[Dict]:
+        for message in self.log:
+            yield message.as_dict()
+
+    def search(self, query: str, role: str | None = None, limit: int = 10) -> List[Dict]:
+        hits = self._index().search(query, role=role, limit=limit)
+        terms = tokenize(query)
+        results = []
+        for position, score in hits:
+            message = self.log.get(position)
+            results.append(search_result(message.role, message.content, terms, score))
+        return results
+
+    def retrieve(self, query: str, exclude_recent: int = 0, limit: int = 4) -> List[Dict]:
+        if self._search_index is None and not self._index_ready.is_set():
+            return []  # still indexing a long history: answer without retrieval
+        end = len(self.log) - max(0, exclude_recent)
+        if end <= 0 or limit <= 0:
+            return []
+        hits = self._index().search(query, limit=limit, match_all=False, before=end)
+        positions = expand_turns(hits, lambda position: ROLES[self.log.roles(position, position + 1)[0]], end)
+        return [self.log.get(position).as_dict() for position in positions]
+
+    def wait_until_indexed(self, timeout: float | None = None) -> bool:
+        return self._index_ready.wait(timeout)
+
+    def _index(self) -> SearchIndex:
+        """The search index (built here if the background build wasn't started)"""
+        self._index_ready.wait()
+        with self._index_lock:
+            if self._search_index is None:
+                index = SearchIndex()
+                for message in self.log:
+                    index.add(message.role, message.content)
+                self._search_index = index
+            return self._search_index
+
+    def _warm_index(self) -> None:
+        """Index the log without holding the lock (appends keep going), then catch up under it"""
+        try:
+            generation = self._generation
+            index = SearchIndex()
+            for message in self.log:
+                index.add(message.role, message.content)
+            with self._index_lock:
+                if self._search_index is None and generation == self._generation:
+                    for message in self.log.read(len(index), len(self.log)):
+                        index.add(message.role, message.content)
+                    self._search_index = index
+        except Exception:
+            if not self._closed:  # closing mid-build just abandons it
+                logger.exception("Building the memory search index failed")
+        finally:
+            self._index_ready.set()
+
+    def _import(self, source: MemoryStorage) -> None:
+        """Copy an existing history (first start after switching backends)"""
+        try:
+            messages = source.load()
+        except Exception:
+            logger.exception("Could not read the history to import into %s", self.log_file.name)
+            return
+        finally:
+            source.close()
+        pairs = [(m.get("role", ""), m.get("content", "")) for m in messages]
+        kept = [(role, content) for role, content in pairs if role in ROLE_CODES]
+        if len(kept) < len(pairs):
+            logger.warning("Skipped %s messages with unsupported roles while importing", len(pairs) - len(kept))
+        if kept:
+            self.log.extend(kept)
+            logger.info("Imported %s messages into %s", len(kept), self.log_file.name)
@@ -0,0 +1,247 @@
+"""
+Summarizer Module
+Rolling summarization of old conversation turns
+
+Once the messages not yet covered by the summary pass a threshold, the oldest
+ones are folded into a short summary so prompts stay small without silently
+forgetting earlier context.
+"""
+
+from __future__ import annotations
+
+import re
+import threading
+from itertools import islice
+from typing import Dict, List
+
+from config.settings import settings
+from jarvis.logger import get_logger
+from jarvis.tokens import CHARS_PER_TOKEN, estimate_tokens
+
+logger = get_logger(__name__)
+
+
+class Summarizer:
+    """Base class: turns an existing summary + new messages into an updated summary"""
+
+    def summarize(self, previous_summary: str, messages: List[Dict]) -> str | None:
+        """
+        Fold messages into the summary
+
+        Args:
+            previous_summary (str): Current summary ("" if none)
+            messages (List[Dict]): Oldest uncovered messages, oldest first
+
+        Returns:
+            str | None: Updated summary, or None if it can't be written right
+            now (the compaction is retried on a later turn)
+        """
+        raise NotImplementedError
+
+    def ready(self) -> bool:
+        """False while summarizing would certainly fail (compactions are skipped)"""
+        return True
+
+
+class GeminiSummarizer(Summarizer):
+    """
+    Asks Gemini to write the summary
+
+    Summaries are background work: each is a single attempt through
+    GeminiEngine.try_generate_stream(), sent only if the circuit breaker is
+    closed and the rate limiter has room right now. A failure is not retried
+    and doesn't count towards the breaker, so it can't hold up user turns.
+    """
+
+    def __init__(self, engine, max_chars: int = None):
+        self.engine = engine
+        self.max_chars = max_chars or settings.SUMMARY_MAX_CHARS
+
+    def summarize(self, previous_summary: str, messages: List[Dict]) -> str | None:
+        lines = [f"{m.get('role', '').capitalize()}: {m.get('content', '')}" for m in messages]
+        parts = [
+            "Update the running summary of a conversation between a user and an AI assistant. "
+            "Keep facts, decisions, names, preferences and open questions; drop small talk. "
+            f"Write plain prose, at most {self.max_chars} characters.\n\n"
+        ]
+        if previous_summary:
+            parts.append(f"Current summary:\n{previous_summary}\n\n")
+        parts.append("New messages:\n")
+        parts.append("\n".join(lines))
+        stream = self.engine.try_generate_stream("".join(parts))
+        if stream is None:
+            return None
+        summary = "".join(stream).strip()
+        return summary[: self.max_chars] if summary else None
+
+    def ready(self) -> bool:
+        return self.engine.breaker.state == "closed"
+
+
+class ExtractiveSummarizer(Summarizer):
+    """
+    Local summarizer (no API call): keeps the first sentence of each message
+
+    When the summary grows past `max_chars`, the oldest lines are dropped first.
+    """
+
+    _SENTENCE_END = re.compile(r"(?<=[.!?])\s")
+
+    def __init__(self, max_chars: int = None, max_line_chars: int = 160):
+        self.max_chars = max_chars or settings.SUMMARY_MAX_CHARS
+        self.max_line_chars = max_line_chars
+
+    def summarize(self, previous_summary: str, messages: List[Dict]) -> str:
+        lines = previous_summary.splitlines() if previous_summary else []
+        for m in messages:
+            text = " ".join((m.get("content") or "").split())
+            if not text:
+                continue
+            first = self._SENTENCE_END.split(text, maxsplit=1)[0]
+            if len(first) > self.max_line_chars:
+                first = first[: self.max_line_chars].rstrip() + "…"
+            lines.append(f"{m.get('role', '').capitalize()}: {first}")
+
+        # Drop the oldest lines until it fits
+        total = sum(len(line) + 1 for line in lines)
+        start = 0
+        while total > self.max_chars and start < len(lines) - 1:
+            total -= len(lines[start]) + 1
+            start += 1
+        return "\n".join(lines[start:])
+
+
+def create_summarizer(name: str, engine=None) -> Summarizer | None:
+    """
+    Create the summarizer selected in settings
+
+    Args:
+        name (str): "gemini", "local" or "off"
+        engine: GeminiEngine instance (needed for "gemini")
+
+    Returns:
+        Summarizer | None: None when summarization is off
+    """
+    if name == "off":
+        return None
+    if name == "local":
+        return ExtractiveSummarizer()
+    if name == "gemini":
+        return GeminiSummarizer(engine)
+    raise ValueError(f"Unknown summarizer: {name}")
+
+
+class ConversationCompactor:
+    """
+    Folds old messages into Memory's rolling summary
+
+    When more than `trigger` messages are not covered by the summary, all but
+    the newest `keep_recent` of them are summarized. By default this runs on a
+    background thread so the user never waits for it.
+
+    Each summarizer call gets at most `max_tokens` (estimated) of messages. A
+    longer backlog, e.g. an existing history that was never summarized, is
+    folded in several steps, and the summary is saved after each one.
+
+    Attributes:
+        memory: Memory instance to compact
+        summarizer: Summarizer used to write the summary
+        trigger: Uncovered-message count that starts a compaction
+        keep_recent: Messages always left out of the summary
+        max_tokens: Estimated message tokens folded per summarizer call
+        background: Run compactions on a background thread
+    """
+
+    def __init__(
+        self,
+        memory,
+        summarizer: Summarizer,
+        trigger: int = None,
+        keep_recent: int = None,
+        max_tokens: int = None,
+        background: bool = True,
+    ):
+        self.memory = memory
+        self.summarizer = summarizer
+        self.trigger = trigger or settings.SUMMARY_TRIGGER_MESSAGES
+        self.keep_recent = keep_recent if keep_recent is not None else settings.SUMMARY_KEEP_RECENT
+        self.max_tokens = max_tokens or settings.SUMMARY_MAX_INPUT_TOKENS
+        self.background = background
+        self._worker: threading.Thread | None = None
+        self._lock = threading.Lock()
+
+    def maybe_compact(self) -> bool:
+        """
+        Start a compaction if enough uncovered messages have piled up
+
+        Returns:
+            bool: True if a compaction was started (or run, when not in background)
+        """
+        if self.memory.count() - self.memory.summary_covers <= self.trigger or not self.summarizer.ready():
+            return False
+        if not self.background:
+            self.compact()
+            return True
+
+        # Several sessions may share this compactor; start at most one worker.
+        with self._lock:
+            if self._worker is not None and self._worker.is_alive():
+                return False
+            self._worker = threading.Thread(target=self._compact_in_background, name="jarvis-summarizer", daemon=True)
+            self._worker.start()
+        return True
+
+    def compact(self) -> None:
+        """Summarize the oldest uncovered messages, one token-limited step at a time (runs in the caller's thread)"""
+        generation = self.memory.generation
+        while True:
+            covers = self.memory.summary_covers
+            fold = self.memory.count() - covers - self.keep_recent
+            if fold <= 0 or not self.summarizer.ready():
+                return
+
+            messages = self._next_batch(covers, fold)
+            text = self.summarizer.summarize(self.memory.summary_text, messages)
+            if text is None:
+                logger.debug("Conversation summary skipped for now")
+                return
+            # False if the memory was cleared meanwhile
+            if not self.memory.set_summary(text, covers + len(messages), generation=generation):
+                return
+            logger.info("Conversation summary now covers %s messages", covers + len(messages))
+
+    def _next_batch(self, start: int, limit: int) -> List[Dict]:
+        """
+        Messages from position `start` on: at most `limit` of them and about
+        `max_tokens` in total (always at least one; an oversized one is cut)
+        """
+        batch = []
+        tokens = 0
+        messages = self.memory.iter_all()
+        try:
+            for message in islice(messages, start, start + limit):
+                content = message.get("content") or ""
+                size = estimate_tokens(content)
+                if batch and tokens + size > self.max_tokens:
+                    break
+                if size > self.max_tokens:
+                    message = {**message, "content": content[: self.max_tokens * CHARS_PER_TOKEN] + "…"}
+                    size = self.max_tokens
+                batch.append(message)
+                tokens += size
+        finally:
+            messages.close()
+        return batch
+
+    def wait(self) -> None:
+        """Block until a running background compaction finishes"""
+        worker = self._worker
+        if worker is not None and worker.is_alive():
+            worker.join()
+
+    def _compact_in_background(self) -> None:
+        try:
+            self.compact()
+        except Exception:
+            # Not fatal: the raw recent history is still sent, we just retry on the next turn.
+            logger.exception("Conversation summarization failed")
@@ -1,41 +1,290 @@
 """
 Text-to-Speech Module (basic)
 
-Uses gTTS (Google Text-to-Speech) to generate an MP3 that can be played in Streamlit.
-This is a lightweight approach for a local Streamlit app: the browser plays the audio.
+Generates audio that can be played in Streamlit (the browser plays the audio),
+with a pluggable backend:
+
+- "gtts": gTTS (Google Text-to-Speech), MP3, needs internet (default)
+- "pyttsx3": offline system voices (SAPI5 on Windows, NSSpeechSynthesizer on
+  macOS, eSpeak on Linux), WAV; `pip install pyttsx3`
+
+Text is split at sentence boundaries and the chunks are synthesized in
+parallel, so a long reply takes about as long as its longest sentence.
+iter_audio() yields chunks in order as soon as each is ready; synthesize()
+hands them to an optional `on_chunk` callback the same way (the app starts
+playing the first sentence while the rest is still being synthesized).
+Finished chunks are kept in a byte-capped LRU cache keyed by (text,
+language, backend). synthesize() is timed as the "tts" stage in jarvis.metrics.
+
+gTTS / pyttsx3 are imported on first use, so the app starts without them.
 """
 
 from __future__ import annotations
 
+import hashlib
+import os
+import re
+import tempfile
+import threading
+import wave
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from io import BytesIO
-from typing import Optional, Tuple
+from typing import Callable, Iterator, List, Optional, Tuple
+
+from config.settings import settings
+from jarvis.metrics import get_metrics
+
+
+class TTSBackend:
+    """Base class for text-to-speech engines."""
+
+    name = "base"
+    mime_type = "audio/mp3"
+
+    def synthesize(self, text: str, language: str) -> bytes:
+        """Convert one chunk of text into audio bytes (in `mime_type` format)."""
+        raise NotImplementedError
+
+    def join(self, chunks: List[bytes]) -> bytes:
+        """Combine per-chunk audio into one playable file (MP3 frames can simply be concatenated)."""
+        return b"".join(chunks)
+
+
+class GTTSBackend(TTSBackend):
+    """gTTS: Google Translate's TTS endpoint (online)."""
+
+    name = "gtts"
+    mime_type = "audio/mp3"
+
+    def synthesize(self, text: str, language: str) -> bytes:
+        from gtts import gTTS
+
+        buf = BytesIO()
+        gTTS(text=text, lang=language).write_to_fp(buf)
+        return buf.getvalue()
+
+
+class Pyttsx3Backend(TTSBackend):
+    """
+    pyttsx3: offline system voices.
+
+    pyttsx3 drives a single platform engine and can only write to files, so
+    calls are serialized and go through a temp WAV file.
+    """
+
+    name = "pyttsx3"
+    mime_type = "audio/wav"
+
+    def __init__(self, rate: int | None = None):
+        self.rate = rate
+        self._engine = None
+        self._lock = threading.Lock()
+
+    def _get_engine(self):
+        if self._engine is None:
+            import pyttsx3
+
+            self._engine = pyttsx3.init()
+            if self.rate:
+                self._engine.setProperty("rate", self.rate)
+        return self._engine
+
+    def synthesize(self, text: str, language: str) -> bytes:
+        with self._lock:
+            engine = self._get_engine()
+            fd, path = tempfile.mkstemp(suffix=".wav")
+            os.close(fd)
+            try:
+                engine.save_to_file(text, path)
+                engine.runAndWait()
+                with open(path, "rb") as f:
+                    return f.read()
+            finally:
+                os.unlink(path)
+
+    def join(self, chunks: List[bytes]) -> bytes:
+        if len(chunks) == 1:
+            return chunks[0]
+        out = BytesIO()
+        writer = None
+        for chunk in chunks:
+            with wave.open(BytesIO(chunk), "rb") as reader:
+                if writer is None:
+                    writer = wave.open(out, "wb")
+                    writer.setparams(reader.getparams())
+                writer.writeframes(reader.readframes(reader.getnframes()))
+        writer.close()
+        return out.getvalue()
+
+
+def create_tts_backend(name: str) -> TTSBackend:
+    """
+    Create the text-to-speech backend selected in settings.
+
+    Args:
+        name: "gtts" or "pyttsx3"
+    """
+    if name == "gtts":
+        return GTTSBackend()
+    if name == "pyttsx3":
+        return Pyttsx3Backend()
+    raise ValueError(f"Unknown text-to-speech backend: {name}")
+
 
-from gtts import gTTS
+_SENTENCE_END = re.compile(r"(?<=[.!?…])\s+")
+
+
+def split_sentences(text: str, max_chars: int = 200) -> List[str]:
+    """
+    Split text into chunks at sentence boundaries.
+
+    Short sentences are merged (up to `max_chars`) so a reply isn't split into
+    many tiny requests; a single longer sentence stays whole.
+    """
+    chunks: List[str] = []
+    for sentence in _SENTENCE_END.split(text.strip()):
+        sentence = sentence.strip()
+        if not sentence:
+            continue
+        if chunks and len(chunks[-1]) + 1 + len(sentence) <= max_chars:
+            chunks[-1] = f"{chunks[-1]} {sentence}"
+        else:
+            chunks.append(sentence)
+    return chunks
+
+
+class AudioCache:
+    """
+    Content-addressed audio cache with a total size cap (least recently used first out).
+
+    Attributes:
+        max_bytes: Max total audio bytes kept
+    """
+
+    def __init__(self, max_bytes: int = 20_000_000):
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, bytes]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(text: str, language: str, backend: str) -> str:
+        return hashlib.sha256(f"{backend}\x1f{language}\x1f{text}".encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            audio = self._entries.get(key)
+            if audio is not None:
+                self._entries.move_to_end(key)
+            return audio
+
+    def put(self, key: str, audio: bytes) -> None:
+        if len(audio) > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= len(old)
+            self._entries[key] = audio
+            self._bytes += len(audio)
+            while self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= len(evicted)
+
+    @property
+    def size_bytes(self) -> int:
+        return self._bytes
+
+    def __len__(self) -> int:
+        return len(self._entries)
 
 
 class TextToSpeech:
-    """Basic TTS wrapper using gTTS."""
+    """Basic TTS wrapper: sentence chunks synthesized in parallel, with an audio cache."""
 
-    def __init__(self, language: str = "en"):
+    def __init__(
+        self,
+        language: str = "en",
+        backend: TTSBackend | None = None,
+        cache: AudioCache | None = None,
+        max_workers: int | None = None,
+    ):
         self.language = language
+        self.backend = backend or create_tts_backend(settings.TTS_BACKEND)
+        self.cache = cache if cache is not None else AudioCache(settings.TTS_CACHE_MAX_BYTES)
+        self.chunk_chars = settings.TTS_CHUNK_CHARS
+        self._pool = ThreadPoolExecutor(max_workers=max_workers or settings.TTS_MAX_WORKERS, thread_name_prefix="jarvis-tts")
 
-    def synthesize_mp3(self, text: str) -> Tuple[Optional[bytes], Optional[str]]:
+    @property
+    def mime_type(self) -> str:
+        """Format of the audio this backend produces (for st.audio)"""
+        return self.backend.mime_type
+
+    def iter_audio(self, text: str) -> Iterator[bytes]:
+        """
+        Synthesize text chunk by chunk, in parallel.
+
+        Yields:
+            bytes: Audio for each sentence chunk, in order; the first one is
+            yielded as soon as it is ready, while the rest are still running.
+
+        Raises:
+            Exception: Whatever the backend raised for a failing chunk.
+        """
+        futures = [self._pool.submit(self._synthesize_chunk, chunk) for chunk in split_sentences(text, self.chunk_chars)]
+        try:
+            for future in futures:
+                yield future.result()
+        finally:
+            for future in futures:
+                future.cancel()
+
+    def synthesize(
+        self,
+        text: str,
+        on_chunk: Callable[[bytes], None] | None = None,
+    ) -> Tuple[Optional[bytes], Optional[str]]:
         """
-        Convert text into MP3 bytes.
+        Convert text into one audio file (format: `mime_type`).
+
+        Args:
+            text: Text to speak.
+            on_chunk: Called with each chunk's audio, in order, as soon as it
+                is ready (e.g. to start playback before the whole text is done).
 
         Returns:
-            (mp3_bytes, error): Exactly one is non-None.
+            (audio_bytes, error): Exactly one is non-None.
         """
         text = (text or "").strip()
         if not text:
             return None, "Nothing to speak."
 
         try:
-            buf = BytesIO()
-            tts = gTTS(text=text, lang=self.language)
-            tts.write_to_fp(buf)
-            return buf.getvalue(), None
+            with get_metrics().timed("tts") as span:
+                span.count(prompt=text)
+                chunks = []
+                for chunk in self.iter_audio(text):
+                    chunks.append(chunk)
+                    if on_chunk is not None:
+                        on_chunk(chunk)
+                return self.backend.join(chunks), None
         except Exception as e:
             return None, f"TTS failed: {e}"
 
+    def synthesize_mp3(self, text: str) -> Tuple[Optional[bytes], Optional[str]]:
+        """
+        Same as synthesize() (kept for older callers; the bytes are MP3 with the default gTTS backend).
+
+        Returns:
+            (audio_bytes, error): Exactly one is non-None.
+        """
+        return self.synthesize(text)
 
+    def _synthesize_chunk(self, chunk: str) -> bytes:
+        key = AudioCache.key(chunk, self.language, self.backend.name)
+        audio = self.cache.get(key)
+        if audio is None:
+            audio = self.backend.synthesize(chunk, self.language)
+            self.cache.put(key, audio)
+        return audio
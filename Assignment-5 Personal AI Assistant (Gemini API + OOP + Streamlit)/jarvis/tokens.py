@@ -0,0 +1,24 @@
+"""
+Token Estimation Module
+Cheap token counts for sizing prompts and memory statistics
+
+Gemini's real tokenizer needs an API call, so we use the common rule of thumb
+of ~4 characters per token. It is close enough for budgets and dashboards.
+"""
+
+from __future__ import annotations
+
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Estimate how many tokens a piece of text will use
+
+    Args:
+        text (str): Text to measure
+
+    Returns:
+        int: Estimated token count (0 for empty text)
+    """
+    return (len(text or "") + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN